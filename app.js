@@ -1,6 +1,27 @@
 // Configuration
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Last response per URL, revalidated with If-None-Match on the next fetch
+const etagCache = {};
+
+// GET a JSON endpoint, sending the stored ETag so unchanged data comes back as 304
+async function fetchJSONWithETag(url) {
+    const cached = etagCache[url];
+    const response = await fetch(url, {
+        headers: cached ? { 'If-None-Match': cached.etag } : {},
+        cache: 'no-store'
+    });
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag && data.success) {
+        etagCache[url] = { etag, data };
+    }
+    return data;
+}
+
 // Initialize data
 function initializeData() {
     // Cart is managed in localStorage for better UX
@@ -83,8 +104,7 @@ function getCurrentUser() {
 // Menu Management Functions
 async function getMenu() {
     try {
-        const response = await fetch(`${API_BASE_URL}/menu`);
-        const data = await response.json();
+        const data = await fetchJSONWithETag(`${API_BASE_URL}/menu`);
         if (data.success) {
             return data.menu || [];
         }
@@ -229,10 +249,11 @@ function clearCart() {
 }
 
 // Order Management Functions
-async function getAllOrders() {
+// Newest first; limit fetches just the first page
+async function getAllOrders(limit) {
+    const page = limit ? `&limit=${limit}` : '';
     try {
-        const response = await fetch(`${API_BASE_URL}/orders?admin=true`);
-        const data = await response.json();
+        const data = await fetchJSONWithETag(`${API_BASE_URL}/orders?admin=true${page}`);
         if (data.success && Array.isArray(data.orders)) {
             return data.orders;
         }
@@ -247,8 +268,7 @@ async function getUserOrders() {
     const currentUser = getCurrentUser();
     if (!currentUser) return [];
     try {
-        const response = await fetch(`${API_BASE_URL}/orders?user_id=${currentUser.id}`);
-        const data = await response.json();
+        const data = await fetchJSONWithETag(`${API_BASE_URL}/orders?user_id=${currentUser.id}`);
         if (data.success && Array.isArray(data.orders)) {
             return data.orders;
         }
@@ -304,11 +324,37 @@ async function updateOrderStatusById(orderId, newStatus) {
     }
 }
 
+// Order events: the server pushes changes over SSE (EventSource reconnects
+// and replays missed events via Last-Event-ID); onResync means refetch everything.
+// A server with no free stream slots answers 503: poll for a while, then retry.
+const ORDER_POLL_INTERVAL = 30000;
+const ORDER_STREAM_RETRY = 5 * 60 * 1000;
+
+function subscribeOrderEvents(query, handlers) {
+    const { onEvent, onResync } = handlers;
+    if (typeof EventSource === 'undefined') {
+        return setInterval(onResync, ORDER_POLL_INTERVAL);
+    }
+    const source = new EventSource(`${API_BASE_URL}/orders/stream?${query}`);
+    source.addEventListener('order', (e) => onEvent(JSON.parse(e.data)));
+    source.addEventListener('resync', () => onResync());
+    source.addEventListener('error', () => {
+        // CONNECTING: the browser retries by itself. CLOSED: the server refused the stream
+        if (source.readyState !== EventSource.CLOSED) return;
+        onResync();
+        const poll = setInterval(onResync, ORDER_POLL_INTERVAL);
+        setTimeout(() => {
+            clearInterval(poll);
+            subscribeOrderEvents(query, handlers);
+        }, ORDER_STREAM_RETRY);
+    });
+    return source;
+}
+
 // Statistics Functions
 async function getStats() {
     try {
-        const response = await fetch(`${API_BASE_URL}/stats`);
-        const data = await response.json();
+        const data = await fetchJSONWithETag(`${API_BASE_URL}/stats`);
         if (data.success) {
             return data.stats;
         }
@@ -1,164 +1,67 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from flask import send_from_directory
 import json
-import uuid
-import random
-from psycopg2.extras import Json
-
-app = Flask(__name__)
-CORS(app)
-
-DB_HOST = os.environ.get('DB_HOST', 'localhost')
-DB_NAME = os.environ.get('DB_NAME', 'canteen')
-DB_USER = os.environ.get('DB_USER', 'postgres')
-DB_PASSWORD = os.environ.get('DB_PASSWORD', 'Kavin04')
-DB_PORT = os.environ.get('DB_PORT', '5432')
-
-def get_db_connection():
-    conn = psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT)
-    return conn
-
-def generate_unique_order_id(user_type, conn):
-    """Generate a unique order ID based on user type with format ORD-{PREFIX}{6-digit-number}"""
-    # Define prefixes based on user type
-    prefix_map = {
-        'Student': 'STU',
-        'Staff': 'FAC', 
-        'Faculty': 'FAC',
-        'Guest': 'GUE'
-    }
-    
-    prefix = prefix_map.get(user_type, 'GUE')  # Default to guest prefix if type not found
-    
-    # Keep trying until we get a unique order ID
-    max_attempts = 100  # Prevent infinite loop
-    for _ in range(max_attempts):
-        # Generate random 6-digit number
-        random_number = random.randint(100000, 999999)
-        order_id = f'ORD-{prefix}{random_number}'
-        
-        # Check if this order ID already exists
-        cur = conn.cursor()
-        cur.execute('SELECT COUNT(*) FROM orders WHERE order_id = %s', (order_id,))
-        count = cur.fetchone()[0]
-        cur.close()
-        
-        if count == 0:
-            return order_id
-    
-    # Fallback if we can't generate unique ID (very unlikely)
-    return f'ORD-{prefix}{uuid.uuid4().hex[:6].upper()}'
+import base64
+import csv
+import io
+import hashlib
+import sys
+from datetime import datetime
+from psycopg2.errors import UniqueViolation
+
+from db import close_pool, db_connection, pool_stats
+from response_cache import ResponseCache
+import stats
+from order_ids import OrderIdAllocator
+from order_events import SSE_POLL_INTERVAL, OrderEventHub, notify_order_event
+from checkout import Checkout, error_response as checkout_error_response
+import menu_import
+from migrate import migrate
+import json_provider
+import metrics
+
+# The recommendation engine and its data live in canteen/backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'canteen', 'backend'))
+from recommendation_engine import get_engine as get_recommendation_engine
+
+# Every route lives on this blueprint; create_app() builds the Flask app around it
+api = Blueprint('api', __name__)
+
+# Seconds a cached /api/menu or /api/stats response may be served before re-reading
+MENU_CACHE_TTL = float(os.environ.get('MENU_CACHE_TTL', '60'))
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '5'))
+
+menu_cache = ResponseCache(MENU_CACHE_TTL)
+stats_cache = ResponseCache(STATS_CACHE_TTL)
+order_ids = OrderIdAllocator()
+order_events = OrderEventHub()
+
+def make_etag(*parts):
+    """Strong ETag from a cheap fingerprint (counts, max timestamps, filters)."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_response(etag, build):
+    """Return 304 if the client already holds ``etag``, else ``build()``."""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    # Let browsers keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
-def init_db():
-    """Create users, menu_items, and orders tables if they don't exist."""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Drop existing tables to recreate with correct schema
-        cur.execute("DROP TABLE IF EXISTS orders CASCADE")
-        cur.execute("DROP TABLE IF EXISTS menu_items CASCADE")
-        cur.execute("DROP TABLE IF EXISTS users CASCADE")
-        
-        # Create users table
-        cur.execute("""
-            CREATE TABLE users (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                user_type TEXT DEFAULT 'Student',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create menu_items table
-        cur.execute("""
-            CREATE TABLE menu_items (
-                id SERIAL PRIMARY KEY,
-                item_name TEXT NOT NULL,
-                price NUMERIC(10, 2) NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT,
-                availability BOOLEAN DEFAULT true,
-                image_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create orders table
-        cur.execute("""
-        CREATE TABLE orders (
-            id SERIAL PRIMARY KEY,
-            order_id TEXT UNIQUE NOT NULL,
-            user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
-            items JSONB NOT NULL,
-            total_amount NUMERIC(10, 2) NOT NULL,
-            status TEXT DEFAULT 'Pending',
-            payment_method TEXT,
-            payment_status TEXT DEFAULT 'Pending',
-            transaction_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # Insert demo users if they don't exist
-        cur.execute("""
-        INSERT INTO users (username, email, password, role) 
-        VALUES ('admin', 'admin@canteen.com', 'admin123', 'admin')
-        ON CONFLICT (username) DO NOTHING
-        """)
-        
-        cur.execute("""
-        INSERT INTO users (username, email, password, role) 
-        VALUES ('user', 'user@canteen.com', 'user123', 'user')
-        ON CONFLICT (username) DO NOTHING
-        """)
-        
-        # Insert demo menu items if table is empty
-        cur.execute("SELECT COUNT(*) FROM menu_items")
-        count = cur.fetchone()[0]
-        if count == 0:
-            cur.execute("""
-            INSERT INTO menu_items (item_name, price, category, description, availability) VALUES
-            ('Chicken Burger', 120.00, 'Main Course', 'Juicy chicken burger with fresh vegetables', true),
-            ('Vegetable Sandwich', 80.00, 'Snacks', 'Healthy vegetable sandwich with multigrain bread', true),
-            ('Coffee', 30.00, 'Beverages', 'Hot brewed coffee', true),
-            ('Tea', 25.00, 'Beverages', 'Hot masala tea', true),
-            ('Pasta', 150.00, 'Main Course', 'Italian pasta with white sauce', true),
-            ('French Fries', 60.00, 'Snacks', 'Crispy golden french fries', true),
-            ('Fresh Juice', 40.00, 'Beverages', 'Fresh fruit juice', true),
-            ('Pizza Slice', 100.00, 'Main Course', 'Cheesy pizza slice', true),
-            ('Samosa', 20.00, 'Snacks', 'Crispy vegetable samosa (2 pieces)', true),
-            ('Ice Cream', 50.00, 'Desserts', 'Vanilla ice cream cup', true)
-            """)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("Database tables initialized successfully.")
-        print("Demo users: admin/admin123 (admin), user/user123 (user)")
-    except Exception as e:
-        print('init_db error:', e)
-
-
-# Ensure DB tables exist on startup
-init_db()
-
 # Serve frontend files (project root is one level up from backend/)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
 
 
-@app.route('/')
+@api.route('/')
 def index():
     # Serve index.html from project root if present, otherwise show API status
     index_path = os.path.join(FRONTEND_DIR, 'index.html')
@@ -167,7 +70,7 @@ def index():
     return jsonify({'status': 'ok', 'message': 'Smart Canteen API running'})
 
 
-@app.route('/favicon.ico')
+@api.route('/favicon.ico')
 def favicon():
     fav = os.path.join(FRONTEND_DIR, 'favicon.ico')
     if os.path.exists(fav):
@@ -176,7 +79,7 @@ def favicon():
     return ('', 204)
 
 
-@app.route('/<path:filename>')
+@api.route('/<path:filename>')
 def serve_static(filename):
     # Serve other frontend static files (css, js, html)
     file_path = os.path.join(FRONTEND_DIR, filename)
@@ -184,12 +87,22 @@ def serve_static(filename):
         return send_from_directory(FRONTEND_DIR, filename)
     return jsonify({'message': 'Not Found'}), 404
 
-@app.route('/api/health')
+@api.route('/api/health')
 def health():
-    return jsonify({'status': 'ok'})
+    return jsonify({'status': 'ok', 'db_pool': pool_stats(), 'menu_cache': menu_cache.stats(),
+                    'stats_cache': stats_cache.stats(),
+                    'order_events': order_events.stats(), 'order_ids': order_ids.stats()})
 
 
-@app.route('/api/users/register', methods=['POST'])
+@api.route('/api/metrics')
+def api_metrics():
+    """Request and database metrics of every worker, in Prometheus text format."""
+    if metrics.registry is None:
+        return jsonify({'success': False, 'message': 'Metrics are disabled (METRICS_ENABLED=0)'}), 404
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api.route('/api/users/register', methods=['POST'])
 def api_register():
     data = request.get_json() or {}
     username = data.get('username')
@@ -199,19 +112,18 @@ def api_register():
     if not username or not email or not password:
         return jsonify({'success': False, 'message': 'username,email,password required'}), 400
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('INSERT INTO users (username, email, password, user_type) VALUES (%s,%s,%s,%s) RETURNING id, username, email, role, user_type', (username, email, password, user_type))
-        row = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'user': {'id': row[0], 'username': row[1], 'email': row[2], 'role': row[3], 'user_type': row[4]}})
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute('INSERT INTO users (username, email, password, user_type) VALUES (%s,%s,%s,%s) RETURNING id, username, email, role, user_type', (username, email, password, user_type))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+            return jsonify({'success': True, 'user': {'id': row[0], 'username': row[1], 'email': row[2], 'role': row[3], 'user_type': row[4]}})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
 
-@app.route('/api/users/login', methods=['POST'])
+@api.route('/api/users/login', methods=['POST'])
 def api_login():
     data = request.get_json() or {}
     username = data.get('username')
@@ -219,159 +131,372 @@ def api_login():
     if not username or not password:
         return jsonify({'success': False, 'message': 'username and password required'}), 400
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT id, username, email, role, user_type FROM users WHERE username=%s AND password=%s', (username, password))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
-        if not user:
-            return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
-        return jsonify({'success': True, 'user': user})
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute('SELECT id, username, email, role, user_type FROM users WHERE username=%s AND password=%s', (username, password))
+            user = cur.fetchone()
+            cur.close()
+            if not user:
+                return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+            return jsonify({'success': True, 'user': user})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/users', methods=['GET'])
+@api.route('/api/users', methods=['GET'])
 def api_get_users():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT id, username, email, role, user_type, created_at FROM users ORDER BY created_at DESC')
-        users = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'users': users})
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute('SELECT id, username, email, role, user_type, created_at FROM users ORDER BY created_at DESC')
+            users = cur.fetchall()
+            cur.close()
+            return jsonify({'success': True, 'users': users})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/checkout', methods=['POST'])
+@api.route('/api/checkout', methods=['POST'])
 def checkout():
     data = request.get_json() or {}
-    cart = data.get('cart', [])
-    payment_method = data.get('payment_method', 'UPI')
-    
-    # Handle both direct user_id and nested user object
-    user_id = data.get('user_id')
-    if not user_id:
-        user = data.get('user') or {}
-        user_id = user.get('id') if isinstance(user, dict) else None
-
-    if not cart:
-        return jsonify({'success': False, 'message': 'Cart is empty'}), 400
-    
-    if not user_id:
-        return jsonify({'success': False, 'message': 'User ID is required'}), 400
-
-    # Basic server-side validation for cart items
-    for item in cart:
-        if not all(k in item for k in ('id', 'name', 'price', 'quantity')):
-            return jsonify({'success': False, 'message': 'Invalid cart item format'}), 400
     try:
-        total_amount = sum(float(i['price']) * int(i['quantity']) for i in cart)
-    except Exception:
-        return jsonify({'success': False, 'message': 'Invalid price/quantity in cart'}), 400
+        order = Checkout(data)
+        with db_connection() as conn:
+            cur = conn.cursor()
+            body = order.run(cur, order_ids)
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        body, status = checkout_error_response(e)
+        return jsonify(body), status
+    stats_cache.bump()
+    return jsonify(body)
+
+
+# Columns a client may request with ?fields=; id and created_at are always
+# returned because the pagination cursor is built from them
+ORDER_FIELDS = ('id', 'order_id', 'user_id', 'items', 'total_amount', 'status', 'payment_method',
+                'payment_status', 'transaction_id', 'created_at', 'updated_at')
+ORDERS_PAGE_MAX = int(os.environ.get('ORDERS_PAGE_MAX', '500'))
+# Rows pulled per round-trip from the server-side cursor while streaming
+ORDERS_FETCH_SIZE = int(os.environ.get('ORDERS_FETCH_SIZE', '500'))
+
+
+def encode_order_cursor(row):
+    """Opaque keyset cursor for the (created_at, id) position of ``row``."""
+    raw = json.dumps([row['created_at'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_order_cursor(cursor):
+    created_at, order_pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return datetime.fromisoformat(created_at), int(order_pk)
+
+
+def add_order_filters(args, conditions, params):
+    """Append the status (comma-separated) and from/to (``to`` exclusive) filters."""
+    if args.get('status'):
+        conditions.append('o.status = ANY(%s)')
+        params.append(args['status'].split(','))
+    if args.get('from'):
+        conditions.append('o.created_at >= %s')
+        params.append(datetime.fromisoformat(args['from']))
+    if args.get('to'):
+        conditions.append('o.created_at < %s')
+        params.append(datetime.fromisoformat(args['to']))
+
+
+def stream_orders(sql, params, limit):
+    """Yield the /api/orders JSON body row by row from a server-side cursor.
+
+    Rows stay tuples: RowEncoder writes each one as the JSON object a
+    RealDictCursor row would have become.
+    """
+    provider = current_app.json
+    with db_connection() as conn:
+        cur = conn.cursor(name='orders_stream')
+        cur.itersize = ORDERS_FETCH_SIZE
+        cur.execute(sql, params)
+        yield '{"orders":['
+        count, last, has_more = 0, None, False
+        encode = None
+        for row in cur:
+            if limit and count == limit:
+                has_more = True
+                break
+            if encode is None:
+                # A named cursor only has a description once the first rows are fetched
+                columns = [column.name for column in cur.description]
+                encode = json_provider.RowEncoder(columns, provider).encode
+            yield (',' if count else '') + encode(row)
+            count, last = count + 1, row
+        cur.close()
+    next_cursor = encode_order_cursor(dict(zip(columns, last))) if has_more else None
+    yield '],"next_cursor":' + provider.dumps(next_cursor) + ',"success":true}\n'
+
+
+def orders_query(args):
+    """Turn /api/orders query args into SQL; raises ValueError with the 400 message.
+
+    Returns ``(fingerprint_sql, fingerprint_params, sql, params, limit)``.
+    The fingerprint (count, max id, last update) ignores the page cursor, so
+    every page of an unchanged list keeps its ETag.
+    """
+    user_id = args.get('user_id')
+    username = args.get('username')
+    is_admin = args.get('admin') in ('1', 'true', 'True')
+    conditions, params = [], []
+    if is_admin:
+        source = 'orders o LEFT JOIN users u ON o.user_id = u.id'
+    elif user_id:
+        source = 'orders o'
+        conditions.append('o.user_id = %s')
+        params.append(int(user_id))
+    elif username:
+        source = 'orders o JOIN users u ON o.user_id = u.id'
+        conditions.append('u.username = %s')
+        params.append(username)
+    else:
+        raise ValueError('user_id, username or admin query param required')
 
-    # Get user type for order ID generation
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT user_type FROM users WHERE id = %s', (user_id,))
-        user_row = cur.fetchone()
-        if not user_row:
-            return jsonify({'success': False, 'message': 'User not found'}), 404
-        user_type = user_row[0]
-        
-        # Generate unique order ID based on user type
-        order_id = generate_unique_order_id(user_type, conn)
-        transaction_id = 'TXN' + uuid.uuid4().hex[:10].upper()
-        
-        # Insert the order
-        cur.execute("INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_method, payment_status, transaction_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING order_id",
-                    (order_id, user_id, Json(cart), total_amount, 'Uncompleted', payment_method, 'Paid', transaction_id))
-        row = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'message': 'Payment processed', 'orderId': row[0] if row else order_id, 'amount': total_amount})
-    except Exception as e:
-        print('DB error:', e)
-        if 'conn' in locals():
-            conn.close()
-        # fallback: return demo response with fallback order ID
-        fallback_order_id = 'ORD-GUE' + str(random.randint(100000, 999999))
-        return jsonify({'success': True, 'message': 'Payment processed (demo)', 'orderId': fallback_order_id, 'amount': total_amount})
+        add_order_filters(args, conditions, params)
+        limit = int(args['limit']) if args.get('limit') else None
+        if limit is not None and not 0 < limit <= ORDERS_PAGE_MAX:
+            raise ValueError(f'limit must be between 1 and {ORDERS_PAGE_MAX}')
+        cursor = decode_order_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid filter: {e}')
+
+    if args.get('fields'):
+        fields = [f for f in args['fields'].split(',') if f]
+        unknown = set(fields) - set(ORDER_FIELDS) - ({'username'} if is_admin else set())
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        fields = ['id', 'created_at'] + [f for f in fields if f not in ('id', 'created_at')]
+        columns = ', '.join('u.username' if f == 'username' else f'o.{f}' for f in fields)
+    else:
+        columns = 'o.*, u.username' if is_admin else 'o.*'
+
+    where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    # Idle polls only pay for this fingerprint, not the full order list
+    fingerprint_sql = f'SELECT COUNT(*) AS count, MAX(o.id) AS max_id, MAX(o.updated_at) AS updated FROM {source}{where}'
+    fingerprint_params = list(params)
+
+    if cursor:
+        conditions.append('(o.created_at, o.id) < (%s, %s)')
+        params.extend(cursor)
+        where = ' WHERE ' + ' AND '.join(conditions)
+    sql = f'SELECT {columns} FROM {source}{where} ORDER BY o.created_at DESC, o.id DESC'
+    if limit:
+        # One extra row tells us whether there is a next page
+        sql += f' LIMIT {limit + 1}'
+    return fingerprint_sql, fingerprint_params, sql, params, limit
+
+
+@api.route('/api/orders', methods=['GET'])
+def api_get_orders():
+    """List orders newest first.
 
+    One of user_id, username or admin=true selects the orders. Optional:
+    status (comma-separated), from/to (ISO date or datetime, ``to`` exclusive),
+    fields (comma-separated projection), limit and cursor (keyset pagination).
+    Without limit every matching order is streamed.
+    """
+    try:
+        fingerprint_sql, fingerprint_params, sql, params, limit = orders_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
-@app.route('/api/orders', methods=['GET'])
-def api_get_orders():
-    # support query params: user_id or username or admin=true
-    user_id = request.args.get('user_id')
-    username = request.args.get('username')
-    is_admin = request.args.get('admin') in ('1', 'true', 'True')
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        if is_admin:
-            cur.execute('SELECT o.*, u.username FROM orders o LEFT JOIN users u ON o.user_id = u.id ORDER BY created_at DESC')
-            rows = cur.fetchall()
-        elif user_id:
-            cur.execute('SELECT o.* FROM orders o WHERE o.user_id = %s ORDER BY created_at DESC', (int(user_id),))
-            rows = cur.fetchall()
-        elif username:
-            cur.execute('SELECT o.* FROM orders o JOIN users u ON o.user_id = u.id WHERE u.username = %s ORDER BY created_at DESC', (username,))
-            rows = cur.fetchall()
-        else:
-            return jsonify({'success': False, 'message': 'user_id, username or admin query param required'}), 400
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'orders': rows})
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(fingerprint_sql, fingerprint_params)
+            fingerprint = tuple(cur.fetchone().values())
+            cur.close()
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+    etag = make_etag('orders', sorted(request.args.items(multi=True)), fingerprint)
+
+    def build():
+        body = stream_with_context(stream_orders(sql, params, limit))
+        return current_app.response_class(body, mimetype='application/json')
+
+    return conditional_response(etag, build)
+
+
+# One row per order line; orders without items still get one row
+EXPORT_COLUMNS = ('order_id', 'created_at', 'user_id', 'username', 'status', 'payment_status', 'payment_method',
+                  'total_amount', 'item_id', 'item_name', 'price', 'quantity', 'line_total')
+EXPORT_SQL = """
+    SELECT o.order_id, o.created_at, o.user_id, u.username, o.status, o.payment_status, o.payment_method,
+           o.total_amount, (i.item->>'id')::int, COALESCE(i.item->>'name', i.item->>'item_name'),
+           (i.item->>'price')::numeric, (i.item->>'quantity')::int,
+           (i.item->>'price')::numeric * (i.item->>'quantity')::int
+    FROM orders o
+    LEFT JOIN users u ON o.user_id = u.id
+    LEFT JOIN LATERAL jsonb_array_elements(o.items) AS i(item) ON true
+    {where}
+    ORDER BY o.created_at, o.id
+"""
+# Rows per fetchmany round-trip, and per chunk written to the client
+ORDERS_EXPORT_FETCH_SIZE = int(os.environ.get('ORDERS_EXPORT_FETCH_SIZE', '2000'))
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_order_export(sql, params, fmt):
+    """Yield the export one chunk per fetchmany batch (CSV or NDJSON)."""
+    dumps = current_app.json.dumps
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(EXPORT_COLUMNS)
+    with db_connection() as conn:
+        # Named cursor: the server holds the result, one snapshot for the whole export
+        cur = conn.cursor(name='orders_export')
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(ORDERS_EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                row = [_export_value(v) for v in row]
+                if fmt == 'csv':
+                    writer.writerow(row)
+                else:
+                    buffer.write(dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        cur.close()
+    if buffer.tell():
+        yield buffer.getvalue()
+
 
+@api.route('/api/orders/export', methods=['GET'])
+def api_export_orders():
+    """Stream order lines as CSV (default) or NDJSON (format=ndjson).
 
-@app.route('/api/orders/<order_id>/status', methods=['PATCH'])
+    admin=true exports every order, user_id one user's. Optional: status
+    (comma-separated) and from/to (ISO date or datetime, ``to`` exclusive).
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    conditions, params = [], []
+    try:
+        if request.args.get('admin') not in ('1', 'true', 'True'):
+            if not request.args.get('user_id'):
+                return jsonify({'success': False, 'message': 'user_id or admin query param required'}), 400
+            conditions.append('o.user_id = %s')
+            params.append(int(request.args['user_id']))
+        add_order_filters(request.args, conditions, params)
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': f'Invalid filter: {e}'}), 400
+
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    sql = EXPORT_SQL.format(where=where)
+    span = '-'.join(request.args[k][:10] for k in ('from', 'to') if request.args.get(k)) or 'all'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(stream_order_export(sql, params, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=orders-{span}.{fmt}',
+                             'X-Accel-Buffering': 'no'})
+
+
+@api.route('/api/orders/stream', methods=['GET'])
+def api_order_stream():
+    """Server-Sent Events feed of order changes for one user or for admins"""
+    user_id = request.args.get('user_id')
+    is_admin = request.args.get('admin') in ('1', 'true', 'True')
+    if not user_id and not is_admin:
+        return jsonify({'success': False, 'message': 'user_id or admin query param required'}), 400
+    try:
+        subscriber = None if is_admin else int(user_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter: {e}'}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Each open stream holds one of this worker's threads
+    if not order_events.acquire_stream():
+        return jsonify({'success': False, 'message': 'Too many open order streams; poll /api/orders instead',
+                        'poll_interval': SSE_POLL_INTERVAL}), 503, {'Retry-After': str(SSE_POLL_INTERVAL)}
+    stream = order_events.stream(subscriber, last_event_id)
+    response = Response(stream_with_context(stream), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(order_events.release_stream)
+    return response
+
+
+@api.route('/api/orders/<order_id>/status', methods=['PATCH'])
 def api_update_order_status(order_id):
     data = request.get_json() or {}
     new_status = data.get('status')
     if not new_status:
         return jsonify({'success': False, 'message': 'status required'}), 400
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('UPDATE orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE order_id = %s RETURNING order_id', (new_status, order_id))
-        row = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        if not row:
-            return jsonify({'success': False, 'message': 'Order not found'}), 404
-        return jsonify({'success': True, 'orderId': row[0]})
+        with db_connection() as conn:
+            cur = conn.cursor()
+            # The sub-select locks the row and hands back the previous status for the rollup
+            cur.execute("""
+                UPDATE orders o SET status = %s, updated_at = CURRENT_TIMESTAMP
+                FROM (SELECT id, status FROM orders WHERE order_id = %s FOR UPDATE) old
+                WHERE o.id = old.id
+                RETURNING o.order_id, o.user_id, o.status, o.updated_at, old.status, o.created_at, o.payment_status, o.total_amount
+            """, (new_status, order_id))
+            row = cur.fetchone()
+            if row:
+                stats.record_status_change(cur, row[5], row[4], row[2], row[6], row[7])
+                notify_order_event(cur, 'status', {'order_id': row[0], 'user_id': row[1], 'status': row[2], 'updated_at': row[3]})
+            conn.commit()
+            cur.close()
+            stats_cache.bump()
+            if not row:
+                return jsonify({'success': False, 'message': 'Order not found'}), 404
+            return jsonify({'success': True, 'orderId': row[0]})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 # ==================== MENU MANAGEMENT APIs ====================
 
-@app.route('/api/menu', methods=['GET'])
-def api_get_menu():
-    """Get all menu items or filter by availability"""
-    available_only = request.args.get('available') in ('1', 'true', 'True')
-    try:
-        conn = get_db_connection()
+MENU_SQL = 'SELECT * FROM menu_items ORDER BY category, item_name'
+
+
+def _load_menu_views():
+    """Query the menu once and serialize both /api/menu views with their ETags."""
+    with db_connection() as conn:
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        if available_only:
-            cur.execute('SELECT * FROM menu_items WHERE availability = true ORDER BY category, item_name')
-        else:
-            cur.execute('SELECT * FROM menu_items ORDER BY category, item_name')
+        cur.execute(MENU_SQL)
         items = cur.fetchall()
         cur.close()
-        conn.close()
-        return jsonify({'success': True, 'menu': items})
+    return menu_views(items)
+
+
+def menu_views(items):
+    """Both /api/menu bodies for ``items`` (MENU_SQL rows); needs an app context."""
+    available = [item for item in items if item['availability']]
+    views = {}
+    for name, menu in (('all', items), ('available', available)):
+        body = jsonify({'success': True, 'menu': menu}).get_data()
+        views[name] = (body, hashlib.sha1(body).hexdigest())
+    # Rows for /api/recommendations; the same list object until the next load
+    views['available_rows'] = available
+    return views
+
+
+@api.route('/api/menu', methods=['GET'])
+def api_get_menu():
+    """Get all menu items or filter by availability (served from menu_cache)"""
+    available_only = request.args.get('available') in ('1', 'true', 'True')
+    try:
+        body, etag = menu_cache.get(_load_menu_views)['available' if available_only else 'all']
+        return conditional_response(etag, lambda: current_app.response_class(body, mimetype='application/json'))
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/menu', methods=['POST'])
+@api.route('/api/menu', methods=['POST'])
 def api_add_menu_item():
     """Add a new menu item (Admin only)"""
     data = request.get_json() or {}
@@ -386,170 +511,276 @@ def api_add_menu_item():
         return jsonify({'success': False, 'message': 'item_name, price, and category are required'}), 400
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            INSERT INTO menu_items (item_name, price, category, description, availability, image_url) 
-            VALUES (%s, %s, %s, %s, %s, %s) 
-            RETURNING *
-        """, (item_name, price, category, description, availability, image_url))
-        new_item = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'item': new_item}), 201
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("""
+                INSERT INTO menu_items (item_name, price, category, description, availability, image_url) 
+                VALUES (%s, %s, %s, %s, %s, %s) 
+                RETURNING *
+            """, (item_name, price, category, description, availability, image_url))
+            new_item = cur.fetchone()
+            conn.commit()
+            cur.close()
+            menu_cache.bump()
+            stats_cache.bump()
+            return jsonify({'success': True, 'item': new_item}), 201
+    except UniqueViolation:
+        return jsonify({'success': False, 'message': f'A menu item named {item_name!r} already exists'}), 409
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/menu/<int:item_id>', methods=['GET'])
+# Upper bound on rows per /api/menu/bulk upload
+MENU_BULK_MAX_ROWS = int(os.environ.get('MENU_BULK_MAX_ROWS', '50000'))
+
+
+@api.route('/api/menu/bulk', methods=['POST'])
+def api_bulk_menu():
+    """Create or update many menu items at once (Admin only).
+
+    The body is CSV (Content-Type: text/csv, header row required) or a JSON
+    array of items; items are matched by item_name. Invalid rows are skipped
+    and listed in ``errors``; with atomic=true any invalid row rejects the
+    whole upload.
+    """
+    try:
+        rows, columns = menu_import.parse_upload(request.get_data(), request.content_type)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if len(rows) > MENU_BULK_MAX_ROWS:
+        return jsonify({'success': False, 'message': f'At most {MENU_BULK_MAX_ROWS} rows per upload'}), 413
+
+    valid, errors = menu_import.validate_rows(rows, columns)
+    if errors and (not valid or request.args.get('atomic') in ('1', 'true', 'True')):
+        return jsonify({'success': False, 'message': 'No items imported', 'inserted': 0, 'updated': 0,
+                        'errors': errors}), 400
+
+    inserted = 0
+    if valid:
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(menu_import.TEMP_TABLE_SQL)
+                cur.copy_expert(menu_import.COPY_SQL, menu_import.copy_buffer(valid))
+                cur.execute(menu_import.merge_sql(columns))
+                inserted = sum(1 for (new,) in cur.fetchall() if new)
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 500
+        # Once per upload, however many rows changed
+        menu_cache.bump()
+        stats_cache.bump()
+    return jsonify({'success': True, 'inserted': inserted, 'updated': len(valid) - inserted, 'errors': errors})
+
+
+@api.route('/api/menu/<int:item_id>', methods=['GET'])
 def api_get_menu_item(item_id):
     """Get a specific menu item"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT * FROM menu_items WHERE id = %s', (item_id,))
-        item = cur.fetchone()
-        cur.close()
-        conn.close()
-        if not item:
-            return jsonify({'success': False, 'message': 'Item not found'}), 404
-        return jsonify({'success': True, 'item': item})
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute('SELECT * FROM menu_items WHERE id = %s', (item_id,))
+            item = cur.fetchone()
+            cur.close()
+            if not item:
+                return jsonify({'success': False, 'message': 'Item not found'}), 404
+            return jsonify({'success': True, 'item': item})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/menu/<int:item_id>', methods=['PUT'])
+@api.route('/api/menu/<int:item_id>', methods=['PUT'])
 def api_update_menu_item(item_id):
     """Update a menu item (Admin only)"""
     data = request.get_json() or {}
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Build update query dynamically
-        update_fields = []
-        values = []
+            # Build update query dynamically
+            update_fields = []
+            values = []
         
-        if 'item_name' in data:
-            update_fields.append('item_name = %s')
-            values.append(data['item_name'])
-        if 'price' in data:
-            update_fields.append('price = %s')
-            values.append(data['price'])
-        if 'category' in data:
-            update_fields.append('category = %s')
-            values.append(data['category'])
-        if 'description' in data:
-            update_fields.append('description = %s')
-            values.append(data['description'])
-        if 'availability' in data:
-            update_fields.append('availability = %s')
-            values.append(data['availability'])
-        if 'image_url' in data:
-            update_fields.append('image_url = %s')
-            values.append(data['image_url'])
+            if 'item_name' in data:
+                update_fields.append('item_name = %s')
+                values.append(data['item_name'])
+            if 'price' in data:
+                update_fields.append('price = %s')
+                values.append(data['price'])
+            if 'category' in data:
+                update_fields.append('category = %s')
+                values.append(data['category'])
+            if 'description' in data:
+                update_fields.append('description = %s')
+                values.append(data['description'])
+            if 'availability' in data:
+                update_fields.append('availability = %s')
+                values.append(data['availability'])
+            if 'image_url' in data:
+                update_fields.append('image_url = %s')
+                values.append(data['image_url'])
         
-        if not update_fields:
-            return jsonify({'success': False, 'message': 'No fields to update'}), 400
+            if not update_fields:
+                return jsonify({'success': False, 'message': 'No fields to update'}), 400
         
-        update_fields.append('updated_at = CURRENT_TIMESTAMP')
-        values.append(item_id)
+            update_fields.append('updated_at = CURRENT_TIMESTAMP')
+            values.append(item_id)
         
-        query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = %s RETURNING *"
-        cur.execute(query, values)
-        updated_item = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+            query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = %s RETURNING *"
+            cur.execute(query, values)
+            updated_item = cur.fetchone()
+            conn.commit()
+            cur.close()
+            menu_cache.bump()
+            stats_cache.bump()
         
-        if not updated_item:
-            return jsonify({'success': False, 'message': 'Item not found'}), 404
-        return jsonify({'success': True, 'item': updated_item})
+            if not updated_item:
+                return jsonify({'success': False, 'message': 'Item not found'}), 404
+            return jsonify({'success': True, 'item': updated_item})
+    except UniqueViolation:
+        return jsonify({'success': False, 'message': f"A menu item named {data.get('item_name')!r} already exists"}), 409
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/menu/<int:item_id>', methods=['DELETE'])
+@api.route('/api/menu/<int:item_id>', methods=['DELETE'])
 def api_delete_menu_item(item_id):
     """Delete a menu item (Admin only)"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM menu_items WHERE id = %s RETURNING id', (item_id,))
-        deleted = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute('DELETE FROM menu_items WHERE id = %s RETURNING id', (item_id,))
+            deleted = cur.fetchone()
+            conn.commit()
+            cur.close()
+            menu_cache.bump()
+            stats_cache.bump()
         
-        if not deleted:
-            return jsonify({'success': False, 'message': 'Item not found'}), 404
-        return jsonify({'success': True, 'message': 'Item deleted successfully'})
+            if not deleted:
+                return jsonify({'success': False, 'message': 'Item not found'}), 404
+            return jsonify({'success': True, 'message': 'Item deleted successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 # ==================== STATS APIs ====================
 
-@app.route('/api/stats', methods=['GET'])
-def api_get_stats():
-    """Get statistics for admin dashboard"""
-    try:
-        conn = get_db_connection()
+def _load_stats():
+    """Compute the dashboard figures and serialize them with their ETag."""
+    with db_connection() as conn:
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Total users
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'user'")
-        total_users = cur.fetchone()['count']
-        
-        # Total orders
-        cur.execute("SELECT COUNT(*) as count FROM orders")
-        total_orders = cur.fetchone()['count']
-        
-        # Total revenue
-        cur.execute("SELECT COALESCE(SUM(total_amount), 0) as revenue FROM orders WHERE payment_status = 'Paid'")
-        total_revenue = float(cur.fetchone()['revenue'])
-        
-        # Pending orders
-        cur.execute("SELECT COUNT(*) as count FROM orders WHERE status IN ('Pending', 'Uncompleted', 'Preparing')")
-        pending_orders = cur.fetchone()['count']
-        
-        # Available menu items
-        cur.execute("SELECT COUNT(*) as count FROM menu_items WHERE availability = true")
-        available_items = cur.fetchone()['count']
-        
-        # Unavailable menu items
-        cur.execute("SELECT COUNT(*) as count FROM menu_items WHERE availability = false")
-        unavailable_items = cur.fetchone()['count']
-        
-        # Orders today
-        cur.execute("SELECT COUNT(*) as count FROM orders WHERE DATE(created_at) = CURRENT_DATE")
-        orders_today = cur.fetchone()['count']
-        
-        # Revenue today
-        cur.execute("SELECT COALESCE(SUM(total_amount), 0) as revenue FROM orders WHERE DATE(created_at) = CURRENT_DATE AND payment_status = 'Paid'")
-        revenue_today = float(cur.fetchone()['revenue'])
-        
+        figures = stats.load_stats(cur)
         cur.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'totalUsers': total_users,
-                'totalOrders': total_orders,
-                'totalRevenue': total_revenue,
-                'pendingOrders': pending_orders,
-                'availableItems': available_items,
-                'unavailableItems': unavailable_items,
-                'ordersToday': orders_today,
-                'revenueToday': revenue_today
-            }
-        })
+    return stats_view(figures)
+
+
+def stats_view(figures):
+    """The /api/stats body and ETag; needs an app context."""
+    body = jsonify({'success': True, 'stats': figures}).get_data()
+    return body, hashlib.sha1(body).hexdigest()
+
+
+@api.route('/api/stats', methods=['GET'])
+def api_get_stats():
+    """Get statistics for admin dashboard (served from stats_cache)"""
+    try:
+        body, etag = stats_cache.get(_load_stats)
+        return conditional_response(etag, lambda: current_app.response_class(body, mimetype='application/json'))
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+RECOMMENDATIONS_MAX = 20
+# 'hybrid' adds RAG results from rag_engine (needs sentence-transformers and faiss-cpu)
+RECOMMENDATIONS_ENGINE = os.environ.get('RECOMMENDATIONS_ENGINE', 'rule')
+# Seconds create_app() waits for the RAG model; past it, warm-up carries on in the background
+RAG_WARMUP_TIMEOUT = float(os.environ.get('RAG_WARMUP_TIMEOUT', '120'))
+_hybrid_engine = None
+
+
+def get_recommendations_engine():
+    """The rule engine, or the shared hybrid engine with batched RAG queries."""
+    global _hybrid_engine
+    if RECOMMENDATIONS_ENGINE != 'hybrid':
+        return get_recommendation_engine()
+    if _hybrid_engine is None:
+        from rag_engine import get_hybrid_engine
+        _hybrid_engine = get_hybrid_engine(batching=True)
+    return _hybrid_engine
+
+
+@api.route('/api/recommendations', methods=['GET', 'POST'])
+def api_recommendations():
+    """Items that pair with the cart, from the compiled rule index.
+
+    GET ?cart_items=Tea,Samosa&limit=5, or POST {"cart_items": [...]} where
+    entries are names or cart objects with a name.
+    """
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        cart_items = data.get('cart_items') or data.get('cart') or []
+        limit = data.get('limit', 5)
+    else:
+        cart_items = request.args.get('cart_items', '').split(',')
+        limit = request.args.get('limit', 5)
+    cart_items = [item.get('name') or item.get('item_name') if isinstance(item, dict) else item
+                  for item in cart_items]
+    cart_items = [str(item).strip() for item in cart_items if item and str(item).strip()]
+    try:
+        limit = min(max(int(limit), 1), RECOMMENDATIONS_MAX)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+
+    try:
+        engine = get_recommendations_engine()
+        rules = getattr(engine, 'rule_engine', engine)
+        rules.refresh()
+        # Rebinds the index only when menu_cache has reloaded the menu
+        menu = menu_cache.get(_load_menu_views)['available_rows']
+        rules.set_menu(menu)
+        recommendations = engine.get_recommendations(cart_items, menu, limit)
+        return jsonify({'success': True, 'recommendations': recommendations})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def warm_up():
+    """Build the read-only recommendation state before any request needs it."""
+    engine = get_recommendations_engine()
+    rag = getattr(engine, 'rag_engine', None)
+    # With a neighbour table the model stays unloaded until a cart needs it
+    if rag is not None and rag.neighbors is None:
+        try:
+            rag.ensure_ready(RAG_WARMUP_TIMEOUT)
+        except Exception as e:
+            print(f'RAG warm-up failed, serving rule-based recommendations: {e}')
+
+
+def create_app(migrate_database=True):
+    """Build the Flask app and the state its workers share.
+
+    Under gunicorn with preload_app (see gunicorn.conf.py) this runs once in
+    the master: the compiled recommendation index, and in hybrid mode the
+    RAG model and memory-mapped embeddings, are built before the fork and
+    shared copy-on-write by every worker. Connections are not shared: the
+    pool is closed before returning, and each worker opens its own on first
+    use.
+    """
+    app = Flask(__name__)
+    json_provider.install(app)
+    CORS(app, expose_headers=['ETag'])
+    app.register_blueprint(api)
+    # Shared by the workers gunicorn forks from here (preload_app)
+    metrics.install(app)
+    if migrate_database:
+        # One version query when the schema is current
+        migrate()
+    warm_up()
+    close_pool()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
+    create_app().run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
@@ -0,0 +1,549 @@
+"""ASGI serving mode: the same API on an event loop, with an asyncpg pool.
+
+    pip install -r requirements-async.txt
+    gunicorn -k uvicorn.workers.UvicornWorker 'asgi:create_asgi_app()'
+
+The routes that spend their time waiting on Postgres or on the client
+(/api/menu, /api/stats, /api/orders, /api/checkout, /api/orders/stream and
+/api/health) run natively as coroutines. A request waiting on the
+database or an idle order stream then holds no thread. Every other route,
+and any request a native route does not handle (HEAD, OPTIONS, a body
+that is not JSON), goes to the Flask app from create_app() on a small thread pool.
+Both modes therefore share one implementation of those routes.
+
+Native routes build their SQL, ETags and JSON bodies with the helpers in
+app.py, stats.py and checkout.py. They share menu_cache, stats_cache and
+the order ID allocator with the Flask routes in the same process, so
+their responses match WSGI mode byte for byte. The test suite runs every
+test against both modes (see tests/conftest.py), and ``python
+benchmark.py serve`` checks the responses again before it measures.
+"""
+import asyncio
+import functools
+import io
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import asyncpg
+from psycopg2.extras import Json
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+import json_provider
+import metrics
+import stats
+from app import (ORDERS_FETCH_SIZE, MENU_SQL, create_app, encode_order_cursor,
+                 make_etag, menu_cache, menu_views, order_events, order_ids, orders_query, stats_cache,
+                 stats_view)
+from checkout import Checkout, error_response as checkout_error_response
+from db import (DB_HOST, DB_NAME, DB_PASSWORD, DB_POOL_MAX, DB_POOL_MIN, DB_POOL_TIMEOUT, DB_PORT, DB_USER,
+                pool_stats)
+
+# Threads running the Flask routes that have no native implementation
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+# Chunks a delegated streaming response may run ahead of a slow client
+_STREAM_AHEAD = 8
+
+_PARAM_RE = re.compile(r'%\((\w+)\)s|%s|%%')
+
+
+@functools.lru_cache(maxsize=256)
+def _numbered(sql):
+    names = []
+
+    def number(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None or name not in names:
+            names.append(name)
+            return f'${len(names)}'
+        return f'${names.index(name) + 1}'
+
+    return _PARAM_RE.sub(number, sql), tuple(names)
+
+
+def numbered(sql, params=()):
+    """``(sql, args)`` for asyncpg from a psycopg2-style query and its params.
+
+    ``%s`` and ``%(name)s`` placeholders become ``$1, $2, ...``, so the SQL
+    constants shared with the Flask routes are written once. psycopg2 Json
+    parameters are passed unwrapped, for the jsonb codec.
+    """
+    text, names = _numbered(sql)
+    if isinstance(params, dict):
+        params = [params[name] for name in names]
+    return text, [p.adapted if isinstance(p, Json) else p for p in params]
+
+
+_pool = None
+_pool_lock = None
+
+
+async def _init_connection(conn):
+    # JSONB in and out as Python objects, as psycopg2 does
+    await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+    if metrics.METRICS_ENABLED:
+        # Logs statements run by fetch() and friends, not cursor iteration. A
+        # statement's first run on a connection also logs asyncpg's type
+        # introspection, which its own time already includes.
+        conn.add_query_logger(metrics.asyncpg_query_logger)
+
+
+async def get_pool():
+    """This worker's asyncpg pool, created on first use inside its event loop."""
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(host=DB_HOST, database=DB_NAME, user=DB_USER,
+                                                  password=DB_PASSWORD, port=int(DB_PORT),
+                                                  min_size=DB_POOL_MIN, max_size=DB_POOL_MAX,
+                                                  init=_init_connection)
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def async_pool_stats():
+    """asyncpg pool figures for /api/health; empty until the first query."""
+    if _pool is None:
+        return {'pid': os.getpid(), 'open': 0}
+    return {'pid': os.getpid(), 'min': _pool.get_min_size(), 'max': _pool.get_max_size(),
+            'open': _pool.get_size(), 'idle': _pool.get_idle_size()}
+
+
+async def fetch(sql, params=()):
+    text, args = numbered(sql, params)
+    async with (await get_pool()).acquire(timeout=DB_POOL_TIMEOUT) as conn:
+        return await conn.fetch(text, *args)
+
+
+async def fetchrow(sql, params=()):
+    text, args = numbered(sql, params)
+    async with (await get_pool()).acquire(timeout=DB_POOL_TIMEOUT) as conn:
+        return await conn.fetchrow(text, *args)
+
+
+async def run_steps(conn, steps):
+    """Run a generator of psycopg2-style statements (checkout.Checkout.steps) on ``conn``."""
+    try:
+        statement = steps.send(None)
+        while True:
+            text, args = numbered(*statement)
+            statement = steps.send(await conn.fetch(text, *args))
+    except StopIteration as done:
+        return done.value
+
+
+class Request:
+    """The parts of an HTTP request the native routes read."""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.body = body
+
+    def get_json(self):
+        """Like Flask's: ValueError unless the body is declared JSON and parses."""
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if mimetype != 'application/json' and not (mimetype.startswith('application/')
+                                                   and mimetype.endswith('+json')):
+            raise ValueError(f'Content-Type is not JSON: {mimetype!r}')
+        return json.loads(self.body)
+
+
+class Response:
+    def __init__(self, body=b'', status=200, mimetype='application/json', headers=None):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.headers = dict(headers or {})
+
+
+def wsgi_environ(scope, body):
+    """A WSGI environ for an ASGI HTTP scope whose body has been read."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class AsyncCanteenApp:
+    """ASGI application: native async routes, everything else through Flask."""
+
+    def __init__(self, flask_app):
+        self.flask = flask_app
+        self.routes = {
+            ('GET', '/api/health'): self.health,
+            ('GET', '/api/menu'): self.get_menu,
+            ('GET', '/api/stats'): self.get_stats,
+            ('GET', '/api/orders'): self.get_orders,
+            ('GET', '/api/orders/stream'): self.order_stream,
+            ('POST', '/api/checkout'): self.checkout,
+        }
+        self._executor = None
+        self._executor_pid = None
+
+    @property
+    def executor(self):
+        # Threads do not survive a fork; each worker starts its own pool
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(ASGI_WSGI_THREADS, thread_name_prefix='wsgi')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        body = await _read_body(receive)
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self._call_wsgi(scope, body, receive, send)
+        # Native routes are counted here; the Flask app's middleware counts the rest
+        registry, stats, status = metrics.registry, None, 500
+        if registry is not None:
+            stats = registry.start()
+            registry.matched(stats, scope['path'], scope['method'])
+        try:
+            request = Request(scope, body)
+            response = await handler(request)
+            if response is None:
+                if stats is not None:
+                    registry.discard(stats)
+                    stats = None
+                return await self._call_wsgi(scope, body, receive, send)
+            status = response.status
+            await self._send(request, response, receive, send)
+        finally:
+            if stats is not None:
+                registry.finish(stats, status, scope['method'])
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_pool()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ---- responses ----
+
+    def json(self, obj, status=200):
+        """The body jsonify() would send, from the Flask app's JSON provider."""
+        return Response(self.flask.json.response(obj).get_data(), status)
+
+    def conditional(self, request, etag, build):
+        """conditional_response() from app.py: 304 if the client holds ``etag``."""
+        if parse_etags(request.headers.get('if-none-match')).contains(etag):
+            response = Response(status=304, mimetype=None)
+        else:
+            response = build()
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _cors_headers(self, request):
+        # What flask_cors adds with CORS(app, expose_headers=['ETag'])
+        origin = request.headers.get('origin')
+        if origin:
+            return [('Access-Control-Allow-Origin', origin), ('Access-Control-Expose-Headers', 'ETag'),
+                    ('Vary', 'Origin')]
+        return [('Access-Control-Allow-Origin', '*'), ('Access-Control-Expose-Headers', 'ETag')]
+
+    async def _send(self, request, response, receive, send):
+        headers = []
+        if response.mimetype:
+            charset = '; charset=utf-8' if response.mimetype.startswith('text/') else ''
+            headers.append(('Content-Type', response.mimetype + charset))
+        if isinstance(response.body, bytes):
+            headers.append(('Content-Length', str(len(response.body))))
+        headers.extend(response.headers.items())
+        headers.extend(self._cors_headers(request))
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        if isinstance(response.body, bytes):
+            await send({'type': 'http.response.body', 'body': response.body})
+            return
+
+        body = response.body
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while True:
+                # Race every chunk against the disconnect, so an idle order
+                # stream is dropped at once rather than at its next heartbeat
+                chunk = asyncio.ensure_future(body.__anext__())
+                await asyncio.wait((chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if not chunk.done():
+                    chunk.cancel()
+                    # Let the generator unwind (and release what it holds) before aclose()
+                    await asyncio.wait((chunk,))
+                    return
+                try:
+                    chunk = chunk.result()
+                except StopAsyncIteration:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await body.aclose()
+
+    async def _call_wsgi(self, scope, body, receive, send):
+        """Run the Flask app on the thread pool and relay its response.
+
+        One thread runs the whole request, including iterating a streamed
+        body. stream_with_context generators must start and finish in the
+        same context. A bounded queue stops the thread from running ahead
+        of the client.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=_STREAM_AHEAD)
+        stop = threading.Event()
+        environ = wsgi_environ(scope, body)
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def run():
+            status = []
+            started = False
+
+            def start_response(status_line, headers, exc_info=None):
+                status[:] = [int(status_line.split(' ', 1)[0]), headers]
+
+            try:
+                result = self.flask(environ, start_response)
+                try:
+                    for chunk in result:
+                        if stop.is_set():
+                            break
+                        if chunk:
+                            if not started:
+                                put(('start', *status))
+                                started = True
+                            put(('body', chunk))
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                if not started:
+                    put(('start', *status))
+                    started = True
+            except Exception as e:
+                print('ASGI: error in Flask request:', e)
+                if not started:
+                    put(('start', 500, [('Content-Type', 'text/plain; charset=utf-8')]))
+                    put(('body', b'Internal Server Error'))
+            finally:
+                put(('end',))
+
+        done = loop.run_in_executor(self.executor, run)
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while True:
+                item = await chunks.get()
+                if item[0] == 'end':
+                    break
+                if stop.is_set():
+                    continue  # keep draining so the thread can finish
+                if disconnected.done():
+                    stop.set()
+                elif item[0] == 'start':
+                    await send({'type': 'http.response.start', 'status': item[1],
+                                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in item[2]]})
+                else:
+                    await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+            if not stop.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await done
+
+    # ---- native routes (same contracts as the Flask routes in app.py) ----
+
+    async def health(self, request):
+        return self.json({'status': 'ok', 'db_pool': pool_stats(), 'async_db_pool': async_pool_stats(),
+                          'menu_cache': menu_cache.stats(), 'stats_cache': stats_cache.stats(),
+                          'order_events': order_events.stats(), 'order_ids': order_ids.stats()})
+
+    async def _load_menu_views(self):
+        rows = await fetch(MENU_SQL)
+        with self.flask.app_context():
+            return menu_views([dict(row) for row in rows])
+
+    async def get_menu(self, request):
+        available_only = request.args.get('available') in ('1', 'true', 'True')
+        try:
+            body, etag = (await menu_cache.aget(self._load_menu_views))['available' if available_only else 'all']
+        except Exception as e:
+            return self.json({'success': False, 'message': str(e)}, 500)
+        return self.conditional(request, etag, lambda: Response(body))
+
+    async def _load_stats(self):
+        row = await fetchrow(*stats.stats_query())
+        with self.flask.app_context():
+            return stats_view(stats.stats_figures(row))
+
+    async def get_stats(self, request):
+        try:
+            body, etag = await stats_cache.aget(self._load_stats)
+        except Exception as e:
+            return self.json({'success': False, 'message': str(e)}, 500)
+        return self.conditional(request, etag, lambda: Response(body))
+
+    async def _orders_body(self, request, fingerprint_sql, fingerprint_params, sql, params, limit):
+        """Fingerprint and list the orders on one pooled connection.
+
+        The first item yielded is the ETag (after which the caller may close
+        the generator for a 304), then the body: stream_orders() from app.py,
+        one chunk per fetch. A page (``limit``) is a single fetch; a full
+        listing walks a cursor.
+        """
+        provider = self.flask.json
+        count, last, has_more = 0, None, False
+        encode = None
+        async with (await get_pool()).acquire(timeout=DB_POOL_TIMEOUT) as conn:
+            text, args = numbered(fingerprint_sql, fingerprint_params)
+            fingerprint = tuple((await conn.fetchrow(text, *args)).values())
+            yield make_etag('orders', sorted(request.args.items(multi=True)), fingerprint)
+
+            yield '{"orders":['
+            text, args = numbered(sql, params)
+            async with conn.transaction(readonly=True):
+                async for rows in self._batches(conn, text, args, limit):
+                    chunk = []
+                    if encode is None and rows:
+                        encode = json_provider.RowEncoder(list(rows[0].keys()), provider).encode
+                    for row in rows:
+                        if limit and count == limit:
+                            has_more = True
+                            break
+                        chunk.append((',' if count else '') + encode(row))
+                        count, last = count + 1, row
+                    yield ''.join(chunk)
+        next_cursor = encode_order_cursor(last) if has_more else None
+        yield '],"next_cursor":' + provider.dumps(next_cursor) + ',"success":true}\n'
+
+    @staticmethod
+    async def _batches(conn, text, args, limit):
+        if limit:
+            # At most limit + 1 rows: one round-trip, no cursor
+            yield await conn.fetch(text, *args)
+            return
+        batch = []
+        async for row in conn.cursor(text, *args, prefetch=ORDERS_FETCH_SIZE):
+            batch.append(row)
+            if len(batch) == ORDERS_FETCH_SIZE:
+                yield batch
+                batch = []
+        yield batch
+
+    async def get_orders(self, request):
+        try:
+            query = orders_query(request.args)
+        except ValueError as e:
+            return self.json({'success': False, 'message': str(e)}, 400)
+        body = self._orders_body(request, *query)
+        try:
+            etag = await body.__anext__()
+        except Exception as e:
+            return self.json({'success': False, 'message': str(e)}, 500)
+        response = self.conditional(request, etag, lambda: Response(body))
+        if response.body is not body:
+            await body.aclose()  # 304: hand the connection back
+        return response
+
+    async def order_stream(self, request):
+        user_id = request.args.get('user_id')
+        is_admin = request.args.get('admin') in ('1', 'true', 'True')
+        if not user_id and not is_admin:
+            return self.json({'success': False, 'message': 'user_id or admin query param required'}, 400)
+        if not is_admin and not user_id.isdigit():
+            return None
+        last_event_id = request.headers.get('last-event-id') or request.args.get('last_event_id')
+        stream = order_events.astream(None if is_admin else int(user_id), last_event_id)
+        return Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    async def checkout(self, request):
+        try:
+            data = request.get_json() or {}
+        except ValueError:
+            return None  # Flask answers a malformed or non-JSON body with its own 400
+        try:
+            order = Checkout(data)
+            async with (await get_pool()).acquire(timeout=DB_POOL_TIMEOUT) as conn:
+                async with conn.transaction():
+                    body = await run_steps(conn, order.steps(order_ids))
+        except Exception as e:
+            body, status = checkout_error_response(e)
+            return self.json(body, status)
+        stats_cache.bump()
+        return self.json(body)
+
+
+def create_asgi_app(migrate_database=True):
+    """create_app() served over ASGI; takes the same arguments."""
+    return AsyncCanteenApp(create_app(migrate_database))
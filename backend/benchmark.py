@@ -0,0 +1,532 @@
+"""
+Load benchmarks for the Smart Canteen backend.
+
+Each subcommand prints a small before/after comparison against the
+database configured through the usual DB_* environment variables.
+
+Run: python benchmark.py pool --threads 16 --seconds 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import psycopg2.extensions
+from psycopg2.extras import Json
+
+from checkout import Checkout
+from db import ConnectionPool, connect
+import menu_import
+from order_ids import OrderIdAllocator, sequence_name
+import stats
+
+MENU_QUERY = 'SELECT * FROM menu_items ORDER BY category, item_name'
+
+# Serving modes for the startup and serve benchmarks: (gunicorn worker class, app).
+# migrate_database=False: time the serving, not the schema check
+SERVE_MODES = {
+    'wsgi': (None, 'app:create_app(migrate_database=False)'),
+    'asgi': ('uvicorn.workers.UvicornWorker', 'asgi:create_asgi_app(migrate_database=False)'),
+}
+
+
+def _run_threads(worker, threads, seconds):
+    """Run ``worker`` in a loop on N threads and return completed calls."""
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def loop(slot):
+        while time.monotonic() < deadline:
+            worker()
+            counts[slot] += 1
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts)
+
+
+def _report(label, calls, seconds):
+    print(f"{label:<28} {calls:>8} requests  {calls / seconds:>9.1f} req/s")
+
+
+def bench_pool(args):
+    """Connect-per-request (old get_db_connection) vs the pooled path."""
+    def unpooled():
+        conn = connect()
+        cur = conn.cursor()
+        cur.execute(MENU_QUERY)
+        cur.fetchall()
+        cur.close()
+        conn.close()
+
+    pool = ConnectionPool(minconn=1, maxconn=args.pool_size)
+
+    def pooled():
+        conn = pool.getconn()
+        try:
+            cur = conn.cursor()
+            cur.execute(MENU_QUERY)
+            cur.fetchall()
+            cur.close()
+        finally:
+            pool.putconn(conn)
+
+    print(f"Threads: {args.threads}, duration: {args.seconds}s, pool size: {args.pool_size}")
+    _report('connect per request', _run_threads(unpooled, args.threads, args.seconds), args.seconds)
+    _report('pooled', _run_threads(pooled, args.threads, args.seconds), args.seconds)
+    print('Pool stats:', pool.stats())
+    pool.closeall()
+
+
+def bench_order_ids(args):
+    """Old probe-until-free random IDs vs the sequence + Feistel allocator.
+
+    Runs against a TEMP table seeded with --existing random IDs, and a TEMP
+    sequence that shadows the real one, so nothing persists.
+    """
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('CREATE TEMP TABLE bench_orders (order_id TEXT UNIQUE NOT NULL)')
+    cur.execute("""
+        INSERT INTO bench_orders
+        SELECT 'ORD-STU' || (100000 + floor(random() * 900000))::int FROM generate_series(1, %s)
+        ON CONFLICT DO NOTHING
+    """, (args.existing,))
+    cur.execute(f'CREATE TEMP SEQUENCE {sequence_name("STU")} MINVALUE 0 START 0')
+    conn.commit()
+    cur.execute('SELECT COUNT(*) FROM bench_orders')
+    print(f"Existing orders: {cur.fetchone()[0]}, allocating {args.orders} new IDs")
+
+    probes = 0
+    start = time.perf_counter()
+    for _ in range(args.orders):
+        while True:
+            order_id = f'ORD-STU{random.randint(100000, 999999)}'
+            probes += 1
+            cur.execute('SELECT COUNT(*) FROM bench_orders WHERE order_id = %s', (order_id,))
+            if cur.fetchone()[0] == 0:
+                break
+        cur.execute('INSERT INTO bench_orders VALUES (%s)', (order_id,))
+        conn.commit()
+    legacy = time.perf_counter() - start
+    print(f"{'random + probe':<28} {legacy / args.orders * 1000:>8.3f} ms/order  "
+          f"{(probes + args.orders) / args.orders:.3f} round-trips/order")
+
+    # The TEMP sequence is only visible on this connection: no background prefetch
+    allocator = OrderIdAllocator(block=args.block, prefetch=False)
+    conflicts = inserts = 0
+    start = time.perf_counter()
+    for _ in range(args.orders):
+        while True:
+            cur.execute('INSERT INTO bench_orders VALUES (%s) ON CONFLICT DO NOTHING RETURNING order_id',
+                        (allocator.next_id(cur, 'Student'),))
+            inserts += 1
+            if cur.fetchone():
+                break
+            conflicts += 1
+        conn.commit()
+    allocated = time.perf_counter() - start
+    # One nextval round-trip per block, plus one INSERT per attempt
+    round_trips = inserts + -(-inserts // args.block)
+    print(f"{'sequence + Feistel':<28} {allocated / args.orders * 1000:>8.3f} ms/order  "
+          f"{round_trips / args.orders:.3f} round-trips/order ({conflicts} legacy-ID conflicts retried)")
+    conn.close()
+
+
+def bench_checkout(args):
+    """Old multi-statement checkout vs the two-statement priced checkout.
+
+    Every order is rolled back, so the tables are left as they were (the
+    order ID sequences still advance). --rtt-ms adds a simulated network
+    round-trip to each statement; over loopback the extra work in the two
+    statements (row locks, the CTE) outweighs the round-trips saved.
+    """
+    conn = connect()
+    statements = [0]
+
+    class Cursor(conn.cursor_factory or psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            statements[0] += 1
+            if args.rtt_ms:
+                time.sleep(args.rtt_ms / 1000)
+            return super().execute(query, vars)
+
+    cur = conn.cursor(cursor_factory=Cursor)
+    cur.execute('SELECT id FROM users ORDER BY id LIMIT 1')
+    user_id = cur.fetchone()[0]
+    cur.execute('SELECT id, item_name, price FROM menu_items WHERE availability ORDER BY id LIMIT %s', (args.items,))
+    menu_rows = cur.fetchall()
+    conn.rollback()
+    cart = [{'id': r[0], 'name': r[1], 'price': float(r[2]), 'quantity': 1} for r in menu_rows]
+    legacy_ids, allocator = OrderIdAllocator(prefetch=False), OrderIdAllocator()
+    print(f"Cart: {len(cart)} items, {args.orders} orders per path")
+
+    def legacy():
+        # User lookup, INSERT, rollup upsert and NOTIFY, priced from the client
+        cur.execute('SELECT user_type FROM users WHERE id = %s', (user_id,))
+        user_type = cur.fetchone()[0]
+        total = sum(i['price'] * i['quantity'] for i in cart)
+        cur.execute("INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_method, payment_status, transaction_id) "
+                    "VALUES (%s, %s, %s, %s, 'Uncompleted', 'UPI', 'Paid', 'TXNBENCH') ON CONFLICT (order_id) DO NOTHING "
+                    "RETURNING order_id, user_id, status, created_at, payment_status, total_amount",
+                    (legacy_ids.next_id(cur, user_type), user_id, Json(cart), total))
+        row = cur.fetchone()
+        stats.record_order(cur, row[3], row[2], row[4], row[5])
+        cur.execute('SELECT pg_notify(%s, %s)', ('order_events_bench', row[0]))
+        conn.rollback()
+
+    def priced():
+        # The same steps as POST /api/checkout
+        Checkout({'user_id': user_id, 'cart': cart}).run(cur, allocator)
+        conn.rollback()
+
+    for label, fn in (('client-priced', legacy), ('server-priced', priced)):
+        statements[0] = 0
+        start = time.perf_counter()
+        for _ in range(args.orders):
+            fn()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28} {elapsed / args.orders * 1000:>8.3f} ms/order  "
+              f"{statements[0] / args.orders:.3f} statements/order")
+    blocks = allocator.stats()
+    print(f"Order ID blocks reserved: {blocks['prefetched']} in the background, "
+          f"{blocks['in_transaction']} inside a checkout")
+    conn.close()
+
+
+def bench_menu_import(args):
+    """Where a /api/menu/bulk upload spends its time: parse, validate, COPY + merge.
+
+    The merge is rolled back, so menu_items is left as it was.
+    """
+    header = 'item_name,price,category,description,availability\n'
+    body = (header + ''.join(f'Bench Item {n},{n % 500 + 10}.50,Category {n % 12},Item {n},{"true" if n % 7 else "no"}\n'
+                             for n in range(args.rows))).encode()
+    conn = connect()
+    cur = conn.cursor()
+    timings = {}
+    for _ in range(args.repeat):
+        phases = []
+        start = time.perf_counter()
+        rows, columns = menu_import.parse_upload(body, 'text/csv')
+        phases.append(('parse', time.perf_counter()))
+        valid, errors = menu_import.validate_rows(rows, columns)
+        phases.append(('validate', time.perf_counter()))
+        cur.execute(menu_import.TEMP_TABLE_SQL)
+        cur.copy_expert(menu_import.COPY_SQL, menu_import.copy_buffer(valid))
+        cur.execute(menu_import.merge_sql(columns))
+        cur.fetchall()
+        phases.append(('copy + merge', time.perf_counter()))
+        conn.rollback()
+        for name, end in phases:
+            timings.setdefault(name, []).append((end - start) * 1000)
+            start = end
+    total = sum(min(t) for t in timings.values())
+    print(f"{args.rows} rows, best of {args.repeat} ({len(valid)} valid, {len(errors)} errors)")
+    for name, samples in timings.items():
+        print(f"{name:<14} {min(samples):>9.1f} ms  {min(samples) / total:>6.1%}  "
+              f"{min(samples) * 1000 / args.rows:>7.2f} us/row")
+    conn.close()
+
+
+def _boot_gunicorn(preload, args, mode='wsgi'):
+    """Start gunicorn, wait until every worker has answered; return (proc, seconds, pids)."""
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0', GUNICORN_WORKERS=str(args.workers),
+               PORT=str(args.port), RECOMMENDATIONS_ENGINE=args.engine)
+    here = os.path.dirname(os.path.abspath(__file__))
+    worker_class, app = SERVE_MODES[mode]
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+                            + (['-k', worker_class] if worker_class else []) + [app],
+                            cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pids = set()
+    deadline = time.monotonic() + args.timeout
+    while len(pids) < args.workers:
+        if time.monotonic() > deadline or proc.poll() is not None:
+            proc.kill()
+            raise SystemExit(f'gunicorn did not bring up {args.workers} workers within {args.timeout}s')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{args.port}/api/health', timeout=1) as r:
+                pids.add(json.load(r)['db_pool']['pid'])
+        except OSError:
+            time.sleep(0.02)
+    return proc, time.perf_counter() - start, pids
+
+
+def bench_startup(args):
+    """Boot time and per-worker memory with and without gunicorn preload_app."""
+    import psutil
+
+    print(f"{args.workers} workers, RECOMMENDATIONS_ENGINE={args.engine}")
+    print(f"{'mode':<12} {'boot s':>8} {'master MB':>10} {'worker RSS':>11} {'worker PSS':>11} "
+          f"{'worker USS':>11} {'total PSS':>10}")
+    for preload in (False, True):
+        proc, boot_s, pids = _boot_gunicorn(preload, args)
+        try:
+            master = psutil.Process(proc.pid).memory_full_info()
+            workers = [psutil.Process(pid).memory_full_info() for pid in pids]
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        mb = 1024 * 1024
+
+        def avg(field):
+            return sum(getattr(m, field) for m in workers) / len(workers) / mb
+
+        total_pss = (master.pss + sum(m.pss for m in workers)) / mb
+        print(f"{'preload' if preload else 'no preload':<12} {boot_s:>8.2f} {master.rss / mb:>10.1f} "
+              f"{avg('rss'):>11.1f} {avg('pss'):>11.1f} {avg('uss'):>11.1f} {total_pss:>10.1f}")
+
+
+# Requests timed by the metrics benchmark: cached, keyset page, full listing, export
+METRICS_PATHS = ('/api/menu', '/api/stats', '/api/orders?admin=true&limit=50', '/api/orders?admin=true',
+                 '/api/orders/export?admin=true')
+
+
+def bench_metrics(args):
+    """Per-request cost of the metrics middleware and timed cursors: METRICS_ENABLED=1 vs 0.
+
+    METRICS_ENABLED is read at import, so each setting runs in its own
+    process, serving each path in-process through Flask's test client for
+    --seconds. The settings alternate over --rounds and the best round counts.
+    """
+    if args.child:
+        from app import create_app
+
+        client = create_app(migrate_database=False).test_client()
+        result = {}
+        for path in METRICS_PATHS:
+            client.get(path).get_data()
+            calls, start = 0, time.perf_counter()
+            while time.perf_counter() - start < args.seconds:
+                response = client.get(path)
+                response.get_data()
+                response.close()
+                calls += 1
+            result[path] = (time.perf_counter() - start) / calls
+        print(json.dumps(result))
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = {'0': {}, '1': {}}
+    for _ in range(args.rounds):
+        for enabled in best:
+            env = dict(os.environ, METRICS_ENABLED=enabled)
+            out = subprocess.run([sys.executable, 'benchmark.py', 'metrics', '--child', '--seconds', str(args.seconds)],
+                                 cwd=here, env=env, capture_output=True, text=True, check=True).stdout
+            for path, seconds in json.loads(out.strip().splitlines()[-1]).items():
+                best[enabled][path] = min(seconds, best[enabled].get(path, seconds))
+    print(f"{'path':<36} {'off ms':>9} {'on ms':>9} {'overhead':>10}")
+    for path in METRICS_PATHS:
+        off, on = best['0'][path] * 1000, best['1'][path] * 1000
+        print(f"{path:<36} {off:>9.3f} {on:>9.3f} {on - off:>+8.3f}ms {(on - off) / off:>+7.1%}")
+
+
+# Read-only requests whose bodies must be identical in both serving modes
+PARITY_PATHS = ('/api/menu', '/api/menu?available=true', '/api/stats', '/api/orders?admin=true&limit=50',
+                '/api/orders?user_id=1', '/api/orders?admin=true&fields=order_id,status&limit=5',
+                '/api/orders?admin=true&limit=0', '/api/orders', '/api/menu/1',
+                '/api/recommendations?cart_items=Tea,Samosa')
+SERVE_PATHS = ('/api/menu', '/api/orders?user_id=1&limit=20', '/api/stats')
+
+
+async def _http_get(reader, writer, path):
+    """One keep-alive GET; returns (status, body). Handles chunked responses."""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode('latin-1'))
+    head = (await reader.readuntil(b'\r\n\r\n')).lower()
+    status = int(head.split(b' ', 2)[1])
+    length = re.search(rb'\r\ncontent-length: *(\d+)', head)
+    if length:
+        return status, await reader.readexactly(int(length.group(1)))
+    body = []
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+        chunk = await reader.readexactly(size + 2)
+        if not size:
+            return status, b''.join(body)
+        body.append(chunk[:-2])
+
+
+async def _load(port, paths, clients, streams, warmup, seconds, think):
+    """Closed-loop load from ``clients`` keep-alive connections; returns (latencies, errors).
+
+    Each client pauses a random 0..2*``think`` seconds between requests, like
+    a browser tab; with think=0 they send back to back (saturation).
+    """
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + seconds
+    latencies, errors = [], {}
+
+    async def client(offset):
+        writer = None
+        i = offset
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                if writer is not None:
+                    try:
+                        status, _ = await _http_get(reader, writer, paths[i % len(paths)])
+                    except (ConnectionResetError, asyncio.IncompleteReadError):
+                        # The server closed the idle keep-alive connection; reconnect like a browser
+                        writer.close()
+                        writer = None
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                    status, _ = await _http_get(reader, writer, paths[i % len(paths)])
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                status = type(e).__name__
+                if writer is not None:
+                    writer.close()
+                writer = None
+                await asyncio.sleep(0.05)
+            i += 1
+            if start >= measure_from:
+                if status == 200:
+                    latencies.append(time.monotonic() - start)
+                else:
+                    errors[status] = errors.get(status, 0) + 1
+            if think:
+                await asyncio.sleep(random.uniform(0, 2 * think))
+        if writer is not None:
+            writer.close()
+
+    async def idle_stream(user_id):
+        # A browser tab holding /api/orders/stream open and receiving nothing
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET /api/orders/stream?user_id={user_id} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode())
+            while time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(reader.read(4096), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+            writer.close()
+        except OSError:
+            errors['stream'] = errors.get('stream', 0) + 1
+
+    await asyncio.gather(*[idle_stream(100000 + n) for n in range(streams)],
+                         *[client(n) for n in range(clients)])
+    return latencies, errors
+
+
+def bench_serve(args):
+    """Requests/sec and latency percentiles of the WSGI and ASGI serving modes."""
+    import resource
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * (args.clients + args.streams) + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    paths = args.path or SERVE_PATHS
+    print(f"{args.workers} workers, {args.clients} clients (think {args.think:g}s), {args.streams} idle order "
+          f"streams, {args.seconds:g}s after {args.warmup:g}s warm-up; paths: {', '.join(paths)}")
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}  errors")
+    bodies = {}
+    for mode in args.modes:
+        proc, _, _ = _boot_gunicorn(True, args, mode)
+        try:
+            if not args.no_check:
+                bodies[mode] = {}
+                for path in PARITY_PATHS:
+                    try:
+                        with urllib.request.urlopen(f'http://127.0.0.1:{args.port}{path}', timeout=10) as r:
+                            bodies[mode][path] = (r.status, r.read())
+                    except urllib.error.HTTPError as e:
+                        bodies[mode][path] = (e.code, e.read())
+            latencies, errors = asyncio.run(_load(args.port, paths, args.clients, args.streams,
+                                                  args.warmup, args.seconds, args.think))
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        latencies.sort()
+
+        def pct(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float('nan')
+
+        print(f"{mode:<6} {len(latencies) / args.seconds:>9.0f} {pct(0.5):>8.1f} {pct(0.9):>8.1f} "
+              f"{pct(0.99):>8.1f} {pct(1):>8.1f}  {errors or '-'}")
+
+    if len(bodies) == 2:
+        wsgi, asgi = bodies['wsgi'], bodies['asgi']
+        different = [path for path in PARITY_PATHS if wsgi[path] != asgi[path]]
+        for path in different:
+            print(f"MISMATCH {path}: wsgi {wsgi[path][0]} {wsgi[path][1][:80]!r}, "
+                  f"asgi {asgi[path][0]} {asgi[path][1][:80]!r}")
+        print(f"Responses identical in both modes for {len(PARITY_PATHS) - len(different)}/{len(PARITY_PATHS)} "
+              f"parity requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('pool', help='connection pool throughput')
+    p.add_argument('--threads', type=int, default=16)
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--pool-size', type=int, default=10)
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser('order-ids', help='order ID allocation latency')
+    p.add_argument('--existing', type=int, default=100000)
+    p.add_argument('--orders', type=int, default=5000)
+    p.add_argument('--block', type=int, default=20)
+    p.set_defaults(func=bench_order_ids)
+
+    p = sub.add_parser('checkout', help='checkout statement latency')
+    p.add_argument('--orders', type=int, default=2000)
+    p.add_argument('--items', type=int, default=4)
+    p.add_argument('--rtt-ms', type=float, default=0)
+    p.set_defaults(func=bench_checkout)
+
+    p = sub.add_parser('menu-import', help='bulk menu import time per phase')
+    p.add_argument('--rows', type=int, default=10000)
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=bench_menu_import)
+
+    p = sub.add_parser('metrics', help='per-request overhead of /api/metrics instrumentation')
+    p.add_argument('--seconds', type=float, default=3, help='time spent on each path per round')
+    p.add_argument('--rounds', type=int, default=3)
+    p.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser('startup', help='gunicorn boot time and worker memory, with and without preload')
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--engine', choices=['rule', 'hybrid'], default='rule')
+    p.add_argument('--port', type=int, default=5099)
+    p.add_argument('--timeout', type=float, default=120)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('serve', help='req/s and p99 under many concurrent clients, WSGI vs ASGI mode')
+    p.add_argument('--modes', nargs='+', choices=list(SERVE_MODES), default=list(SERVE_MODES))
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--clients', type=int, default=1000)
+    p.add_argument('--think', type=float, default=0, help='mean seconds each client waits between requests')
+    p.add_argument('--streams', type=int, default=0, help='idle /api/orders/stream connections held open')
+    p.add_argument('--seconds', type=float, default=20)
+    p.add_argument('--warmup', type=float, default=3)
+    p.add_argument('--path', action='append', help=f"request path, repeatable (default: {' '.join(SERVE_PATHS)})")
+    p.add_argument('--no-check', action='store_true', help='skip comparing responses between modes')
+    p.add_argument('--engine', choices=['rule', 'hybrid'], default='rule')
+    p.add_argument('--port', type=int, default=5098)
+    p.add_argument('--timeout', type=float, default=120)
+    p.set_defaults(func=bench_serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
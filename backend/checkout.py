@@ -0,0 +1,190 @@
+"""Checkout pricing: the cart is priced from menu_items, never from the client.
+
+Checkout is two statements in one transaction. CHECKOUT_LOOKUP_SQL reads
+the user's type and every cart item's price and availability with
+``id = ANY(...)``, taking FOR SHARE row locks so an admin flipping an item
+to unavailable waits until the order has committed (and the next checkout
+sees the flip). CHECKOUT_INSERT_SQL then inserts the order, updates the
+daily stats rollup and queues the 'created' event in a single CTE.
+
+``Checkout`` holds everything else both serving modes share: request
+validation, pricing, the order ID retry loop and the error responses.
+Its database side, ``steps()``, is a generator of statements, so app.py
+(psycopg2) and asgi.py (asyncpg) only differ in how they run them.
+"""
+import uuid
+from decimal import Decimal
+
+from psycopg2.extras import Json
+
+from order_events import notify_sql
+import stats
+
+# Order IDs tried before checkout gives up on UNIQUE conflicts with legacy IDs
+ORDER_ID_MAX_ATTEMPTS = 5
+# Sent with a 503 when checkout fails after validation (pool timeout, database down)
+CHECKOUT_UNAVAILABLE = 'Checkout is temporarily unavailable; no order was placed and nothing was charged'
+
+# One statement: the cart's menu rows (locked FOR SHARE so an availability
+# flip waits for this checkout to commit) alongside the user's type
+CHECKOUT_LOOKUP_SQL = """
+    SELECT u.user_type, m.id, m.item_name, m.price, m.availability
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT id, item_name, price, availability FROM menu_items
+        WHERE id = ANY(%(item_ids)s) FOR SHARE
+    ) m ON true
+    WHERE u.id = %(user_id)s
+"""
+
+# One statement: insert the order, add it to the daily rollup and queue the
+# 'created' event. No row back means the order ID clashed with a legacy one.
+CHECKOUT_INSERT_SQL = f"""
+    WITH new_order AS (
+        INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_method, payment_status, transaction_id)
+        VALUES (%(order_id)s, %(user_id)s, %(items)s, %(total)s, 'Uncompleted', %(payment_method)s, 'Paid', %(transaction_id)s)
+        ON CONFLICT (order_id) DO NOTHING
+        RETURNING order_id, user_id, status, created_at, payment_status, total_amount
+    ), rollup AS ({stats.rollup_insert_sql('new_order')}
+    ), notified AS ({notify_sql('new_order', 'created')}
+    )
+    SELECT order_id, (SELECT COUNT(*) FROM notified) FROM new_order
+"""
+
+
+def parse_cart(cart):
+    """Return ``{item_id: quantity}`` for a cart of ``{id, quantity}`` entries.
+
+    Names and prices sent by the client are ignored; checkout prices the
+    order from menu_items.
+    """
+    quantities = {}
+    for item in cart:
+        if not isinstance(item, dict) or 'id' not in item or 'quantity' not in item:
+            raise ValueError('Invalid cart item format')
+        try:
+            item_id, quantity = int(item['id']), int(item['quantity'])
+        except (TypeError, ValueError):
+            raise ValueError('Invalid id/quantity in cart')
+        if quantity < 1:
+            raise ValueError('Invalid id/quantity in cart')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+
+def price_cart(quantities, menu):
+    """Return ``(items, total)`` for the order, priced from the locked menu rows.
+
+    ``menu`` maps item id to a CHECKOUT_LOOKUP_SQL row. The total is a
+    Decimal so it matches NUMERIC(10,2) exactly.
+    """
+    items = [{'id': i, 'name': menu[i][2], 'price': float(menu[i][3]), 'quantity': q}
+             for i, q in quantities.items()]
+    total = sum((menu[i][3] * q for i, q in quantities.items()), Decimal('0'))
+    return items, total
+
+
+class CheckoutError(Exception):
+    """A checkout refused before anything was stored, with the status to send."""
+
+    def __init__(self, status, message, items=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.items = items
+
+    def body(self):
+        body = {'success': False, 'message': self.message}
+        if self.items is not None:
+            body['items'] = self.items
+        return body
+
+
+def error_response(e):
+    """``(body, status)`` for an exception raised while checking out."""
+    if isinstance(e, CheckoutError):
+        return e.body(), e.status
+    # Nothing was stored: never tell the client it paid
+    print('Checkout error:', e)
+    return {'success': False, 'message': CHECKOUT_UNAVAILABLE}, 503
+
+
+class Checkout:
+    """One POST /api/checkout, validated on construction (CheckoutError if not)."""
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise CheckoutError(400, 'Expected a JSON object')
+        cart = data.get('cart', [])
+        self.payment_method = data.get('payment_method', 'UPI')
+
+        # Handle both direct user_id and nested user object
+        user_id = data.get('user_id')
+        if not user_id:
+            user = data.get('user') or {}
+            user_id = user.get('id') if isinstance(user, dict) else None
+
+        if not cart:
+            raise CheckoutError(400, 'Cart is empty')
+        if not user_id:
+            raise CheckoutError(400, 'User ID is required')
+        try:
+            self.user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise CheckoutError(400, 'Invalid user ID')
+        try:
+            self.quantities = parse_cart(cart)
+        except ValueError as e:
+            raise CheckoutError(400, str(e))
+
+    def price(self, rows):
+        """``(user_type, items, total)`` from the CHECKOUT_LOOKUP_SQL rows."""
+        if not rows:
+            raise CheckoutError(404, 'User not found')
+        menu = {row[1]: row for row in rows if row[1] is not None}
+        missing = [i for i in self.quantities if i not in menu]
+        if missing:
+            raise CheckoutError(400, 'Unknown menu items', missing)
+        unavailable = [menu[i][2] for i in self.quantities if not menu[i][4]]
+        if unavailable:
+            raise CheckoutError(409, 'Some items are no longer available', unavailable)
+        return (rows[0][0], *price_cart(self.quantities, menu))
+
+    def steps(self, order_ids):
+        """The checkout's statements, run in one transaction.
+
+        Yields ``(sql, params)`` in psycopg2 style and is sent each
+        statement's rows; returns the response body. Besides the two
+        checkout statements, a block of order IDs is reserved when
+        ``order_ids`` (an OrderIdAllocator) has none left.
+        """
+        rows = yield CHECKOUT_LOOKUP_SQL, {'user_id': self.user_id, 'item_ids': list(self.quantities)}
+        user_type, items, total = self.price(rows)
+        params = {'user_id': self.user_id, 'items': Json(items), 'total': total,
+                  'payment_method': self.payment_method,
+                  'transaction_id': 'TXN' + uuid.uuid4().hex[:10].upper()}
+
+        # A clash with a legacy random ID just takes the next one
+        prefix = order_ids.prefix(user_type)
+        for _ in range(ORDER_ID_MAX_ATTEMPTS):
+            counter = order_ids.reserved(prefix)
+            if counter is None:
+                rows = yield order_ids.block_query(prefix)
+                counter = order_ids.keep_block(prefix, [row[0] for row in rows])
+            params['order_id'] = order_ids.format(prefix, counter)
+            rows = yield CHECKOUT_INSERT_SQL, params
+            if rows:
+                return {'success': True, 'message': 'Payment processed', 'orderId': rows[0][0],
+                        'amount': float(total), 'items': items}
+        raise RuntimeError('could not allocate a unique order ID')
+
+    def run(self, cur, order_ids):
+        """steps() on a psycopg2 cursor; the caller commits."""
+        steps = self.steps(order_ids)
+        try:
+            statement = next(steps)
+            while True:
+                cur.execute(*statement)
+                statement = steps.send(cur.fetchall())
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,295 @@
+"""Co-purchase association mining over the orders history.
+
+canteen_associations.json is written by hand; the orders table knows what
+people actually buy together. This miner keeps, per pair of items, the
+number of orders containing both (plus per-item and total order counts)
+in three small tables, and exports the strongest pairings as a rules file
+the rule-based engine loads next to, or instead of, the static rules (see
+RECOMMENDATIONS_RULES in canteen/backend/recommendation_engine.py).
+
+Mining is incremental. Orders are streamed in (created_at, id) order
+through a server-side cursor, and the last order counted is stored as a
+watermark, so each run reads only orders placed since the previous one.
+Memory is bounded by the number of distinct item pairs seen since the last
+flush, not by the number of orders. Counts and the watermark are flushed
+together every COPURCHASE_FLUSH_ORDERS orders, in one transaction, so an
+interrupted run resumes where it stopped without double counting.
+
+Orders younger than COPURCHASE_LAG_SECONDS are left for the next run:
+created_at is the inserting transaction's start time, so a slow checkout
+can commit an order that sorts before one already counted.
+
+For a pair (a, b) over N orders:
+    support    = orders(a, b) / N
+    confidence = orders(a, b) / orders(a)          (a -> b)
+    lift       = orders(a, b) * N / (orders(a) * orders(b))
+
+The tables come from the schema migrations, so the database must be
+migrated first (the app does it at startup, or run python migrate.py).
+
+Run from backend/ (uses the DB_* environment variables):
+    python copurchase.py mine              # count new orders, then export
+    python copurchase.py export --top 5 --min-orders 10
+    python copurchase.py reset             # forget all counts
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from itertools import combinations
+
+import psycopg2.extras
+
+from db import connect
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'canteen', 'backend'))
+from recommendation_engine import COPURCHASE_FILE, DEFAULT_DATA_DIR, normalize_name  # noqa: E402
+
+COPURCHASE_FLUSH_ORDERS = int(os.environ.get('COPURCHASE_FLUSH_ORDERS', '50000'))
+COPURCHASE_LAG_SECONDS = int(os.environ.get('COPURCHASE_LAG_SECONDS', '300'))
+# Rows per round trip from the server-side cursor
+COPURCHASE_FETCH_SIZE = 5000
+
+# copurchase_state, copurchase_items and copurchase_pairs are created by
+# migrations/0001_initial.sql (python migrate.py), not here
+TRUNCATE_SQL = 'TRUNCATE copurchase_pairs, copurchase_items, copurchase_state'
+
+# Walks idx_orders_created_at_id backwards; %(lag)s keeps in-flight checkouts out
+NEW_ORDERS_SQL = """
+    SELECT id, created_at, items
+    FROM orders
+    WHERE (created_at, id) > (%(created_at)s, %(id)s)
+      AND created_at < LOCALTIMESTAMP - %(lag)s * INTERVAL '1 second'
+    ORDER BY created_at, id
+"""
+
+_ADD_ITEMS_SQL = """
+    INSERT INTO copurchase_items (item, orders)
+    SELECT * FROM unnest(%s::text[], %s::bigint[])
+    ON CONFLICT (item) DO UPDATE SET orders = copurchase_items.orders + EXCLUDED.orders
+"""
+
+_ADD_PAIRS_SQL = """
+    INSERT INTO copurchase_pairs (item_a, item_b, orders)
+    SELECT * FROM unnest(%s::text[], %s::text[], %s::bigint[])
+    ON CONFLICT (item_a, item_b) DO UPDATE SET orders = copurchase_pairs.orders + EXCLUDED.orders
+"""
+
+_ADVANCE_SQL = """
+    INSERT INTO copurchase_state (id, orders, last_created_at, last_order_id)
+    VALUES (true, %(orders)s, %(created_at)s, %(id)s)
+    ON CONFLICT (id) DO UPDATE
+    SET orders = copurchase_state.orders + EXCLUDED.orders,
+        last_created_at = EXCLUDED.last_created_at,
+        last_order_id = EXCLUDED.last_order_id,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Both directions of every pair, scored and ranked per source item in SQL
+RANKED_PAIRS_SQL = """
+    WITH directed AS (
+        SELECT item_a AS source, item_b AS target, orders FROM copurchase_pairs
+        UNION ALL
+        SELECT item_b, item_a, orders FROM copurchase_pairs
+    ),
+    scored AS (
+        SELECT d.source, d.target, d.orders,
+               d.orders::float8 / st.orders AS support,
+               d.orders::float8 / s.orders AS confidence,
+               d.orders::float8 * st.orders / (s.orders * t.orders) AS lift
+        FROM directed d
+        JOIN copurchase_items s ON s.item = d.source
+        JOIN copurchase_items t ON t.item = d.target
+        CROSS JOIN copurchase_state st
+        WHERE d.orders >= %(min_orders)s
+    ),
+    ranked AS (
+        SELECT *, row_number() OVER (PARTITION BY source ORDER BY {rank_by} DESC, orders DESC, target) AS rank
+        FROM scored
+        WHERE lift >= %(min_lift)s
+    )
+    SELECT source, target, orders, support, confidence, lift
+    FROM ranked
+    WHERE rank <= %(top)s
+    ORDER BY source, rank
+"""
+
+RANK_COLUMNS = ('confidence', 'lift', 'support')
+
+
+def order_items(items):
+    """Distinct normalized item names of one order's items JSON."""
+    if isinstance(items, str):
+        items = json.loads(items)
+    names = set()
+    for item in items or ():
+        if isinstance(item, dict):
+            name = item.get('name') or item.get('item_name')
+            if name:
+                names.add(normalize_name(name))
+    return names
+
+
+class CopurchaseCounts:
+    """Sparse counts added since the last flush: items, pairs and orders."""
+
+    def __init__(self):
+        self.items = Counter()
+        self.pairs = Counter()
+        self.orders = 0
+
+    def add(self, names):
+        self.orders += 1
+        self.items.update(names)
+        # Sorted, so each unordered pair has one key (item_a < item_b)
+        self.pairs.update(combinations(sorted(names), 2))
+
+    def flush(self, cur, watermark):
+        """Add the counts to the tables and advance the watermark (one transaction)."""
+        if self.items:
+            names, counts = zip(*self.items.items())
+            cur.execute(_ADD_ITEMS_SQL, (list(names), list(counts)))
+        if self.pairs:
+            keys, counts = zip(*self.pairs.items())
+            cur.execute(_ADD_PAIRS_SQL, ([a for a, _ in keys], [b for _, b in keys], list(counts)))
+        cur.execute(_ADVANCE_SQL, {'orders': self.orders, 'created_at': watermark[0], 'id': watermark[1]})
+        cur.connection.commit()
+        self.__init__()
+
+
+def mine(flush_orders=COPURCHASE_FLUSH_ORDERS, lag_seconds=COPURCHASE_LAG_SECONDS):
+    """Count every order after the watermark; returns the number of orders read."""
+    reader, writer = connect(), connect()
+    try:
+        wcur = writer.cursor()
+        wcur.execute('SELECT last_created_at, last_order_id FROM copurchase_state')
+        row = wcur.fetchone()
+        writer.commit()
+        watermark = (row[0], row[1]) if row and row[0] is not None else ('-infinity', 0)
+
+        # Named cursor: rows arrive COPURCHASE_FETCH_SIZE at a time, never all at once
+        reader.set_session(readonly=True)
+        rcur = reader.cursor(name='copurchase_orders')
+        rcur.itersize = COPURCHASE_FETCH_SIZE
+        rcur.execute(NEW_ORDERS_SQL, {'created_at': watermark[0], 'id': watermark[1], 'lag': lag_seconds})
+
+        counts = CopurchaseCounts()
+        read = 0
+        for order_id, created_at, items in rcur:
+            counts.add(order_items(items))
+            watermark = (created_at, order_id)
+            read += 1
+            if counts.orders >= flush_orders:
+                counts.flush(wcur, watermark)
+        if counts.orders:
+            counts.flush(wcur, watermark)
+        rcur.close()
+        return read
+    finally:
+        reader.close()
+        writer.close()
+
+
+def ranked_pairs(cur, top=5, min_orders=5, min_lift=1.0, rank_by='confidence'):
+    if rank_by not in RANK_COLUMNS:
+        raise ValueError(f'rank_by must be one of {RANK_COLUMNS}')
+    cur.execute(RANKED_PAIRS_SQL.format(rank_by=rank_by),
+                {'top': top, 'min_orders': min_orders, 'min_lift': min_lift})
+    return cur.fetchall()
+
+
+def export_rules(path=None, top=5, min_orders=5, min_lift=1.0, rank_by='confidence'):
+    """Write the ranked pairings in the rules-file format; returns the rule count."""
+    path = path or os.path.join(DEFAULT_DATA_DIR, COPURCHASE_FILE)
+    with connect() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute('SELECT orders, last_created_at FROM copurchase_state')
+        state = cur.fetchone() or {'orders': 0, 'last_created_at': None}
+        rows = ranked_pairs(cur, top, min_orders, min_lift, rank_by)
+        # Display names and categories from the current menu
+        cur.execute('SELECT item_name, category FROM menu_items')
+        menu = {normalize_name(r['item_name']): r for r in cur.fetchall()}
+    conn.close()
+
+    rules = {}
+    for row in rows:
+        source = row['source']
+        if source not in rules:
+            name = menu[source]['item_name'] if source in menu else source.replace('_', ' ')
+            rules[source] = {
+                'category': normalize_name(menu[source]['category']) if source in menu else '',
+                'pairs_with': [],
+                'priority': [],
+                'reason': f'Often ordered together with {name}',
+                'stats': [],
+            }
+        rule = rules[source]
+        rule['pairs_with'].append(row['target'])
+        rule['priority'].append(len(rule['pairs_with']))
+        rule['stats'].append({'item': row['target'], 'orders': row['orders'],
+                              'support': round(row['support'], 5),
+                              'confidence': round(row['confidence'], 4),
+                              'lift': round(row['lift'], 3)})
+
+    data = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'orders': state['orders'],
+        'through': state['last_created_at'].isoformat() if state['last_created_at'] else None,
+        'params': {'top': top, 'min_orders': min_orders, 'min_lift': min_lift, 'rank_by': rank_by},
+        'rules': rules,
+    }
+    # The rule engine reloads on mtime change; never let it see a partial file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+    return len(rules)
+
+
+def reset():
+    with connect() as conn:
+        cur = conn.cursor()
+        cur.execute(TRUNCATE_SQL)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_export_args(p):
+        p.add_argument('--output', help=f'rules file (default: canteen/backend/data/{COPURCHASE_FILE})')
+        p.add_argument('--top', type=int, default=5, help='pairings kept per item')
+        p.add_argument('--min-orders', type=int, default=5, help='orders a pair needs to be exported')
+        p.add_argument('--min-lift', type=float, default=1.0, help='drop pairs bought together by chance')
+        p.add_argument('--rank-by', choices=RANK_COLUMNS, default='confidence')
+
+    p = sub.add_parser('mine', help='count orders placed since the last run, then export')
+    p.add_argument('--flush-orders', type=int, default=COPURCHASE_FLUSH_ORDERS)
+    p.add_argument('--lag-seconds', type=int, default=COPURCHASE_LAG_SECONDS)
+    p.add_argument('--no-export', action='store_true')
+    add_export_args(p)
+    p = sub.add_parser('export', help='write the ranked pairing table only')
+    add_export_args(p)
+    sub.add_parser('reset', help='clear all counts and the watermark')
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        reset()
+        print('Co-purchase counts cleared.')
+        return
+    if args.command == 'mine':
+        start = time.perf_counter()
+        read = mine(args.flush_orders, args.lag_seconds)
+        print(f'Counted {read} new orders in {time.perf_counter() - start:.1f}s')
+        if args.no_export:
+            return
+    exported = export_rules(args.output, args.top, args.min_orders, args.min_lift, args.rank_by)
+    print(f'Exported pairings for {exported} items')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""PostgreSQL connection pool shared by every route in app.py.
+
+Each worker process owns one ConnectionPool. The pool is created lazily
+on first checkout and keyed by PID, so a pool inherited across a fork is
+never reused by the child.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from metrics import CONNECTION_FACTORY
+
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_NAME = os.environ.get('DB_NAME', 'canteen')
+DB_USER = os.environ.get('DB_USER', 'postgres')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'Kavin04')
+DB_PORT = os.environ.get('DB_PORT', '5432')
+
+# Per-worker pool sizing
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+# Seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+
+def connect():
+    """Open a new, unpooled connection (used by the pool and by scripts)."""
+    return psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT,
+                            connection_factory=CONNECTION_FACTORY)
+
+
+class ConnectionPool:
+    """Blocking, health-checked pool that keeps up to ``maxconn`` connections warm.
+
+    psycopg2.pool closes every connection above ``minconn`` on return, which
+    under concurrency degrades back to connect-per-request; this pool keeps
+    returned connections idle (LIFO) and only opens new ones when empty.
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 ping_after=DB_POOL_PING_AFTER):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # (connection, last returned at) pairs, most recently used last
+        self._idle = []
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'in_use': 0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def _connect(self):
+        conn = connect()
+        self._count('created')
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self):
+        """Check out a live connection, waiting up to ``timeout`` seconds."""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count('timeouts')
+                raise PoolError('connection pool exhausted')
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    conn = self._connect()
+                elif self._is_healthy(*entry):
+                    conn = entry[0]
+                else:
+                    self._close(entry[0])
+        except Exception:
+            self._slots.release()
+            raise
+        self._count('checkouts')
+        self._count('in_use')
+        return conn
+
+    def _close(self, conn):
+        self._count('discarded')
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def putconn(self, conn, close=False):
+        """Return a connection; broken connections are closed, not reused."""
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            if close or conn.closed:
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._close(conn)
+        finally:
+            self._count('in_use', -1)
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats.update({
+            'pid': self.pid,
+            'min': self.minconn,
+            'max': self.maxconn,
+            'open': stats['idle'] + stats['in_use'],
+        })
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it after fork if needed."""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool():
+    """Close this process's pool, e.g. in the gunicorn master before it forks.
+
+    A connection inherited across fork shares its socket with the parent;
+    workers must never use or close one, so none may be open at fork time.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def pool_stats():
+    """Pool metrics for /api/health; empty until the first checkout."""
+    if _pool is None or _pool.pid != os.getpid():
+        return {'pid': os.getpid(), 'open': 0}
+    return _pool.stats()
+
+
+@contextmanager
+def db_connection():
+    """Check out a pooled connection; roll back and re-raise on any error.
+
+    Callers commit explicitly, as before. Anything left uncommitted is
+    rolled back when the connection goes back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
@@ -0,0 +1,33 @@
+"""Gunicorn settings, picked up automatically when started from backend/.
+
+Run: gunicorn
+"""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from order_events import SSE_MAX_STREAMS  # noqa: E402
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+
+# Each /api/orders/stream client occupies a thread (not a whole sync worker,
+# and no pooled DB connection). A worker admits at most SSE_MAX_STREAMS of
+# them (16 by default, then 503 and polling), so threads are that cap plus
+# GUNICORN_REQUEST_THREADS left for every other request.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or
+              SSE_MAX_STREAMS + int(os.environ.get('GUNICORN_REQUEST_THREADS', '48')))
+
+# create_app() runs once in the master and workers inherit its state
+# copy-on-write; GUNICORN_PRELOAD=0 builds it in every worker instead
+# (needed for code reloading, which preloading disables).
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') not in ('0', 'false', 'False')
+
+
+def pre_fork(server, worker):
+    # Move everything built so far out of the collector's reach: a GC pass in
+    # a worker would otherwise write to (and so copy) every shared page
+    gc.freeze()
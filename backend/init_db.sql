@@ -1,5 +1,6 @@
 -- Smart Canteen Database Initialization Script
--- Run this script to create the database and tables
+-- Run this script to create the database and tables by hand. The app applies
+-- the same schema itself from migrations/ (python migrate.py); keep both in sync.
 
 -- Create database (run this as postgres superuser)
 -- CREATE DATABASE canteen;
@@ -20,7 +21,7 @@ CREATE TABLE IF NOT EXISTS users (
 -- Create menu_items table
 CREATE TABLE IF NOT EXISTS menu_items (
     id SERIAL PRIMARY KEY,
-    item_name TEXT NOT NULL,
+    item_name TEXT NOT NULL UNIQUE,
     price NUMERIC(10, 2) NOT NULL,
     category TEXT NOT NULL,
     description TEXT,
@@ -45,6 +46,21 @@ CREATE TABLE IF NOT EXISTS orders (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Per-prefix counters behind ORD-STU/FAC/GUE order IDs
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_fac MINVALUE 0 START 0;
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_gue MINVALUE 0 START 0;
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_stu MINVALUE 0 START 0;
+
+-- Daily order rollup behind /api/stats (maintained by checkout and status updates)
+CREATE TABLE IF NOT EXISTS order_daily_stats (
+    day DATE NOT NULL,
+    status TEXT NOT NULL,
+    payment_status TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, payment_status)
+);
+
 -- Insert sample admin user (password: admin123)
 INSERT INTO users (username, email, password, role) 
 VALUES ('admin', 'admin@canteen.com', 'admin123', 'admin')
@@ -73,6 +89,9 @@ ON CONFLICT DO NOTHING;
 CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at_id ON orders(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at ON orders(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders(status, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_menu_items_category ON menu_items(category);
 CREATE INDEX IF NOT EXISTS idx_menu_items_availability ON menu_items(availability);
 
@@ -0,0 +1,138 @@
+"""Faster JSON encoding for API responses, with unchanged output.
+
+``OrjsonProvider`` is Flask's ``DefaultJSONProvider`` with orjson doing
+the compact encoding (jsonify, response bodies and every
+``app.json.dumps(..., separators=(',', ':'))``). The bytes are the same
+as the default provider's: sorted keys, ASCII-escaped text, HTTP dates
+and strings for Decimal. orjson cannot reproduce some output, such as
+non-ASCII text, exponent floats (1e-05), non-string keys, integers over
+64 bits and indented debug output. That output goes to the default
+provider instead. The one difference: NaN and Infinity come out as
+null, where the default provider writes invalid JSON.
+
+``RowEncoder`` writes result rows (tuples from a plain cursor) straight
+to the same JSON objects, without building a dict per row.
+
+JSON_PROVIDER=default switches back to Flask's provider. So does a
+missing orjson.
+"""
+import functools
+import json
+import math
+import os
+import re
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson (when installed) or default
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+
+_COMPACT = {'separators': (',', ':')}
+if orjson is not None:
+    # Dates and dataclasses go through Flask's default(): HTTP dates and sorted keys
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+# orjson writes floats json gives an exponent as 1e16, 1e-7 or 0.000015
+_EXPONENT = re.compile(rb'e[-0-9]')
+
+
+def _same_as_json(out):
+    """False if orjson's ``out`` may differ from json.dumps(ensure_ascii=True).
+
+    Matches in string values give false positives, which only cost a
+    fallback. The checks are ordered fastest first.
+    """
+    return out.isascii() and b'\x7f' not in out and b'.0000' not in out and not _EXPONENT.search(out)
+
+
+_WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def _http_date(value):
+    """werkzeug's http_date(), formatted directly for naive (UTC) and UTC datetimes."""
+    if value.tzinfo is not None and value.tzinfo != timezone.utc:
+        return http_date(value)
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        _WEEKDAYS[value.weekday()], value.day, _MONTHS[value.month - 1],
+        value.year, value.hour, value.minute, value.second)
+
+
+def _default(value):
+    if type(value) is datetime:
+        return _http_date(value)
+    return DefaultJSONProvider.default(value)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider whose compact output is encoded by orjson."""
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs == _COMPACT and self.sort_keys and self.ensure_ascii:
+            try:
+                out = orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS)
+            except TypeError:  # orjson.JSONEncodeError: non-str keys, big ints, ...
+                pass
+            else:
+                if _same_as_json(out):
+                    return out.decode('ascii')
+        return super().dumps(obj, **kwargs)
+
+
+def install(app):
+    """Set ``app.json`` to the provider JSON_PROVIDER selects."""
+    if JSON_PROVIDER == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    elif JSON_PROVIDER not in ('orjson', 'default'):
+        raise ValueError(f'Unknown JSON_PROVIDER {JSON_PROVIDER!r}; expected orjson or default')
+
+
+def _float(value):
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+def _quoted(text):
+    return '"' + text + '"'
+
+
+# Exact types of column values, and how the default provider writes them
+_VALUE_ENCODERS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+    float: _float,
+    Decimal: lambda value: _quoted(str(value)),
+    datetime: lambda value: _quoted(_http_date(value)),
+    date: lambda value: _quoted(http_date(value)),
+}
+
+
+class RowEncoder:
+    """Encode rows in ``columns`` order as compact JSON objects.
+
+    ``encode(row)`` returns the same text as
+    ``provider.dumps(dict(zip(columns, row)), separators=(',', ':'))``.
+    Keys are sorted and quoted once. Common column types (text, numbers,
+    numeric, timestamps) are written directly. Anything else, such as
+    jsonb, goes to ``provider.dumps``.
+    """
+
+    def __init__(self, columns, provider):
+        order = sorted(range(len(columns)), key=lambda i: columns[i])
+        self._fields = [(i, encode_basestring_ascii(columns[i]) + ':') for i in order]
+        self._dumps = functools.partial(provider.dumps, separators=(',', ':'))
+
+    def encode(self, row):
+        encoder, dumps = _VALUE_ENCODERS.get, self._dumps
+        return '{' + ','.join([key + encoder(type(row[i]), dumps)(row[i]) for i, key in self._fields]) + '}'
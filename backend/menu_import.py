@@ -0,0 +1,154 @@
+"""Bulk menu import for /api/menu/bulk.
+
+A whole menu (CSV or a JSON array of items) is validated in one pass in
+Python, loaded into a temporary table with COPY, and merged into
+menu_items with a single INSERT ... ON CONFLICT (item_name) DO UPDATE.
+That is three round-trips for 10k rows instead of 10k requests.
+
+Rows are matched to existing items by item_name. Only the columns present
+in the upload are written on update. A CSV without an ``availability``
+column, for example, leaves every existing item's availability as it was.
+New items get the same defaults as POST /api/menu.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+COLUMNS = ('item_name', 'price', 'category', 'description', 'availability', 'image_url')
+REQUIRED = ('item_name', 'price', 'category')
+# NUMERIC(10, 2)
+MAX_PRICE = Decimal('99999999.99')
+
+_TRUE = ('true', 't', '1', 'yes', 'y')
+_FALSE = ('false', 'f', '0', 'no', 'n')
+
+TEMP_TABLE_SQL = """
+    CREATE TEMP TABLE menu_import (
+        line INTEGER NOT NULL,
+        item_name TEXT NOT NULL,
+        price NUMERIC(10, 2) NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT NOT NULL,
+        availability BOOLEAN NOT NULL,
+        image_url TEXT NOT NULL
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = """
+    COPY menu_import (line, item_name, price, category, description, availability, image_url)
+    FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description, image_url))
+"""
+
+
+def merge_sql(columns):
+    """The upsert, updating only ``columns`` (those present in the upload) on conflict."""
+    updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in COLUMNS if c in columns and c != 'item_name')
+    # xmax is 0 only for freshly inserted rows
+    return f"""
+        INSERT INTO menu_items (item_name, price, category, description, availability, image_url)
+        SELECT item_name, price, category, description, availability, image_url
+        FROM menu_import ORDER BY line
+        ON CONFLICT (item_name) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    """
+
+
+def parse_upload(body, content_type):
+    """Return ``(rows, columns)`` from a CSV or JSON upload.
+
+    JSON may be an array of items or ``{"items": [...]}``. Raises ValueError
+    when the body is not parseable at all.
+    """
+    if 'csv' in (content_type or ''):
+        text = body.decode('utf-8-sig')
+        reader = csv.DictReader(io.StringIO(text))
+        columns = [c.strip() for c in reader.fieldnames or ()]
+        reader.fieldnames = columns
+        return list(reader), set(columns)
+    try:
+        data = json.loads(body or b'null')
+    except ValueError as e:
+        raise ValueError(f'Invalid JSON: {e}')
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of menu items, or CSV with Content-Type: text/csv')
+    columns = set()
+    for row in data:
+        if isinstance(row, dict):
+            columns.update(row)
+    return data, columns
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError
+
+
+def validate_rows(rows, columns):
+    """Validate every row; return ``(valid, errors)``.
+
+    ``valid`` is a list of ``(line, values)`` ready for COPY, ``errors`` a
+    list of ``{'row': line, 'errors': [...]}``. Lines are 1-based data rows.
+    Later rows repeating an item_name are rejected: one statement cannot
+    update the same item twice.
+    """
+    errors = []
+    missing = [c for c in REQUIRED if c not in columns]
+    if missing:
+        return [], [{'row': None, 'errors': [f"Missing column(s): {', '.join(missing)}"]}]
+
+    valid, seen = [], {}
+    for line, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append({'row': line, 'errors': ['Row must be an object']})
+            continue
+        problems = []
+        name = str(row.get('item_name') or '').strip()
+        category = str(row.get('category') or '').strip()
+        if not name:
+            problems.append('item_name is required')
+        elif name in seen:
+            problems.append(f'Duplicate item_name (first on row {seen[name]})')
+        if not category:
+            problems.append('category is required')
+        try:
+            price = Decimal(str(row.get('price')).strip()).quantize(Decimal('0.01'))
+            if not 0 <= price <= MAX_PRICE:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            problems.append('price must be a number between 0 and 99999999.99')
+            price = None
+        availability = row.get('availability')
+        if availability is None or availability == '':
+            availability = True
+        else:
+            try:
+                availability = _parse_bool(availability)
+            except ValueError:
+                problems.append('availability must be true or false')
+
+        if problems:
+            errors.append({'row': line, 'item_name': name or None, 'errors': problems})
+            continue
+        seen[name] = line
+        valid.append((line, (name, price, category, str(row.get('description') or ''),
+                             availability, str(row.get('image_url') or ''))))
+    return valid, errors
+
+
+def copy_buffer(valid):
+    """The validated rows as CSV for COPY menu_import FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for line, (name, price, category, description, availability, image_url) in valid:
+        writer.writerow((line, name, price, category, description, 't' if availability else 'f', image_url))
+    buffer.seek(0)
+    return buffer
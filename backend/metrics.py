@@ -0,0 +1,409 @@
+"""Per-route request and database metrics, served at /api/metrics.
+
+``install(app)`` wraps the Flask app's WSGI callable. Every request is
+counted under its route and method (``/api/orders/<order_id>/status``,
+not the concrete path). It records an in-flight gauge, a latency
+histogram that runs until the last byte of the body has been sent, and a
+count per status code.
+
+Database time comes from ``TimedConnection``, the connection class
+``db.connect()`` uses. Its cursors time ``execute()``, ``executemany()``
+and ``copy_expert()`` and charge the time to the request running in that
+thread. Fetches are not timed, so a server-side cursor is charged only
+for opening it, not for streaming its rows. A statement slower than
+SLOW_QUERY_MS is printed together with the shape of its parameters
+(types and lengths, never values).
+
+The counters are one shared-memory array, allocated by ``create_app()``.
+Under gunicorn with preload_app every worker inherits it, so /api/metrics
+reports the whole server whichever worker answers. With
+GUNICORN_PRELOAD=0 each worker reports only its own requests.
+
+METRICS_ENABLED=0 turns all of it off: no middleware, plain psycopg2
+connections, and /api/metrics answers 404.
+"""
+import contextvars
+import multiprocessing
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+from psycopg2 import extensions
+from psycopg2.sql import Composable
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+# Statements slower than this (milliseconds) are printed; 0 prints every one
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+# Processes that can report at once (gunicorn workers, plus the master in tests)
+METRICS_SLOTS = int(os.environ.get('METRICS_SLOTS', '32'))
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Status codes counted individually; anything else is counted as "other"
+STATUSES = (200, 201, 204, 304, 400, 401, 403, 404, 405, 409, 413, 415, 500, 503)
+# Route label for requests no rule matched (404, 405)
+UNMATCHED = 'unmatched'
+_UNMATCHED_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS', 'other')
+
+# Layout of one (route, method) series in the shared array; the request
+# count is the sum of its buckets
+_IN_FLIGHT, _SUM, _DB_SECONDS, _DB_QUERIES = range(4)
+_BUCKETS = 4
+_STATUSES = _BUCKETS + len(LATENCY_BUCKETS) + 1
+_WIDTH = _STATUSES + len(STATUSES) + 1
+_STATUS_SLOTS = {status: _STATUSES + i for i, status in enumerate(STATUSES)}
+_OTHER_STATUS = _STATUSES + len(STATUSES)
+
+# The Metrics of this app, or None when disabled or not installed
+registry = None
+
+# RequestStats of the request being served by this thread or task
+_current = contextvars.ContextVar('canteen_request_stats', default=None)
+
+
+class RequestStats:
+    """What one request has used so far; written to the registry when it ends."""
+    __slots__ = ('start', 'series', 'db_seconds', 'db_queries')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.series = None
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+
+class Metrics:
+    """Counters for a fixed set of (route, method) series in shared memory.
+
+    Each process writes to its own slot, claimed on its first request, so
+    threads only contend with threads of the same worker. ``render()`` adds
+    the slots up. A slot left by a worker that has exited is reused by the
+    next new one, and keeps counting from where the old one stopped.
+    """
+
+    def __init__(self, series, slots=None):
+        self._series = {}
+        for key in list(series) + [(UNMATCHED, method) for method in _UNMATCHED_METHODS]:
+            self._series.setdefault(key, len(self._series) * _WIDTH)
+        self._size = len(self._series) * _WIDTH
+        self._slots = slots or METRICS_SLOTS
+        self._values = multiprocessing.RawArray('d', self._slots * self._size)
+        self._pids = multiprocessing.RawArray('l', self._slots)
+        self._claim_lock = multiprocessing.Lock()
+        # This process's slot offset and lock; _claim() sets them again after a fork
+        self._base = 0
+        self._lock = None
+        os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+        self._lock = None
+
+    def _claim(self):
+        pid = os.getpid()
+        with self._claim_lock:
+            if self._lock is not None:
+                return  # another thread of this process got here first
+            free = None
+            for slot, owner in enumerate(self._pids):
+                if owner == pid:
+                    free = slot
+                    break
+                if free is None and (not owner or not _alive(owner)):
+                    free = slot
+            if free is None:
+                print(f'Warning: all {self._slots} METRICS_SLOTS are in use; '
+                      f'metrics of process {pid} are not shared')
+                self._values = multiprocessing.RawArray('d', self._slots * self._size)
+                free = 0
+            elif self._pids[free] != pid:
+                self._pids[free] = pid
+                base = free * self._size
+                # The previous owner's requests are no longer in flight
+                for offset in self._series.values():
+                    self._values[base + offset + _IN_FLIGHT] = 0
+            self._base = free * self._size
+            self._lock = threading.Lock()
+
+    def start(self):
+        """Begin timing a request in the current thread or task."""
+        stats = RequestStats()
+        _current.set(stats)
+        return stats
+
+    def matched(self, stats, route, method):
+        """Count ``stats`` as in flight on ``route``; the route is known once routing is done."""
+        if self._lock is None:
+            self._claim()
+        offset = self._series.get((route, method))
+        if offset is None:
+            offset = self._unmatched(method)
+        stats.series = index = self._base + offset
+        with self._lock:
+            self._values[index + _IN_FLIGHT] += 1
+
+    def discard(self, stats):
+        """Forget a request that is handed on to be counted elsewhere."""
+        _current.set(None)
+        if stats.series is not None:
+            with self._lock:
+                self._values[stats.series + _IN_FLIGHT] -= 1
+
+    def _unmatched(self, method):
+        offset = self._series.get((UNMATCHED, method))
+        return self._series[(UNMATCHED, 'other')] if offset is None else offset
+
+    def finish(self, stats, status, method):
+        """Record a finished request; ``method`` is only used if it never matched a route."""
+        seconds = time.perf_counter() - stats.start
+        _current.set(None)
+        index = stats.series
+        in_flight = 1
+        if index is None:
+            if self._lock is None:
+                self._claim()
+            index, in_flight = self._base + self._unmatched(method), 0
+        values = self._values
+        with self._lock:
+            values[index + _IN_FLIGHT] -= in_flight
+            values[index + _SUM] += seconds
+            values[index + _BUCKETS + bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            values[index + _STATUS_SLOTS.get(status, _OTHER_STATUS)] += 1
+            if stats.db_queries:
+                values[index + _DB_SECONDS] += stats.db_seconds
+                values[index + _DB_QUERIES] += stats.db_queries
+
+    def totals(self):
+        """Every slot added up; in-flight counts only from processes still running."""
+        size = self._size
+        flat = memoryview(self._values).cast('B').cast('d').tolist()
+        values = [0.0] * size
+        for slot, pid in enumerate(self._pids):
+            if not pid:
+                continue
+            chunk = flat[slot * size:(slot + 1) * size]
+            if not _alive(pid):
+                for offset in self._series.values():
+                    chunk[offset + _IN_FLIGHT] = 0.0
+            values = [a + b for a, b in zip(values, chunk)]
+        return values
+
+    def render(self):
+        """All series that have seen a request, in Prometheus text format."""
+        values = self.totals()
+        counts = {offset: sum(values[offset + _BUCKETS:offset + _STATUSES]) for offset in self._series.values()}
+        active = [(route, method, offset) for (route, method), offset in sorted(self._series.items())
+                  if counts[offset] or values[offset + _IN_FLIGHT]]
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def labels(route, method, **extra):
+            pairs = [('method', method), ('route', route)] + list(extra.items())
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+        family('canteen_http_requests_in_flight', 'gauge', 'Requests currently being served.',
+               [f'canteen_http_requests_in_flight{labels(r, m)} {_number(values[o + _IN_FLIGHT])}'
+                for r, m, o in active])
+        samples = []
+        for route, method, offset in active:
+            cumulative = 0
+            for i, bound in enumerate(LATENCY_BUCKETS + ('+Inf',)):
+                cumulative += values[offset + _BUCKETS + i]
+                samples.append(f'canteen_http_request_duration_seconds_bucket'
+                               f'{labels(route, method, le=str(bound))} {_number(cumulative)}')
+            samples.append(f'canteen_http_request_duration_seconds_sum{labels(route, method)} '
+                           f'{_number(values[offset + _SUM])}')
+            samples.append(f'canteen_http_request_duration_seconds_count{labels(route, method)} '
+                           f'{_number(counts[offset])}')
+        family('canteen_http_request_duration_seconds', 'histogram',
+               'Time from receiving a request to sending the last byte of its response.', samples)
+        samples = []
+        for route, method, offset in active:
+            for status, slot in list(_STATUS_SLOTS.items()) + [('other', _OTHER_STATUS)]:
+                if values[offset + slot]:
+                    samples.append(f'canteen_http_responses_total{labels(route, method, status=str(status))} '
+                                   f'{_number(values[offset + slot])}')
+        family('canteen_http_responses_total', 'counter', 'Responses sent, by status code.', samples)
+        family('canteen_db_seconds_total', 'counter', 'Time spent in database statements.',
+               [f'canteen_db_seconds_total{labels(r, m)} {_number(values[o + _DB_SECONDS])}'
+                for r, m, o in active])
+        family('canteen_db_queries_total', 'counter', 'Database statements executed.',
+               [f'canteen_db_queries_total{labels(r, m)} {_number(values[o + _DB_QUERIES])}'
+                for r, m, o in active])
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsMiddleware:
+    """WSGI middleware timing each request until its body is closed."""
+
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        stats = self.metrics.start()
+        status = [500]
+
+        def timed_start_response(status_line, headers, exc_info=None):
+            status[0] = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, timed_start_response)
+        except BaseException:
+            self.metrics.finish(stats, 500, environ['REQUEST_METHOD'])
+            raise
+        return _TimedBody(body, self.metrics, stats, status, environ['REQUEST_METHOD'])
+
+
+class _TimedBody:
+    """A WSGI response body that finishes its request's timing when the server closes it."""
+
+    def __init__(self, body, metrics, stats, status, method):
+        self._body = body
+        self._finish = (metrics, stats, status, method)
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        metrics, stats, status, method = self._finish
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            metrics.finish(stats, status[0], method)
+
+
+def install(app):
+    """Time every request to ``app``; call after its routes are registered."""
+    global registry
+    if not METRICS_ENABLED:
+        registry = None
+        return
+    series = [(rule.rule, method) for rule in app.url_map.iter_rules() for method in sorted(rule.methods)]
+    registry = metrics = Metrics(series)
+
+    @app.before_request
+    def match_route():
+        stats = _current.get()
+        if stats is not None and request.url_rule is not None:
+            metrics.matched(stats, request.url_rule.rule, request.method)
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics)
+
+
+def record_query(statement, params, seconds, cursor=None):
+    """Charge a statement to the current request, and print it if slow."""
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.db_queries += 1
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        if isinstance(statement, Composable):
+            statement = statement.as_string(cursor)
+        elif isinstance(statement, bytes):
+            statement = statement.decode('utf-8', 'replace')
+        statement = re.sub(r'\s+', ' ', statement).strip()
+        if len(statement) > 500:
+            statement = statement[:500] + '...'
+        print(f'Slow query ({seconds * 1000:.0f} ms): {statement} params={params_shape(params)}')
+
+
+def params_shape(params):
+    """``(int, str, list[3])`` or ``{user_id: int}``: types and lengths, no values."""
+    if params is None:
+        return 'none'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {_shape(value)}' for key, value in params.items()) + '}'
+    if isinstance(params, (list, tuple)):
+        return '(' + ', '.join(_shape(value) for value in params) + ')'
+    return _shape(params)
+
+
+def _shape(value):
+    if isinstance(value, (list, tuple, dict)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+class _TimedCursor:
+    """Mixed into a cursor class to time its statements.
+
+    Fetches are not timed. For a named (server-side) cursor this leaves out
+    the FETCH round-trips. Timing them routed every row through Python and
+    cost more than the figure was worth (python benchmark.py metrics).
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, vars, time.perf_counter() - start, self)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, None, time.perf_counter() - start, self)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, None, time.perf_counter() - start, self)
+
+
+_timed_cursor_classes = {}
+
+
+def _timed(cursor_factory):
+    timed = _timed_cursor_classes.get(cursor_factory)
+    if timed is None:
+        timed = type(f'Timed{cursor_factory.__name__}', (_TimedCursor, cursor_factory), {})
+        _timed_cursor_classes[cursor_factory] = timed
+    return timed
+
+
+class TimedConnection(extensions.connection):
+    """psycopg2 connection whose cursors, of any cursor_factory, are timed."""
+
+    def cursor(self, name=None, cursor_factory=None, withhold=False, scrollable=None):
+        factory = _timed(cursor_factory or self.cursor_factory or extensions.cursor)
+        return super().cursor(name, cursor_factory=factory, withhold=withhold, scrollable=scrollable)
+
+
+# For db.connect(): timed connections only while metrics are on
+CONNECTION_FACTORY = TimedConnection if METRICS_ENABLED else None
+
+
+def asyncpg_query_logger(record):
+    """asyncpg query logger (Connection.add_query_logger) feeding record_query()."""
+    record_query(record.query, record.args, record.elapsed)
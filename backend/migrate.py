@@ -0,0 +1,151 @@
+"""Versioned schema migrations for the canteen database.
+
+Migrations are the numbered files in ``migrations/`` (``0001_initial.sql``,
+``0002_...``). Most are SQL. A ``.py`` migration defines ``upgrade(cur)``,
+for steps that reuse SQL kept in the app's modules. The ``schema_version``
+table records each applied number. Each file runs in its own transaction,
+together with its ``schema_version`` row, so it is applied completely or
+not at all.
+
+A boot where the schema is current costs a single query. Otherwise the
+runner takes a Postgres advisory lock before applying anything. Workers
+starting at the same time therefore queue behind whichever one is
+migrating. When they get the lock they see the new version and skip.
+
+Run by hand:
+
+    python migrate.py            # apply pending migrations
+    python migrate.py status     # show applied and pending versions
+"""
+import argparse
+import importlib.util
+import os
+import re
+
+import psycopg2
+
+from db import connect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Any constant works, as long as nothing else in the database uses it for pg_advisory_lock
+MIGRATION_LOCK_ID = 7264001
+
+SCHEMA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+_FILE_RE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+
+def available(directory=MIGRATIONS_DIR):
+    """``[(version, name, path)]`` for every migration file, in order."""
+    found = {}
+    for filename in os.listdir(directory):
+        match = _FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in found:
+            raise RuntimeError(f'Duplicate migration number {version}: {found[version][1]}, {filename}')
+        found[version] = (version, match.group(2), os.path.join(directory, filename))
+    return [found[v] for v in sorted(found)]
+
+
+def current_version(cur):
+    """Highest applied version; 0 for a database that has never been migrated."""
+    try:
+        cur.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+        return cur.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        cur.connection.rollback()
+        return 0
+
+
+def apply(cur, path):
+    """Run one migration file on ``cur``; the caller commits."""
+    if path.endswith('.py'):
+        spec = importlib.util.spec_from_file_location(f'migration_{os.path.basename(path)[:-3]}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cur)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        cur.execute(f.read())
+
+
+def migrate(directory=MIGRATIONS_DIR):
+    """Apply every pending migration; returns the schema version afterwards."""
+    migrations = available(directory)
+    latest = migrations[-1][0] if migrations else 0
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        version = current_version(cur)
+        conn.rollback()
+        if version >= latest:
+            if version > latest:
+                print(f'Warning: database schema is at version {version}, '
+                      f'newer than the latest migration ({latest})')
+            return version
+
+        # Session lock: released on unlock, or by Postgres if this process dies
+        cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+        try:
+            cur.execute(SCHEMA_VERSION_SQL)
+            conn.commit()
+            # Another worker may have migrated while this one waited for the lock
+            version = current_version(cur)
+            for number, name, path in migrations:
+                if number <= version:
+                    continue
+                try:
+                    apply(cur, path)
+                    cur.execute('INSERT INTO schema_version (version, name) VALUES (%s, %s)', (number, name))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                version = number
+                print(f'Applied migration {number:04d}_{name}')
+        finally:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+            conn.commit()
+        return version
+    finally:
+        conn.close()
+
+
+def status(directory=MIGRATIONS_DIR):
+    """``[(version, name, applied_at or None)]`` for every migration file."""
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        applied = {}
+        if current_version(cur):
+            cur.execute('SELECT version, applied_at FROM schema_version')
+            applied = dict(cur.fetchall())
+        return [(number, name, applied.get(number)) for number, name, _ in available(directory)]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('up', help='apply pending migrations (the default)')
+    sub.add_parser('status', help='list applied and pending migrations')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        for number, name, applied_at in status():
+            print(f'{number:04d}_{name:<32} {applied_at or "pending"}')
+        return
+    print(f'Schema is at version {migrate()}')
+
+
+if __name__ == '__main__':
+    main()
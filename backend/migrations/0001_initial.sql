@@ -0,0 +1,103 @@
+-- Schema as created by init_db() before migrations existed. Every statement
+-- is idempotent, so databases set up by init_db() or init_db.sql keep their
+-- data. Where their tables differ from these, 0001 leaves them as they are:
+-- 0003 adds the menu_items UNIQUE (item_name) they lack, and 0004 fills the
+-- stats rollup from their existing orders.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT DEFAULT 'user',
+    user_type TEXT DEFAULT 'Student',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS menu_items (
+    id SERIAL PRIMARY KEY,
+    item_name TEXT NOT NULL UNIQUE,
+    price NUMERIC(10, 2) NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    availability BOOLEAN DEFAULT true,
+    image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id SERIAL PRIMARY KEY,
+    order_id TEXT UNIQUE NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    items JSONB NOT NULL,
+    total_amount NUMERIC(10, 2) NOT NULL,
+    status TEXT DEFAULT 'Pending',
+    payment_method TEXT,
+    payment_status TEXT DEFAULT 'Pending',
+    transaction_id TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-prefix counters behind ORD-STU/FAC/GUE order IDs (order_ids.py)
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_fac MINVALUE 0 START 0;
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_gue MINVALUE 0 START 0;
+CREATE SEQUENCE IF NOT EXISTS order_id_seq_stu MINVALUE 0 START 0;
+
+-- Keyset pagination indexes for /api/orders (created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_orders_created_at_id ON orders (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at ON orders (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders (status, created_at DESC, id DESC);
+
+-- Daily rollup behind /api/stats (stats.py)
+CREATE TABLE IF NOT EXISTS order_daily_stats (
+    day DATE NOT NULL,
+    status TEXT NOT NULL,
+    payment_status TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, payment_status)
+);
+
+-- Co-purchase counts and watermark (copurchase.py)
+CREATE TABLE IF NOT EXISTS copurchase_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    orders BIGINT NOT NULL DEFAULT 0,
+    last_created_at TIMESTAMP,
+    last_order_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS copurchase_items (
+    item TEXT PRIMARY KEY,
+    orders BIGINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS copurchase_pairs (
+    item_a TEXT NOT NULL,
+    item_b TEXT NOT NULL,
+    orders BIGINT NOT NULL,
+    PRIMARY KEY (item_a, item_b),
+    CHECK (item_a < item_b)
+);
+
+-- Demo users: admin/admin123 (admin), user/user123 (user)
+INSERT INTO users (username, email, password, role)
+VALUES ('admin', 'admin@canteen.com', 'admin123', 'admin'),
+       ('user', 'user@canteen.com', 'user123', 'user')
+ON CONFLICT DO NOTHING;
+
+-- Demo menu, only into an empty menu
+INSERT INTO menu_items (item_name, price, category, description, availability)
+SELECT * FROM (VALUES
+    ('Chicken Burger', 120.00, 'Main Course', 'Juicy chicken burger with fresh vegetables', true),
+    ('Vegetable Sandwich', 80.00, 'Snacks', 'Healthy vegetable sandwich with multigrain bread', true),
+    ('Coffee', 30.00, 'Beverages', 'Hot brewed coffee', true),
+    ('Tea', 25.00, 'Beverages', 'Hot masala tea', true),
+    ('Pasta', 150.00, 'Main Course', 'Italian pasta with white sauce', true),
+    ('French Fries', 60.00, 'Snacks', 'Crispy golden french fries', true),
+    ('Fresh Juice', 40.00, 'Beverages', 'Fresh fruit juice', true),
+    ('Pizza Slice', 100.00, 'Main Course', 'Cheesy pizza slice', true),
+    ('Samosa', 20.00, 'Snacks', 'Crispy vegetable samosa (2 pieces)', true),
+    ('Ice Cream', 50.00, 'Desserts', 'Vanilla ice cream cup', true)
+) AS demo (item_name, price, category, description, availability)
+WHERE NOT EXISTS (SELECT 1 FROM menu_items);
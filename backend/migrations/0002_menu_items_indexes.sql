@@ -0,0 +1,5 @@
+-- Indexes init_db.sql always had but init_db() never created. The orders
+-- indexes there (user_id, status, created_at) are leading prefixes of the
+-- keyset indexes from 0001, so they are not added here.
+CREATE INDEX IF NOT EXISTS idx_menu_items_category ON menu_items (category);
+CREATE INDEX IF NOT EXISTS idx_menu_items_availability ON menu_items (availability);
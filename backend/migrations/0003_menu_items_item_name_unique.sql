@@ -0,0 +1,20 @@
+-- init_db() created menu_items without UNIQUE (item_name), which
+-- /api/menu/bulk needs for ON CONFLICT (item_name). Databases from 0001
+-- already have the constraint; older ones get it here. Later duplicates
+-- of a name are renamed, not deleted, since orders refer to item ids.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'menu_items'::regclass AND conname = 'menu_items_item_name_key'
+    ) THEN
+        UPDATE menu_items m
+        SET item_name = m.item_name || ' (' || m.id || ')', updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY item_name ORDER BY id) AS n FROM menu_items
+        ) d
+        WHERE d.id = m.id AND d.n > 1;
+        ALTER TABLE menu_items ADD CONSTRAINT menu_items_item_name_key UNIQUE (item_name);
+    END IF;
+END
+$$;
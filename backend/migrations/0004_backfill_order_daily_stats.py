@@ -0,0 +1,12 @@
+"""Fill order_daily_stats from orders.
+
+0001 creates the rollup empty, and checkout and status updates only apply
+deltas to it. A database that already had orders would report them as
+missing, and count pending orders below zero. Rebuilding is also correct
+for a database whose rollup is already current.
+"""
+import stats
+
+
+def upgrade(cur):
+    stats.rebuild_rollup(cur)
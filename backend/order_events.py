@@ -0,0 +1,284 @@
+"""Order change events for the /api/orders/stream Server-Sent Events endpoint.
+
+Writers call ``notify_order_event`` inside their transaction, which issues
+a Postgres NOTIFY that is delivered on commit. Each worker process runs one
+listener thread on a dedicated connection and fans events out to its SSE
+clients, so an open stream holds no pooled connection.
+
+Every listener sees notifications in commit order, so a bounded ring of
+recent events is enough to replay from a client's Last-Event-ID. When that
+id has already fallen out of the ring the client is told to ``resync``.
+
+Under gthread every open stream() holds a worker thread, so at most
+SSE_MAX_STREAMS of them run per worker. Beyond that the route answers 503
+and the page polls instead. astream() (asgi.py) holds no thread and is
+not capped.
+"""
+import asyncio
+import collections
+import json
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+
+from psycopg2 import extensions
+
+from db import connect
+
+CHANNEL = 'order_events'
+
+# Recent events kept per worker for Last-Event-ID replay
+ORDER_EVENTS_BUFFER = int(os.environ.get('ORDER_EVENTS_BUFFER', '1000'))
+# Seconds between keep-alive comments on an idle stream
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', '15'))
+# Streams are closed after this many seconds; EventSource reconnects with Last-Event-ID
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', '300'))
+# Milliseconds the browser waits before reconnecting
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+# Thread-holding streams per worker; gunicorn.conf.py sizes its threads on top of this
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '16'))
+# Seconds between /api/orders polls suggested to clients turned away
+SSE_POLL_INTERVAL = int(os.environ.get('SSE_POLL_INTERVAL', '30'))
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def notify_order_event(cur, event_type, order):
+    """Queue an order event in the caller's transaction (sent on commit).
+
+    ``order`` must contain order_id, user_id and status; any other fields
+    are passed through to clients.
+    """
+    payload = {'id': uuid.uuid4().hex, 'type': event_type}
+    payload.update(order)
+    cur.execute('SELECT pg_notify(%s, %s)', (CHANNEL, json.dumps(payload, default=str)))
+
+
+def notify_sql(source, event_type):
+    """SELECT that notifies one ``event_type`` event per row of ``source`` (a CTE).
+
+    ``source`` must expose order_id, user_id, status, total_amount and
+    created_at, e.g. an INSERT INTO orders ... RETURNING. Reference the CTE
+    from the outer query so it runs.
+    """
+    return f"""
+        SELECT pg_notify('{CHANNEL}', json_build_object(
+            'id', md5(random()::text || clock_timestamp()::text), 'type', '{event_type}',
+            'order_id', order_id, 'user_id', user_id, 'status', status,
+            'total_amount', total_amount, 'created_at', created_at::text)::text)
+        FROM {source}
+    """
+
+
+def format_event(event):
+    """Render one event in text/event-stream framing."""
+    return f"id: {event['id']}\nevent: order\ndata: {json.dumps(event)}\n\n"
+
+
+def format_resync(last_id):
+    # Re-anchor the client's Last-Event-ID so the next reconnect replays from here
+    return f"id: {last_id or ''}\nevent: resync\ndata: {{}}\n\n"
+
+
+class Subscription:
+    """One SSE client: a bounded queue filtered to a user or to everything (admin)."""
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.user_id is None or event.get('user_id') == self.user_id
+
+    def offer(self, event):
+        if self.overflowed or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: stop queueing and make it resync on reconnect
+            self.overflowed = True
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription read by an asyncio stream (asgi.py).
+
+    The listener thread calls ``offer``; events are handed to the event
+    loop, so a waiting stream costs no thread.
+    """
+
+    def __init__(self, user_id=None):
+        super().__init__(user_id)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event):
+        if self.overflowed or not self.wants(event):
+            return
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class OrderEventHub:
+    """Per-process LISTEN thread plus replay buffer and subscriber fan-out."""
+
+    def __init__(self, buffer_size=ORDER_EVENTS_BUFFER, max_streams=SSE_MAX_STREAMS):
+        self._events = collections.deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.max_streams = max_streams
+        self._streams = 0
+
+    def start(self):
+        """Start the listener thread once per process (safe to call per request)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # A forked child inherits no threads, only the parent's buffer
+            self._events.clear()
+            self._subscribers = set()
+            threading.Thread(target=self._listen, name='order-events', daemon=True).start()
+
+    def _listen(self):
+        reconnect = False
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute(f'LISTEN {CHANNEL}')
+                if reconnect:
+                    # Notifications sent while disconnected are lost
+                    self._broadcast_resync()
+                reconnect = True
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print('order events listener error:', e)
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(2)
+
+    def _dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(event)
+
+    def _broadcast_resync(self):
+        with self._lock:
+            self._events.clear()
+            for sub in self._subscribers:
+                sub.overflowed = True
+
+    def subscribe(self, user_id=None, last_event_id=None, subscription_class=Subscription):
+        """Register a client; returns ``(subscription, backlog, resync)``."""
+        sub = subscription_class(user_id)
+        backlog, resync = [], False
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_event_id:
+                ids = [e['id'] for e in self._events]
+                if last_event_id in ids:
+                    start = ids.index(last_event_id) + 1
+                    backlog = [e for e in list(self._events)[start:] if sub.wants(e)]
+                else:
+                    resync = True
+        return sub, backlog, resync
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def last_event_id(self):
+        with self._lock:
+            return self._events[-1]['id'] if self._events else None
+
+    def acquire_stream(self):
+        """Claim one of the worker's ``max_streams`` stream() slots; False if none is free."""
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def release_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def stream(self, user_id=None, last_event_id=None):
+        """Yield text/event-stream chunks for one client until SSE_MAX_DURATION."""
+        self.start()
+        sub, backlog, resync = self.subscribe(user_id, last_event_id)
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            if resync:
+                yield format_resync(self.last_event_id())
+            for event in backlog:
+                yield format_event(event)
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                if sub.overflowed:
+                    yield format_resync(self.last_event_id())
+                    return
+                try:
+                    event = sub.queue.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(sub)
+
+    async def astream(self, user_id=None, last_event_id=None):
+        """stream() as an async generator, for the ASGI app."""
+        self.start()
+        sub, backlog, resync = self.subscribe(user_id, last_event_id, AsyncSubscription)
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            if resync:
+                yield format_resync(self.last_event_id())
+            for event in backlog:
+                yield format_event(event)
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                if sub.overflowed:
+                    yield format_resync(self.last_event_id())
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'buffered': len(self._events),
+                    'streams': self._streams, 'max_streams': self.max_streams}
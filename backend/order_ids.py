@@ -0,0 +1,153 @@
+"""Order ID allocation: ORD-{PREFIX}{6 digits} without probing the orders table.
+
+Each prefix (STU, FAC, GUE) has its own Postgres sequence. Workers reserve
+sequence values in blocks, so most checkouts allocate an ID with no
+round-trip at all. When half a block is left, a background thread reserves
+the next one on its own pooled connection, outside any checkout. Only a
+worker's first checkout on a prefix, or a burst that uses up the rest of a
+block before that refill lands, reserves a block inside the checkout
+transaction (counted as ``in_transaction`` in /api/health). The counter is passed through a keyed Feistel
+permutation of the 900000 six-digit numbers, so consecutive orders do not
+get guessable consecutive IDs, yet two counters never map to the same ID.
+
+IDs issued by the old random generator can still collide; checkout inserts
+with ON CONFLICT DO NOTHING and simply takes the next ID.
+"""
+import hashlib
+import hmac
+import os
+import threading
+
+from db import db_connection
+
+PREFIX_MAP = {
+    'Student': 'STU',
+    'Staff': 'FAC',
+    'Faculty': 'FAC',
+    'Guest': 'GUE'
+}
+PREFIXES = sorted(set(PREFIX_MAP.values()))
+
+# Keep this secret and stable: changing it reshuffles future IDs only
+ORDER_ID_SECRET = os.environ.get('ORDER_ID_SECRET', 'smart-canteen-order-ids')
+# Sequence values reserved per round-trip, per worker and prefix
+ORDER_ID_BLOCK = int(os.environ.get('ORDER_ID_BLOCK', '20'))
+# Reserve the next block in the background once half of one is used
+ORDER_ID_PREFETCH = os.environ.get('ORDER_ID_PREFETCH', '1') not in ('0', 'false', 'False')
+
+ID_SPACE = 900000  # 100000..999999
+_HALF_BITS = 10    # Feistel network over 20 bits (1048576 >= ID_SPACE)
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def sequence_name(prefix):
+    return f'order_id_seq_{prefix.lower()}'
+
+
+class OrderIdAllocator:
+    """Hands out collision-free, non-sequential order IDs per prefix."""
+
+    def __init__(self, secret=ORDER_ID_SECRET, block=ORDER_ID_BLOCK, prefetch=ORDER_ID_PREFETCH):
+        self._key = secret.encode('utf-8')
+        self.block = block
+        self.prefetch = prefetch
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reserved = {}
+        self._prefetching = set()
+        self._stats = {'prefetched': 0, 'in_transaction': 0}
+
+    def _round(self, half, r):
+        digest = hmac.new(self._key, f'{r}:{half}'.encode('ascii'), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], 'big') & _HALF_MASK
+
+    def permute(self, n):
+        """Bijectively map ``n`` in [0, ID_SPACE) onto [0, ID_SPACE)."""
+        x = n
+        while True:
+            left, right = x >> _HALF_BITS, x & _HALF_MASK
+            for r in range(_ROUNDS):
+                left, right = right, left ^ self._round(right, r)
+            x = (left << _HALF_BITS) | right
+            # Cycle-walk until we land back inside the six-digit range
+            if x < ID_SPACE:
+                return x
+
+    def format(self, prefix, counter):
+        """Render a sequence value as ORD-{PREFIX}{digits}."""
+        epoch, n = divmod(counter, ID_SPACE)
+        digits = str(100000 + self.permute(n))
+        # After 900000 orders on one prefix the ID grows a leading epoch digit
+        return f"ORD-{prefix}{epoch if epoch else ''}{digits}"
+
+    def reserved(self, prefix):
+        """The next counter from this worker's reserved block, or None when it is used up."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Blocks reserved by the parent must not be reused after fork
+                self._pid = os.getpid()
+                self._reserved = {}
+                self._prefetching = set()
+            values = self._reserved.get(prefix)
+            if not values:
+                return None
+            counter = values.pop()
+            prefetch = self.prefetch and len(values) <= self.block // 2 and prefix not in self._prefetching
+            if prefetch:
+                self._prefetching.add(prefix)
+        if prefetch:
+            threading.Thread(target=self._prefetch, args=(prefix, os.getpid()), name=f'order-ids-{prefix}',
+                             daemon=True).start()
+        return counter
+
+    def _prefetch(self, prefix, pid):
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(*self.block_query(prefix))
+                values = sorted((row[0] for row in cur.fetchall()), reverse=True)
+                conn.commit()
+                cur.close()
+            with self._lock:
+                if self._pid == pid:
+                    # Behind what is left of the current block
+                    self._reserved[prefix] = values + self._reserved.get(prefix, [])
+                    self._stats['prefetched'] += 1
+        except Exception as e:
+            print(f'Warning: could not prefetch order IDs for {prefix}:', e)
+        finally:
+            with self._lock:
+                self._prefetching.discard(prefix)
+
+    def block_query(self, prefix):
+        """``(sql, params)`` reserving the next block; pass its rows to keep_block()."""
+        return ('SELECT nextval(%s::regclass) FROM generate_series(1, %s::int)',
+                (sequence_name(prefix), self.block))
+
+    def keep_block(self, prefix, values):
+        """Keep a reserved block; returns its first counter for immediate use."""
+        values = sorted(values, reverse=True)
+        counter = values.pop()
+        with self._lock:
+            self._reserved.setdefault(prefix, []).extend(values)
+            self._stats['in_transaction'] += 1
+        return counter
+
+    def stats(self):
+        """Blocks reserved in the background and inside a checkout, for /api/health."""
+        with self._lock:
+            return dict(self._stats)
+
+    def next_id(self, cur, user_type):
+        """Allocate the next order ID for ``user_type`` (Guest if unknown)."""
+        prefix = self.prefix(user_type)
+        counter = self.reserved(prefix)
+        if counter is None:
+            cur.execute(*self.block_query(prefix))
+            counter = self.keep_block(prefix, [row[0] for row in cur.fetchall()])
+        return self.format(prefix, counter)
+
+    @staticmethod
+    def prefix(user_type):
+        return PREFIX_MAP.get(user_type, 'GUE')
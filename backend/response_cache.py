@@ -0,0 +1,90 @@
+"""In-process caches of serialized API responses.
+
+The menu changes a few times a day but is fetched on every dashboard load,
+and the admin dashboard refreshes /api/stats constantly, so both are kept
+as ready-to-send JSON bytes. Write routes call ``bump()``; a TTL bounds
+staleness for edits made directly in the database or through another
+worker process.
+"""
+import asyncio
+import threading
+import time
+
+
+class ResponseCache:
+    """Versioned, TTL-bounded cache of one loader's result."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        # Held while loading so concurrent misses share one query
+        self._load_lock = threading.Lock()
+        # Its asyncio counterpart, created on first aget() inside the event loop
+        self._async_lock = None
+        self._value = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self):
+        """Invalidate the cached value after a write."""
+        with self._lock:
+            self.version += 1
+
+    def _fresh(self):
+        return (self._value is not None
+                and self._loaded_version == self.version
+                and time.monotonic() - self._loaded_at < self.ttl)
+
+    def get(self, loader):
+        """Return the cached value, calling ``loader()`` if it is stale."""
+        if self._fresh():
+            self.hits += 1
+            return self._value
+        with self._load_lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value
+            version = self.version
+            value = loader()
+            self._store(version, value)
+            return value
+
+    async def aget(self, loader):
+        """get() for asyncio code (asgi.py): ``loader`` is a coroutine function.
+
+        Shares the cached value, version and counters with get(), so a bump()
+        from either serving mode invalidates both.
+        """
+        if self._fresh():
+            self.hits += 1
+            return self._value
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value
+            version = self.version
+            value = await loader()
+            self._store(version, value)
+            return value
+
+    def _store(self, version, value):
+        self.misses += 1
+        with self._lock:
+            # A bump() during the load means this value may already be stale
+            if version == self.version:
+                self._value = value
+                self._loaded_version = version
+                self._loaded_at = time.monotonic()
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,172 @@
+"""Admin dashboard statistics for /api/stats.
+
+Figures come either from one aggregate pass over the base tables or, by
+default, from the ``order_daily_stats`` rollup (orders and revenue per day,
+status and payment status). Checkout and status updates keep the rollup
+current in the same transaction as the order write, so reading it costs a
+scan of a few rows per day instead of the whole orders table.
+
+Those writes only apply deltas. Migration 0004 fills the rollup from the
+orders a database already had when the rollup was added. A rollup that has
+drifted (after direct edits to orders) is repaired from the command line:
+
+    python stats.py check       # compare the rollup with the orders table
+    python stats.py rebuild     # recompute it from the orders table
+"""
+import argparse
+import os
+
+# Read /api/stats from the rollup table; 0 falls back to scanning orders
+STATS_ROLLUP = os.environ.get('STATS_ROLLUP', '1') not in ('0', 'false', 'False')
+
+PENDING_STATUSES = ('Pending', 'Uncompleted', 'Preparing')
+
+ROLLUP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS order_daily_stats (
+        day DATE NOT NULL,
+        status TEXT NOT NULL,
+        payment_status TEXT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, status, payment_status)
+    )
+"""
+
+# Rebuilds the rollup from scratch (first install, or after direct edits).
+# The lock makes order writes wait, so none is counted twice or missed.
+ROLLUP_REBUILD_SQL = """
+    LOCK TABLE order_daily_stats IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM order_daily_stats;
+    INSERT INTO order_daily_stats (day, status, payment_status, orders, revenue)
+    SELECT created_at::date, COALESCE(status, ''), COALESCE(payment_status, ''), COUNT(*), SUM(total_amount)
+    FROM orders
+    GROUP BY 1, 2, 3;
+"""
+
+_ROLLUP_ADD_SQL = """
+    INSERT INTO order_daily_stats (day, status, payment_status, orders, revenue)
+    VALUES (%s::date, %s, %s, %s, %s)
+    ON CONFLICT (day, status, payment_status) DO UPDATE
+    SET orders = order_daily_stats.orders + EXCLUDED.orders,
+        revenue = order_daily_stats.revenue + EXCLUDED.revenue
+"""
+
+# Shared by both read paths; the base-table path keeps today's range sargable
+_OTHER_COUNTS = """
+    (SELECT COUNT(*) FROM users WHERE role = 'user') AS total_users,
+    (SELECT COUNT(*) FILTER (WHERE availability) FROM menu_items) AS available_items,
+    (SELECT COUNT(*) FILTER (WHERE NOT availability) FROM menu_items) AS unavailable_items
+"""
+
+BASE_STATS_SQL = f"""
+    SELECT COUNT(*) AS total_orders,
+           COALESCE(SUM(total_amount) FILTER (WHERE payment_status = 'Paid'), 0) AS total_revenue,
+           COUNT(*) FILTER (WHERE status = ANY(%(pending)s)) AS pending_orders,
+           COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1) AS orders_today,
+           COALESCE(SUM(total_amount) FILTER (WHERE payment_status = 'Paid'
+                    AND created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1), 0) AS revenue_today,
+           {_OTHER_COUNTS}
+    FROM orders
+"""
+
+ROLLUP_STATS_SQL = f"""
+    SELECT COALESCE(SUM(orders), 0) AS total_orders,
+           COALESCE(SUM(revenue) FILTER (WHERE payment_status = 'Paid'), 0) AS total_revenue,
+           COALESCE(SUM(orders) FILTER (WHERE status = ANY(%(pending)s)), 0) AS pending_orders,
+           COALESCE(SUM(orders) FILTER (WHERE day = CURRENT_DATE), 0) AS orders_today,
+           COALESCE(SUM(revenue) FILTER (WHERE day = CURRENT_DATE AND payment_status = 'Paid'), 0) AS revenue_today,
+           {_OTHER_COUNTS}
+    FROM order_daily_stats
+"""
+
+
+def rollup_insert_sql(source):
+    """INSERT adding every row of ``source`` (a CTE of new orders) to the rollup.
+
+    Lets a writer fold the rollup update into the same statement as its
+    INSERT INTO orders ... RETURNING created_at, status, payment_status, total_amount.
+    """
+    return f"""
+        INSERT INTO order_daily_stats (day, status, payment_status, orders, revenue)
+        SELECT created_at::date, COALESCE(status, ''), COALESCE(payment_status, ''), COUNT(*), SUM(total_amount)
+        FROM {source}
+        GROUP BY 1, 2, 3
+        ON CONFLICT (day, status, payment_status) DO UPDATE
+        SET orders = order_daily_stats.orders + EXCLUDED.orders,
+            revenue = order_daily_stats.revenue + EXCLUDED.revenue
+    """
+
+
+def record_order(cur, created_at, status, payment_status, amount, count=1):
+    """Add (or with count=-1 remove) one order in the daily rollup."""
+    cur.execute(_ROLLUP_ADD_SQL, (created_at, status or '', payment_status or '', count, amount * count))
+
+
+def record_status_change(cur, created_at, old_status, new_status, payment_status, amount):
+    """Move one order between status buckets in the daily rollup."""
+    if old_status == new_status:
+        return
+    record_order(cur, created_at, old_status, payment_status, amount, count=-1)
+    record_order(cur, created_at, new_status, payment_status, amount)
+
+
+def rebuild_rollup(cur):
+    """Recompute order_daily_stats from orders; the caller commits."""
+    cur.execute(ROLLUP_REBUILD_SQL)
+
+
+def stats_query(use_rollup=STATS_ROLLUP):
+    """``(sql, params)`` for the dashboard figures."""
+    return ROLLUP_STATS_SQL if use_rollup else BASE_STATS_SQL, {'pending': list(PENDING_STATUSES)}
+
+
+def load_stats(cur, use_rollup=STATS_ROLLUP):
+    """Return the dashboard figures with the keys the frontend expects."""
+    cur.execute(*stats_query(use_rollup))
+    return stats_figures(cur.fetchone())
+
+
+def stats_figures(row):
+    """Shape a stats_query() row (any mapping) for the frontend."""
+    return {
+        'totalUsers': int(row['total_users']),
+        'totalOrders': int(row['total_orders']),
+        'totalRevenue': float(row['total_revenue']),
+        'pendingOrders': int(row['pending_orders']),
+        'availableItems': int(row['available_items']),
+        'unavailableItems': int(row['unavailable_items']),
+        'ordersToday': int(row['orders_today']),
+        'revenueToday': float(row['revenue_today']),
+    }
+
+
+def main():
+    from psycopg2.extras import RealDictCursor
+
+    from db import connect
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('check', help='compare the rollup figures with a scan of the orders table')
+    sub.add_parser('rebuild', help='recompute order_daily_stats from the orders table')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if args.command == 'rebuild':
+            rebuild_rollup(cur)
+            conn.commit()
+            print('Rebuilt order_daily_stats from orders')
+            return
+        rollup, base = load_stats(cur, use_rollup=True), load_stats(cur, use_rollup=False)
+        for key in base:
+            print(f"{key:<18} {rollup[key]:>14} {base[key]:>14}{'' if rollup[key] == base[key] else '  MISMATCH'}")
+        if rollup != base:
+            print('The rollup has drifted; run: python stats.py rebuild')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
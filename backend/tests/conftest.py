@@ -0,0 +1,199 @@
+"""Fixtures for the backend tests.
+
+The tests need PostgreSQL, reached through the usual DB_* variables. They
+run against their own database, TEST_DB_NAME (default canteen_test), which
+is created afresh for each session and migrated by create_app(). The
+canteen database itself is never touched. Without a reachable server every
+test is skipped.
+
+The ``client`` fixture runs each test twice: against the Flask app, and
+against the ASGI app from asgi.py (skipped without asyncpg), so both
+serving modes are held to the same contract.
+
+Run from backend/: python -m pytest
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Before db.py reads it
+TEST_DB_NAME = os.environ['DB_NAME'] = os.environ.get('TEST_DB_NAME', 'canteen_test')
+
+import psycopg2  # noqa: E402
+
+import db  # noqa: E402
+
+# (item_name, price, category, availability); ids 1.. in this order
+MENU = [
+    ('Coffee', '30.00', 'Beverages', True),
+    ('Tea', '25.00', 'Beverages', True),
+    ('Samosa', '20.00', 'Snacks', True),
+    ('Pasta', '150.00', 'Main Course', True),
+    ('Ice Cream', '50.00', 'Desserts', False),
+]
+# Seeded by 0001_initial.sql
+ADMIN_ID, USER_ID = 1, 2
+
+
+def _server_connection():
+    conn = psycopg2.connect(host=db.DB_HOST, dbname='postgres', user=db.DB_USER, password=db.DB_PASSWORD,
+                            port=db.DB_PORT, connect_timeout=5)
+    conn.autocommit = True
+    return conn
+
+
+@pytest.fixture(scope='session')
+def database():
+    """A new, empty TEST_DB_NAME for the session."""
+    try:
+        server = _server_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f'PostgreSQL not reachable: {e}')
+    cur = server.cursor()
+    cur.execute(f'DROP DATABASE IF EXISTS {TEST_DB_NAME} WITH (FORCE)')
+    cur.execute(f"CREATE DATABASE {TEST_DB_NAME} ENCODING 'UTF8' TEMPLATE template0")
+    yield TEST_DB_NAME
+    db.close_pool()
+    cur.execute(f'DROP DATABASE IF EXISTS {TEST_DB_NAME} WITH (FORCE)')
+    server.close()
+
+
+@pytest.fixture(scope='session')
+def app(database):
+    from app import create_app
+
+    app = create_app()
+    app.testing = True
+    return app
+
+
+class AsgiClient:
+    """The parts of Flask's test client the tests use, served by asgi.AsyncCanteenApp."""
+
+    def __init__(self, flask_app):
+        from asgi import AsyncCanteenApp
+
+        self.flask = flask_app
+        self.app = AsyncCanteenApp(flask_app)
+        self.loop = asyncio.new_event_loop()
+
+    def open(self, path, method='GET', **kwargs):
+        builder = EnvironBuilder(path=path, method=method, **kwargs)
+        try:
+            environ = builder.get_environ()
+        finally:
+            builder.close()
+        return self.loop.run_until_complete(self._call(environ))
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open(path, 'PATCH', **kwargs)
+
+    async def _call(self, environ):
+        body = environ['wsgi.input'].read()
+        headers = [(key[5:].replace('_', '-').lower(), value) for key, value in environ.items()
+                   if key.startswith('HTTP_')]
+        if environ.get('CONTENT_TYPE'):
+            headers.append(('content-type', environ['CONTENT_TYPE']))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': environ['REQUEST_METHOD'], 'path': environ['PATH_INFO'], 'root_path': '',
+            'query_string': environ['QUERY_STRING'].encode('latin-1'),
+            'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+            'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # The client never disconnects early
+            await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        start = sent[0]
+        return self.flask.response_class(b''.join(m.get('body', b'') for m in sent[1:]), status=start['status'],
+                                         headers=[(k.decode('latin-1'), v.decode('latin-1'))
+                                                  for k, v in start['headers']])
+
+    def close(self):
+        from asgi import close_pool
+
+        self.loop.run_until_complete(close_pool())
+        self.loop.close()
+
+
+@pytest.fixture(scope='session')
+def asgi_client(app):
+    pytest.importorskip('asyncpg')
+    client = AsgiClient(app)
+    yield client
+    client.close()
+
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def client(request, app):
+    if request.param == 'asgi':
+        return request.getfixturevalue('asgi_client')
+    return app.test_client()
+
+
+def execute(sql, params=None):
+    """Run one statement on its own connection and commit; returns its rows, if any."""
+    conn = db.connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def reset_caches():
+    from app import menu_cache, stats_cache
+
+    menu_cache.bump()
+    stats_cache.bump()
+
+
+@pytest.fixture(autouse=True)
+def data(app):
+    """Every test starts with no orders, the MENU items and the seeded users."""
+    execute('TRUNCATE orders, order_daily_stats, menu_items RESTART IDENTITY')
+    execute("DELETE FROM users WHERE username NOT IN ('admin', 'user')")
+    execute('INSERT INTO menu_items (item_name, price, category, availability) '
+            'SELECT * FROM unnest(%s::text[], %s::numeric[], %s::text[], %s::boolean[])',
+            [list(column) for column in zip(*MENU)])
+    reset_caches()
+
+
+def add_user(username, user_type='Student'):
+    return execute('INSERT INTO users (username, email, password, user_type) VALUES (%s, %s, %s, %s) RETURNING id',
+                   (username, f'{username}@example.com', 'secret', user_type))[0][0]
+
+
+def add_order(order_id, user_id, status, created_at, items, payment_status='Paid'):
+    """Insert an order directly; ``items`` are (name, price, quantity). Returns its id."""
+    lines = [{'id': n, 'name': name, 'price': price, 'quantity': quantity}
+             for n, (name, price, quantity) in enumerate(items, 1)]
+    return execute("INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_method, "
+                   "payment_status, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, 'UPI', %s, %s, %s) "
+                   "RETURNING id", (order_id, user_id, json.dumps(lines), sum(p * q for _, p, q in items), status,
+                                    payment_status, created_at, created_at))[0][0]
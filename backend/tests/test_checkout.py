@@ -0,0 +1,100 @@
+import re
+from decimal import Decimal
+
+import pytest
+from psycopg2.pool import PoolError
+
+import app as app_module
+from checkout import CHECKOUT_UNAVAILABLE
+from conftest import USER_ID, AsgiClient, add_user, execute
+
+
+def checkout(client, cart, user_id=USER_ID, **extra):
+    return client.post('/api/checkout', json={'user_id': user_id, 'cart': cart, **extra})
+
+
+def test_prices_from_menu_not_client(client):
+    response = checkout(client, [{'id': 1, 'quantity': 2, 'price': 0.01, 'name': 'Free coffee'},
+                                 {'id': 3, 'quantity': 1}])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert body['amount'] == 80.0
+    assert body['items'] == [{'id': 1, 'name': 'Coffee', 'price': 30.0, 'quantity': 2},
+                             {'id': 3, 'name': 'Samosa', 'price': 20.0, 'quantity': 1}]
+    assert re.fullmatch(r'ORD-STU\d{6}', body['orderId'])
+    assert execute('SELECT user_id, total_amount, status, payment_status FROM orders WHERE order_id = %s',
+                   (body['orderId'],)) == [(USER_ID, Decimal('80.00'), 'Uncompleted', 'Paid')]
+
+
+def test_repeated_items_are_summed(client):
+    body = checkout(client, [{'id': 2, 'quantity': 1}, {'id': 2, 'quantity': '2'}]).get_json()
+    assert body['items'] == [{'id': 2, 'name': 'Tea', 'price': 25.0, 'quantity': 3}]
+    assert body['amount'] == 75.0
+
+
+def test_order_id_prefix_follows_user_type(client):
+    faculty = add_user('prof', 'Faculty')
+    body = checkout(client, [{'id': 1, 'quantity': 1}], user_id=faculty).get_json()
+    assert re.fullmatch(r'ORD-FAC\d{6}', body['orderId'])
+
+
+def test_nested_user_object(client):
+    response = client.post('/api/checkout', json={'user': {'id': USER_ID}, 'cart': [{'id': 1, 'quantity': 1}]})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('payload, status, message', [
+    ({'user_id': USER_ID, 'cart': []}, 400, 'Cart is empty'),
+    ({'cart': [{'id': 1, 'quantity': 1}]}, 400, 'User ID is required'),
+    ({'user_id': USER_ID, 'cart': [{'id': 1}]}, 400, 'Invalid cart item format'),
+    ({'user_id': USER_ID, 'cart': [{'id': 1, 'quantity': 0}]}, 400, 'Invalid id/quantity in cart'),
+    ({'user_id': USER_ID, 'cart': [{'id': 'x', 'quantity': 1}]}, 400, 'Invalid id/quantity in cart'),
+    ({'user_id': 'abc', 'cart': [{'id': 1, 'quantity': 1}]}, 400, 'Invalid user ID'),
+    ({'user_id': 999, 'cart': [{'id': 1, 'quantity': 1}]}, 404, 'User not found'),
+])
+def test_rejected_requests(client, payload, status, message):
+    response = client.post('/api/checkout', json=payload)
+    assert response.status_code == status
+    assert response.get_json() == {'success': False, 'message': message}
+    assert execute('SELECT COUNT(*) FROM orders') == [(0,)]
+
+
+def test_unknown_item(client):
+    response = checkout(client, [{'id': 1, 'quantity': 1}, {'id': 99, 'quantity': 1}])
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Unknown menu items', 'items': [99]}
+
+
+def test_unavailable_item(client):
+    response = checkout(client, [{'id': 5, 'quantity': 1}])
+    assert response.status_code == 409
+    assert response.get_json() == {'success': False, 'message': 'Some items are no longer available',
+                                   'items': ['Ice Cream']}
+
+
+def test_pool_timeout_is_503_not_a_fake_order(client, monkeypatch):
+    def exhausted():
+        raise PoolError('connection pool exhausted')
+
+    async def async_exhausted():
+        raise TimeoutError()
+
+    monkeypatch.setattr(app_module, 'db_connection', exhausted)
+    if isinstance(client, AsgiClient):
+        monkeypatch.setattr('asgi.get_pool', async_exhausted)
+    response = checkout(client, [{'id': 1, 'quantity': 1, 'price': 30}])
+    assert response.status_code == 503
+    assert response.get_json() == {'success': False, 'message': CHECKOUT_UNAVAILABLE}
+
+
+def test_failure_after_lookup_stores_nothing(client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError('could not allocate order id')
+
+    monkeypatch.setattr(app_module.order_ids, 'reserved', fail)
+    response = checkout(client, [{'id': 1, 'quantity': 1}])
+    assert response.status_code == 503
+    assert response.get_json()['success'] is False
+    assert execute('SELECT COUNT(*) FROM orders') == [(0,)]
+    assert execute('SELECT COUNT(*) FROM order_daily_stats') == [(0,)]
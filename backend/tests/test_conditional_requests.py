@@ -0,0 +1,71 @@
+"""ETags and 304s for /api/menu, /api/orders and /api/stats."""
+import pytest
+
+from conftest import USER_ID, add_order, add_user, execute
+
+PATHS = ['/api/menu', '/api/menu?available=true', '/api/stats', '/api/orders?admin=true&limit=2']
+
+
+@pytest.fixture
+def orders():
+    guest = add_user('guest', 'Guest')
+    add_order('ORD-STU1', USER_ID, 'Completed', '2026-01-02 12:00:00', [('Coffee', 30, 2)])
+    add_order('ORD-STU2', USER_ID, 'Pending', '2026-01-03 12:30:00', [('Tea', 25, 1)])
+    add_order('ORD-GUE3', guest, 'Pending', '2026-01-04 08:00:00', [('Pasta', 150, 1)])
+
+
+def order_ids(body):
+    return [order['order_id'] for order in body['orders']]
+
+
+def conditional_get(client, path, etag=None):
+    """Status, ETag and order ids; the body is read so a streamed response is closed."""
+    response = client.get(path, headers={'If-None-Match': etag} if etag else {})
+    assert response.headers['Cache-Control'] == 'no-cache'
+    body = response.get_json() if response.status_code == 200 else None
+    ids = order_ids(body) if isinstance(body, dict) and 'orders' in body else None
+    return response.status_code, response.headers['ETag'], ids
+
+
+def test_not_modified_until_the_orders_change(client, orders):
+    path = '/api/orders?admin=true&limit=2'
+    etag = conditional_get(client, path)[1]
+    assert conditional_get(client, path)[1] == etag
+    assert conditional_get(client, path, etag) == (304, etag, None)
+
+    assert client.patch('/api/orders/ORD-STU2/status', json={'status': 'Ready'}).status_code == 200
+    status, changed, _ = conditional_get(client, path, etag)
+    assert (status, changed != etag) == (200, True)
+
+    add_order('ORD-STU7', USER_ID, 'Pending', '2026-01-06 10:00:00', [('Tea', 25, 1)])
+    status, etag, ids = conditional_get(client, path, changed)
+    assert (status, etag != changed, ids) == (200, True, ['ORD-STU7', 'ORD-GUE3'])
+    # Another user's orders are not part of this list
+    user_path = f'/api/orders?user_id={USER_ID}'
+    etag = conditional_get(client, user_path)[1]
+    guest = execute("SELECT id FROM users WHERE username = 'guest'")[0][0]
+    add_order('ORD-GUE8', guest, 'Pending', '2026-01-07 10:00:00', [('Tea', 25, 1)])
+    assert conditional_get(client, user_path, etag) == (304, etag, None)
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_not_modified(client, orders, path):
+    etag = conditional_get(client, path)[1]
+    assert conditional_get(client, path, etag) == (304, etag, None)
+    # A stale tag gets the full body
+    assert conditional_get(client, path, 'stale')[0] == 200
+
+
+def test_menu_etag_follows_updates(client, orders):
+    etag = conditional_get(client, '/api/menu')[1]
+    assert client.open('/api/menu/2', method='PUT', json={'price': 28}).status_code == 200
+    status, changed, _ = conditional_get(client, '/api/menu', etag)
+    assert (status, changed != etag) == (200, True)
+
+
+def test_stats_etag_follows_checkout(client, orders):
+    etag = conditional_get(client, '/api/stats')[1]
+    response = client.post('/api/checkout', json={'user_id': USER_ID, 'cart': [{'id': 1, 'quantity': 1}]})
+    assert response.status_code == 200
+    status, changed, _ = conditional_get(client, '/api/stats', etag)
+    assert (status, changed != etag) == (200, True)
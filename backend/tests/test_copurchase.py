@@ -0,0 +1,27 @@
+import json
+
+import copurchase
+from conftest import USER_ID, execute
+
+
+def insert_order(order_id, names):
+    items = [{'id': n, 'name': name, 'price': 10, 'quantity': 1} for n, name in enumerate(names, 1)]
+    execute("INSERT INTO orders (order_id, user_id, items, total_amount, created_at) "
+            "VALUES (%s, %s, %s, 10, LOCALTIMESTAMP - INTERVAL '1 hour')", (order_id, USER_ID, json.dumps(items)))
+
+
+def test_mine_is_incremental_and_reset_clears(app):
+    copurchase.reset()
+    insert_order('ORD-STU1', ['Tea', 'Samosa'])
+    insert_order('ORD-STU2', ['Tea', 'Samosa', 'Coffee'])
+    assert copurchase.mine() == 2
+    insert_order('ORD-STU3', ['Tea', 'Coffee'])
+    assert copurchase.mine() == 1
+    assert execute('SELECT item_a, item_b, orders FROM copurchase_pairs ORDER BY 1, 2') == [
+        ('coffee', 'samosa', 1), ('coffee', 'tea', 2), ('samosa', 'tea', 2)]
+    assert execute('SELECT orders FROM copurchase_state') == [(3,)]
+
+    copurchase.reset()
+    assert execute('SELECT COUNT(*) FROM copurchase_pairs') == [(0,)]
+    assert execute('SELECT COUNT(*) FROM copurchase_state') == [(0,)]
+    assert copurchase.mine() == 3
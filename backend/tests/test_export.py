@@ -0,0 +1,73 @@
+"""/api/orders/export as CSV and NDJSON."""
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import USER_ID, add_order, add_user
+
+ROWS = [
+    ('ORD-STU1', USER_ID, 'Completed', '2026-01-02 12:00:00', [('Coffee', 30, 2)]),
+    ('ORD-STU2', USER_ID, 'Ready', '2026-01-03 12:30:00', [('Tea', 25, 1), ('Samosa', 20, 3)]),
+    ('ORD-GUE3', None, 'Pending', '2026-01-03 12:30:00', [('Pasta', 150, 1)]),
+    ('ORD-STU4', USER_ID, 'Pending', '2026-01-04 08:00:00', []),
+    ('ORD-STU5', USER_ID, 'Cancelled', '2026-01-05 09:15:00', [('Tea', 25, 2)]),
+    ('ORD-STU6', USER_ID, 'Completed', '2026-01-05 09:15:00', [('Coffee', 30, 1)]),
+]
+
+
+@pytest.fixture
+def orders():
+    guest = add_user('guest', 'Guest')
+    for order_id, user_id, *rest in ROWS:
+        add_order(order_id, user_id or guest, *rest)
+
+
+def export(client, query):
+    response = client.get(f'/api/orders/export?{query}')
+    assert response.status_code == 200
+    return response
+
+
+def test_export_csv(client, orders):
+    response = export(client, 'admin=true')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=orders-all.csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['order_id', 'created_at', 'user_id', 'username', 'status', 'payment_status',
+                       'payment_method', 'total_amount', 'item_id', 'item_name', 'price', 'quantity',
+                       'line_total']
+    # Oldest first, one row per item; an order without items still gets its row
+    assert [(r[0], r[9], r[11], r[12]) for r in rows[1:]] == [
+        ('ORD-STU1', 'Coffee', '2', '60'),
+        ('ORD-STU2', 'Tea', '1', '25'),
+        ('ORD-STU2', 'Samosa', '3', '60'),
+        ('ORD-GUE3', 'Pasta', '1', '150'),
+        ('ORD-STU4', '', '', ''),
+        ('ORD-STU5', 'Tea', '2', '50'),
+        ('ORD-STU6', 'Coffee', '1', '30'),
+    ]
+    assert rows[2][:8] == ['ORD-STU2', '2026-01-03T12:30:00', str(USER_ID), 'user', 'Ready', 'Paid', 'UPI', '85.00']
+
+
+def test_export_ndjson_filters(client, orders):
+    response = export(client, f'user_id={USER_ID}&format=ndjson&status=Completed,Ready&from=2026-01-03&to=2026-01-06')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=orders-2026-01-03-2026-01-06.ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line['order_id'], line['item_name'], line['line_total']) for line in lines] == [
+        ('ORD-STU2', 'Tea', '25'), ('ORD-STU2', 'Samosa', '60'), ('ORD-STU6', 'Coffee', '30')]
+    assert lines[0]['username'] == 'user'
+    assert lines[0]['created_at'] == '2026-01-03T12:30:00'
+
+
+@pytest.mark.parametrize('query, message', [
+    ('admin=true&format=xml', 'format must be csv or ndjson'),
+    ('status=Pending', 'user_id or admin query param required'),
+    ('admin=true&to=tomorrow', 'Invalid filter: '),
+])
+def test_export_bad_query(client, query, message):
+    response = client.get(f'/api/orders/export?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith(message)
@@ -0,0 +1,118 @@
+"""OrjsonProvider and RowEncoder write the same bytes as Flask's default provider."""
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+
+orjson = pytest.importorskip('orjson')
+
+ORDER = {
+    'order_id': 'ORD-STU100001',
+    'total_amount': Decimal('120.50'),
+    'created_at': datetime(2026, 1, 5, 9, 15, 7),
+    'items': [{'quantity': 2, 'name': 'Coffee', 'price': 30, 'id': 1},
+              {'quantity': 1, 'name': 'Samosa', 'price': 20.5, 'id': 3}],
+    'user_id': None,
+    'paid': True,
+}
+
+VALUES = [
+    ORDER,
+    [ORDER, dict(ORDER, order_id='ORD-STU100002')],
+    {'success': True, 'recommendations': [{'price': 0.1, 'source': 'rule-based', 'item_id': 7}]},
+    {'day': date(2026, 1, 5), 'at': datetime(2026, 1, 5, 23, 59, 59, 999999, tzinfo=timezone.utc)},
+    {'at': datetime(2026, 1, 5, 9, 15, tzinfo=timezone(timedelta(hours=5, minutes=30)))},
+    {'id': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    {'z': {'b': {'d': 1, 'c': [2, {'y': 3, 'x': 4}]}, 'a': []}, 'a': ''},
+    {'quote': 'say "hi"\n\t\\', 'control': '\x00\x1f'},
+    # Fallbacks: orjson's output would differ, or it cannot encode the value
+    {'item_name': 'Café au lait', 'emoji': '☕'},
+    {'delete': '\x7f'},
+    {'small': 1e-05, 'large': 1e16, 'tiny': 0.000015},
+    {'big': 2 ** 70},
+    {2: 'int key', 1: 'int key'},
+    float('inf'),
+]
+
+
+@pytest.fixture
+def providers():
+    # Providers only keep a weak reference to their app
+    flask_app = Flask(__name__)
+    yield json_provider.OrjsonProvider(flask_app), DefaultJSONProvider(flask_app)
+
+
+@pytest.mark.parametrize('value', VALUES, ids=range(len(VALUES)))
+def test_same_bytes_as_the_default_provider(providers, value):
+    fast, default = providers
+    if value == float('inf'):
+        # The documented difference: the default provider writes invalid JSON
+        assert fast.dumps(value, separators=(',', ':')) == 'null'
+        return
+    assert fast.dumps(value, separators=(',', ':')) == default.dumps(value, separators=(',', ':'))
+    assert fast.response(value).get_data() == default.response(value).get_data()
+    # Other arguments (indented debug output) always use the default provider
+    assert fast.dumps(value, indent=2) == default.dumps(value, indent=2)
+
+
+@pytest.mark.parametrize('value', [
+    {'item_name': 'Café au lait'},
+    {'delete': '\x7f'},
+    {'small': 1e-05},
+    {'tiny': 0.000015},
+])
+def test_rejected_output_falls_back(providers, monkeypatch, value):
+    out = orjson.dumps(value, option=json_provider._ORJSON_OPTIONS)
+    assert not json_provider._same_as_json(out)
+
+    fast, default = providers
+    fallbacks = []
+    super_dumps = DefaultJSONProvider.dumps
+
+    def dumps(self, obj, **kwargs):
+        fallbacks.append(obj)
+        return super_dumps(self, obj, **kwargs)
+
+    monkeypatch.setattr(DefaultJSONProvider, 'dumps', dumps)
+    assert fast.dumps(value, separators=(',', ':')) == super_dumps(default, value, separators=(',', ':'))
+    assert fallbacks == [value]
+
+
+@pytest.mark.parametrize('value', [{'big': 2 ** 70}, {2: 'int key', 1: 'int key'}])
+def test_unencodable_values_fall_back(providers, value):
+    with pytest.raises(TypeError):
+        orjson.dumps(value, option=json_provider._ORJSON_OPTIONS)
+    fast, default = providers
+    assert fast.dumps(value, separators=(',', ':')) == default.dumps(value, separators=(',', ':'))
+
+
+def test_accepted_output_skips_the_default_provider(providers, monkeypatch):
+    fast, _ = providers
+    monkeypatch.setattr(DefaultJSONProvider, 'dumps', lambda *args, **kwargs: pytest.fail('fell back'))
+    assert fast.dumps(ORDER, separators=(',', ':')).startswith('{"created_at":"Mon, 05 Jan 2026 09:15:07 GMT"')
+
+
+ROW_COLUMNS = ['order_id', 'user_id', 'total_amount', 'created_at', 'status', 'items', 'id', 'username']
+ROWS = [
+    ('ORD-STU1', 2, Decimal('60.00'), datetime(2026, 1, 2, 12, 0), 'Completed',
+     [{'name': 'Coffee', 'price': 30, 'quantity': 2}], 1, 'user'),
+    ('ORD-GUE2', None, Decimal('45.5'), datetime(2026, 1, 3, 12, 30, tzinfo=timezone.utc), 'Pending',
+     [{'name': 'Café au lait', 'price': 45.5, 'quantity': 1}], 2, 'Zoë'),
+    ('ORD-STU3', 2, Decimal('0'), date(2026, 1, 4), 'Cancelled', [], 3, None),
+    ('ORD-STU4', 2, 1.5, datetime(2026, 1, 5), 'Ready', {'note': 1e-05}, 4, uuid.UUID(int=4)),
+]
+
+
+@pytest.mark.parametrize('provider', ['orjson', 'default'])
+def test_row_encoder_matches_dict_rows(providers, provider):
+    fast, default = providers
+    provider = fast if provider == 'orjson' else default
+    encode = json_provider.RowEncoder(ROW_COLUMNS, provider).encode
+    for row in ROWS:
+        expected = default.dumps(dict(zip(ROW_COLUMNS, row)), separators=(',', ':'))
+        assert encode(row) == expected
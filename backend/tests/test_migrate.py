@@ -0,0 +1,135 @@
+"""migrate() on an empty database and on one created by the old init_db()."""
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import db
+import menu_import
+import migrate
+import stats
+from conftest import TEST_DB_NAME, _server_connection
+
+MIGRATE_DB_NAME = f'{TEST_DB_NAME}_migrate'
+
+# What init_db() and init_db.sql created before migrations existed
+LEGACY_SCHEMA_SQL = """
+    CREATE TABLE users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT DEFAULT 'user',
+        user_type TEXT DEFAULT 'Student',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE menu_items (
+        id SERIAL PRIMARY KEY,
+        item_name TEXT NOT NULL,
+        price NUMERIC(10, 2) NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        availability BOOLEAN DEFAULT true,
+        image_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE orders (
+        id SERIAL PRIMARY KEY,
+        order_id TEXT UNIQUE NOT NULL,
+        user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+        items JSONB NOT NULL,
+        total_amount NUMERIC(10, 2) NOT NULL,
+        status TEXT DEFAULT 'Pending',
+        payment_method TEXT,
+        payment_status TEXT DEFAULT 'Pending',
+        transaction_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO users (username, email, password, role) VALUES
+        ('admin', 'admin@canteen.com', 'admin123', 'admin'),
+        ('user', 'user@canteen.com', 'user123', 'user');
+    INSERT INTO menu_items (item_name, price, category) VALUES
+        ('Coffee', 30, 'Beverages'), ('Tea', 25, 'Beverages'), ('Coffee', 35, 'Beverages');
+    INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_status, created_at)
+    SELECT 'ORD-STU' || n, 2, '[]', 10 * n, CASE WHEN n % 2 = 0 THEN 'Pending' ELSE 'Completed' END,
+           'Paid', CURRENT_TIMESTAMP - n * INTERVAL '1 hour'
+    FROM generate_series(1, 30) AS n;
+"""
+
+
+@pytest.fixture
+def empty_database(database, monkeypatch):
+    """A new, empty database that db.connect() (and so migrate()) opens."""
+    server = _server_connection()
+    cur = server.cursor()
+    cur.execute(f'DROP DATABASE IF EXISTS {MIGRATE_DB_NAME} WITH (FORCE)')
+    cur.execute(f"CREATE DATABASE {MIGRATE_DB_NAME} ENCODING 'UTF8' TEMPLATE template0")
+    monkeypatch.setattr(db, 'DB_NAME', MIGRATE_DB_NAME)
+    yield
+    monkeypatch.undo()
+    cur.execute(f'DROP DATABASE IF EXISTS {MIGRATE_DB_NAME} WITH (FORCE)')
+    server.close()
+
+
+@pytest.fixture
+def conn(empty_database):
+    conn = db.connect()
+    yield conn
+    conn.close()
+
+
+def latest_version():
+    return migrate.available()[-1][0]
+
+
+def test_fresh_database(conn):
+    assert migrate.migrate() == latest_version()
+    cur = conn.cursor()
+    cur.execute('SELECT version FROM schema_version ORDER BY version')
+    assert [v for (v,) in cur.fetchall()] == [number for number, _, _ in migrate.available()]
+    cur.execute('SELECT COUNT(*) FROM users')
+    assert cur.fetchone()[0] == 2
+    cur.execute('SELECT COUNT(*), COUNT(DISTINCT item_name) FROM menu_items')
+    assert cur.fetchone() == (10, 10)
+    # A current schema is left alone
+    assert migrate.migrate() == latest_version()
+
+
+def import_menu(cur, rows):
+    valid, errors = menu_import.validate_rows(rows, set(rows[0]))
+    assert not errors
+    cur.execute(menu_import.TEMP_TABLE_SQL)
+    cur.copy_expert(menu_import.COPY_SQL, menu_import.copy_buffer(valid))
+    cur.execute(menu_import.merge_sql(set(rows[0])))
+    return [inserted for (inserted,) in cur.fetchall()]
+
+
+def test_legacy_database_is_upgraded_in_place(conn):
+    cur = conn.cursor()
+    cur.execute(LEGACY_SCHEMA_SQL)
+    conn.commit()
+
+    assert migrate.migrate() == latest_version()
+
+    cur.execute('SELECT COUNT(*) FROM orders')
+    assert cur.fetchone()[0] == 30
+    # The later duplicate is renamed, keeping its id
+    cur.execute('SELECT id, item_name FROM menu_items ORDER BY id')
+    assert cur.fetchall() == [(1, 'Coffee'), (2, 'Tea'), (3, 'Coffee (3)')]
+
+    # Bulk import relies on UNIQUE (item_name)
+    assert import_menu(cur, [{'item_name': 'Tea', 'price': '28', 'category': 'Beverages'},
+                             {'item_name': 'Samosa', 'price': '20', 'category': 'Snacks'}]) == [False, True]
+    conn.commit()
+
+    figures = stats.load_stats(conn.cursor(cursor_factory=RealDictCursor), use_rollup=True)
+    assert figures == stats.load_stats(conn.cursor(cursor_factory=RealDictCursor), use_rollup=False)
+    assert figures['totalOrders'] == 30
+    assert figures['pendingOrders'] == 15
+    # A status change moves an order between rollup rows; nothing goes negative
+    cur.execute("SELECT created_at, total_amount FROM orders WHERE order_id = 'ORD-STU2'")
+    created_at, amount = cur.fetchone()
+    cur.execute("UPDATE orders SET status = 'Completed' WHERE order_id = 'ORD-STU2'")
+    stats.record_status_change(cur, created_at, 'Pending', 'Completed', 'Paid', amount)
+    conn.commit()
+    assert stats.load_stats(conn.cursor(cursor_factory=RealDictCursor), use_rollup=True)['pendingOrders'] == 14
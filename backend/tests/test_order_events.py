@@ -0,0 +1,62 @@
+import pytest
+
+import app as app_module
+from order_events import OrderEventHub
+
+
+def test_streams_are_capped_per_worker(app, monkeypatch):
+    monkeypatch.setattr(app_module.order_events, 'max_streams', 1)
+    client = app.test_client()
+    first = client.get('/api/orders/stream?admin=true')
+    assert first.status_code == 200
+
+    refused = client.get('/api/orders/stream?admin=true')
+    assert refused.status_code == 503
+    assert refused.get_json()['success'] is False
+    assert refused.headers['Retry-After'] == str(refused.get_json()['poll_interval'])
+
+    # Closing the response frees the slot
+    first.close()
+    second = client.get('/api/orders/stream?user_id=2')
+    assert second.status_code == 200
+    second.close()
+    assert app_module.order_events.stats()['streams'] == 0
+
+
+@pytest.mark.parametrize('user_id', ['abc', '2.5', '%20'])
+def test_bad_user_id_is_rejected(client, user_id):
+    response = client.get(f'/api/orders/stream?user_id={user_id}')
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith('Invalid filter: ')
+    assert app_module.order_events.stats()['streams'] == 0
+
+
+def test_listener_closes_its_connection_on_error(monkeypatch):
+    opened = []
+
+    class Connection:
+        closed = False
+
+        def set_isolation_level(self, level):
+            pass
+
+        def cursor(self):
+            raise ConnectionError('server closed the connection')
+
+        def close(self):
+            self.closed = True
+
+    def connect():
+        if len(opened) == 3:
+            raise SystemExit  # Out of the listener loop
+        opened.append(Connection())
+        return opened[-1]
+
+    monkeypatch.setattr('order_events.connect', connect)
+    monkeypatch.setattr('order_events.time.sleep', lambda seconds: None)
+    try:
+        OrderEventHub()._listen()
+    except SystemExit:
+        pass
+    assert len(opened) == 3
+    assert all(conn.closed for conn in opened)
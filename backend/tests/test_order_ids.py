@@ -0,0 +1,42 @@
+import re
+import time
+
+import db
+from order_ids import ID_SPACE, OrderIdAllocator
+
+
+def test_permutation_never_repeats():
+    allocator = OrderIdAllocator(secret='test')
+    sample = [allocator.permute(n) for n in [*range(5000), *range(ID_SPACE - 5000, ID_SPACE)]]
+    assert len(set(sample)) == len(sample)
+    assert all(0 <= n < ID_SPACE for n in sample)
+
+
+def test_format():
+    allocator = OrderIdAllocator(secret='test')
+    assert re.fullmatch(r'ORD-STU\d{6}', allocator.format('STU', 0))
+    assert allocator.format('STU', ID_SPACE + 5) == 'ORD-STU1' + allocator.format('STU', 5)[7:]
+
+
+def wait_for_prefetch(allocator):
+    deadline = time.monotonic() + 5
+    while allocator._prefetching and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_blocks_are_prefetched_outside_the_caller(app):
+    allocator = OrderIdAllocator(block=4)
+    conn = db.connect()
+    try:
+        cur = conn.cursor()
+        ids = []
+        for _ in range(20):
+            ids.append(allocator.next_id(cur, 'Guest'))
+            wait_for_prefetch(allocator)
+        conn.rollback()
+    finally:
+        conn.close()
+    assert len(set(ids)) == 20
+    assert all(order_id.startswith('ORD-GUE') for order_id in ids)
+    # Only the first block was reserved on the caller's cursor
+    assert allocator.stats() == {'prefetched': 5, 'in_transaction': 1}
@@ -0,0 +1,82 @@
+"""/api/orders pages, cursors, filters and fields."""
+import pytest
+
+from conftest import USER_ID, add_order, add_user
+
+# Two pairs share a created_at, so the id decides their order
+ROWS = [
+    ('ORD-STU1', USER_ID, 'Completed', '2026-01-02 12:00:00', [('Coffee', 30, 2)]),
+    ('ORD-STU2', USER_ID, 'Ready', '2026-01-03 12:30:00', [('Tea', 25, 1), ('Samosa', 20, 3)]),
+    ('ORD-GUE3', None, 'Pending', '2026-01-03 12:30:00', [('Pasta', 150, 1)]),
+    ('ORD-STU4', USER_ID, 'Pending', '2026-01-04 08:00:00', []),
+    ('ORD-STU5', USER_ID, 'Cancelled', '2026-01-05 09:15:00', [('Tea', 25, 2)]),
+    ('ORD-STU6', USER_ID, 'Completed', '2026-01-05 09:15:00', [('Coffee', 30, 1)]),
+]
+
+
+@pytest.fixture
+def orders():
+    guest = add_user('guest', 'Guest')
+    return [add_order(order_id, user_id or guest, *rest) for order_id, user_id, *rest in ROWS]
+
+
+def order_ids(body):
+    return [order['order_id'] for order in body['orders']]
+
+
+def walk(client, path, limit):
+    """Follow next_cursor from the first page to the last; returns every page's order ids."""
+    pages, cursor = [], None
+    while True:
+        response = client.get(f'{path}&limit={limit}' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(order_ids(body))
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_order_once(client, orders):
+    newest_first = ['ORD-STU6', 'ORD-STU5', 'ORD-STU4', 'ORD-GUE3', 'ORD-STU2', 'ORD-STU1']
+    assert order_ids(client.get('/api/orders?admin=true').get_json()) == newest_first
+    assert walk(client, '/api/orders?admin=true', 2) == [newest_first[:2], newest_first[2:4], newest_first[4:]]
+    assert walk(client, '/api/orders?admin=true', 4) == [newest_first[:4], newest_first[4:]]
+    # A full last page has no next page
+    assert walk(client, '/api/orders?admin=true', 6) == [newest_first]
+    assert walk(client, f'/api/orders?user_id={USER_ID}', 3) == [['ORD-STU6', 'ORD-STU5', 'ORD-STU4'],
+                                                                  ['ORD-STU2', 'ORD-STU1']]
+
+
+def test_cursor_ignores_newer_orders(client, orders):
+    first = client.get('/api/orders?admin=true&limit=3').get_json()
+    add_order('ORD-STU7', USER_ID, 'Pending', '2026-01-06 10:00:00', [('Tea', 25, 1)])
+    rest = client.get(f"/api/orders?admin=true&limit=3&cursor={first['next_cursor']}").get_json()
+    assert order_ids(first) + order_ids(rest) == ['ORD-STU6', 'ORD-STU5', 'ORD-STU4',
+                                                  'ORD-GUE3', 'ORD-STU2', 'ORD-STU1']
+    assert rest['next_cursor'] is None
+
+
+def test_filters_and_fields(client, orders):
+    body = client.get('/api/orders?admin=true&status=Pending,Ready').get_json()
+    assert order_ids(body) == ['ORD-STU4', 'ORD-GUE3', 'ORD-STU2']
+    # from is inclusive, to exclusive
+    body = client.get('/api/orders?username=user&from=2026-01-03&to=2026-01-05').get_json()
+    assert order_ids(body) == ['ORD-STU4', 'ORD-STU2']
+    body = client.get('/api/orders?admin=true&fields=order_id,username&limit=1').get_json()
+    assert body['orders'] == [{'id': orders[5], 'created_at': 'Mon, 05 Jan 2026 09:15:00 GMT',
+                               'order_id': 'ORD-STU6', 'username': 'user'}]
+
+
+@pytest.mark.parametrize('query, message', [
+    ('admin=true&limit=0', 'Invalid filter: limit must be between 1 and 500'),
+    ('admin=true&limit=501', 'Invalid filter: limit must be between 1 and 500'),
+    ('admin=true&cursor=nonsense', 'Invalid filter: '),
+    ('admin=true&from=yesterday', 'Invalid filter: '),
+    (f'user_id={USER_ID}&fields=order_id,username', 'Unknown fields: username'),
+    ('status=Pending', 'user_id, username or admin query param required'),
+])
+def test_bad_query(client, orders, query, message):
+    response = client.get(f'/api/orders?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith(message)
@@ -0,0 +1,83 @@
+"""MicroBatcher batching and the LRU query caches of the RAG engine."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def batching(app):
+    from rag_engine import batching
+
+    return batching
+
+
+def submit_all(batcher, requests):
+    with ThreadPoolExecutor(len(requests)) as pool:
+        futures = [pool.submit(batcher.submit, request, 10) for request in requests]
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_full_batch_is_handled_without_waiting(batching):
+    batches = []
+
+    def handler(requests):
+        batches.append(sorted(requests))
+        return [request * 10 for request in requests]
+
+    batcher = batching.MicroBatcher(handler, max_batch_size=3, max_wait_ms=10000)
+    start = time.monotonic()
+    assert submit_all(batcher, [1, 2, 3]) == [10, 20, 30]
+    assert time.monotonic() - start < 5
+    assert batches == [[1, 2, 3]]
+    assert batcher.stats()['avg_batch_size'] == 3
+
+
+def test_partial_batch_is_handled_after_max_wait(batching):
+    batches = []
+
+    def handler(requests):
+        batches.append(requests)
+        return requests
+
+    batcher = batching.MicroBatcher(handler, max_batch_size=32, max_wait_ms=50)
+    start = time.monotonic()
+    assert batcher.submit('one', timeout=10) == 'one'
+    assert 0.05 <= time.monotonic() - start < 5
+    assert batches == [['one']]
+
+
+def test_failed_batch_raises_in_every_caller(batching):
+    def handler(requests):
+        if 'bad' in requests:
+            raise ValueError('encode failed')
+        return requests
+
+    batcher = batching.MicroBatcher(handler, max_batch_size=3, max_wait_ms=10000)
+    errors = submit_all(batcher, ['ok', 'bad', 'also ok'])
+    assert [type(e) for e in errors] == [ValueError] * 3
+    assert {str(e) for e in errors} == {'encode failed'}
+    # The worker thread carries on
+    assert submit_all(batcher, ['a', 'b', 'c']) == ['a', 'b', 'c']
+    assert batcher.stats()['batches'] == 1
+
+
+def test_lru_evicts_the_least_recently_used(app):
+    from rag_engine.query_cache import LRUCache
+
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # b is now the oldest
+    cache.put('c', 3)
+    assert (cache.get('b'), cache.get('a'), cache.get('c')) == (None, 1, 3)
+    cache.put('a', 4)  # a replaced in place, c is the oldest
+    cache.put('d', 5)
+    assert (cache.get('c'), cache.get('a'), cache.get('d')) == (None, 4, 5)
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 5, 'misses': 2, 'evictions': 2}
+
+    cache.clear()
+    assert (len(cache), cache.get('a')) == (0, None)
+    disabled = LRUCache(maxsize=0)
+    disabled.put('a', 1)
+    assert (len(disabled), disabled.get('a')) == (0, None)
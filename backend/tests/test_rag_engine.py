@@ -0,0 +1,154 @@
+"""RAGRecommendationEngine index swaps, with numpy stand-ins for faiss and the model."""
+import json
+import sys
+import threading
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+KNOWLEDGE_BASE = [
+    {'item': name, 'type': '', 'taste_profile': '', 'reason': f'{name} goes well here', 'pairs_well_with': []}
+    for name in ('Tea', 'Samosa', 'Coffee', 'Pasta')
+]
+MENU = [
+    {'id': 1, 'item_name': 'Coffee', 'price': 30, 'category': 'Beverages', 'availability': True},
+    {'id': 2, 'item_name': 'Tea', 'price': 25, 'category': 'Beverages', 'availability': True},
+    {'id': 3, 'item_name': 'Samosa', 'price': 20, 'category': 'Snacks', 'availability': True},
+    {'id': 4, 'item_name': 'Pasta', 'price': 150, 'category': 'Main Course', 'availability': True},
+]
+
+
+class Index:
+    """Returns the knowledge base in order; a search can be held open with ``release``."""
+
+    def __init__(self, version, size):
+        self.version = version
+        self.size = size
+        self.searched = []
+        self.searching = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def search(self, queries, k):
+        self.searched.append(len(queries))
+        self.searching.set()
+        assert self.release.wait(10)
+        indices = np.tile(np.arange(min(k, self.size)), (len(queries), 1))
+        return np.zeros(indices.shape, dtype='float32'), indices
+
+
+class EmbeddingCache:
+    """Each load() returns a new (embeddings, index) version, as after an edit."""
+
+    versions = 0
+
+    def __init__(self, cache_dir, model_name):
+        self.encoded = 0
+
+    def load(self, texts, encode, build_index, index_tag):
+        EmbeddingCache.versions += 1
+        version = EmbeddingCache.versions
+        return np.full((len(texts), 2), version, dtype='float32'), Index(version, len(texts))
+
+
+class Model:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.append(list(texts))
+        return np.ones((len(texts), 2), dtype='float32')
+
+
+@pytest.fixture
+def rag(app, tmp_path, monkeypatch):
+    """The rag_engine module, with faiss, the model and the embedding cache replaced."""
+    from rag_engine import rag_engine
+
+    monkeypatch.setattr(rag_engine, 'RAG_AVAILABLE', True)
+    monkeypatch.setattr(rag_engine, '_load_dependencies', lambda: None)
+    monkeypatch.setattr(rag_engine, 'np', np)
+    monkeypatch.setattr(rag_engine, 'normalized', lambda vectors: np.asarray(vectors, dtype='float32'))
+    # The real module imports faiss
+    monkeypatch.setitem(sys.modules, 'rag_engine.embedding_cache',
+                        types.SimpleNamespace(EmbeddingCache=EmbeddingCache))
+    monkeypatch.setattr(EmbeddingCache, 'versions', 0)
+    monkeypatch.setenv('RAG_CACHE_DIR', str(tmp_path / 'cache'))
+    (tmp_path / 'food_knowledge.json').write_text(json.dumps(KNOWLEDGE_BASE), encoding='utf-8')
+    return rag_engine
+
+
+@pytest.fixture
+def engine(rag, tmp_path):
+    engine = rag.RAGRecommendationEngine(data_dir=tmp_path)
+    engine.model = Model()
+    engine.ensure_ready(10)
+    return engine
+
+
+def names(recommendations):
+    return [r['item_name'] for r in recommendations]
+
+
+def test_reload_during_a_search_keeps_the_readers_pair(rag, engine, monkeypatch):
+    # Quantized storage re-ranks against the embeddings, so a search uses both halves
+    reranked = []
+
+    def rerank(embeddings, queries, candidates, k):
+        reranked.append(int(embeddings[0, 0]))
+        return candidates[:, :k]
+
+    monkeypatch.setattr(rag, 'RAG_VECTOR_STORAGE', 'int8')
+    monkeypatch.setattr(rag, 'rerank', rerank)
+
+    old = engine.index
+    assert (old.version, int(engine.embeddings[0, 0])) == (1, 1)
+    old.release.clear()
+    results = []
+    reader = threading.Thread(target=lambda: results.append(engine.get_recommendations(['Tea'], MENU, 2)))
+    reader.start()
+    assert old.searching.wait(10)
+
+    generation = engine._generation
+    engine.reload()
+    assert engine._generation == generation + 1
+    assert (engine.index.version, int(engine.embeddings[0, 0])) == (2, 2)
+
+    old.release.set()
+    reader.join(10)
+    assert not reader.is_alive()
+    # The reader re-ranked with the embeddings that belong to the index it searched
+    assert (old.searched, reranked) == ([1], [1])
+    assert names(results[0]) == ['Samosa', 'Coffee']
+
+    assert names(engine.get_recommendations(['Tea'], MENU, 2)) == ['Samosa', 'Coffee']
+    assert (engine.index.searched, reranked) == ([1], [1, 2])
+
+
+def test_reload_invalidates_the_query_caches(engine):
+    assert names(engine.get_recommendations(['Tea'], MENU, 2)) == ['Samosa', 'Coffee']
+    # Same canonical cart: no second encode or search
+    assert names(engine.get_recommendations(['chai'], MENU, 2)) == ['Samosa', 'Coffee']
+    assert (engine.model.encoded, engine.index.searched) == ([[engine._query_text(('tea',))]], [1])
+    assert (len(engine.query_embeddings), len(engine.query_results)) == (1, 1)
+
+    engine.reload()
+    assert (len(engine.query_embeddings), len(engine.query_results)) == (0, 0)
+    engine.get_recommendations(['Tea'], MENU, 2)
+    assert (len(engine.model.encoded), engine.index.searched) == (2, [1])
+
+
+def test_hits_from_a_replaced_index_are_not_cached(engine):
+    old = engine.index
+    old.release.clear()
+    reader = threading.Thread(target=engine.get_recommendations, args=(['Tea'], MENU, 2))
+    reader.start()
+    assert old.searching.wait(10)
+    engine.reload()
+    old.release.set()
+    reader.join(10)
+    assert not reader.is_alive()
+    # The search ran under the previous generation
+    assert len(engine.query_results) == 0
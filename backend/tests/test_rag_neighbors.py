@@ -0,0 +1,173 @@
+"""The RAG neighbour table and index backend choice, without faiss or the model."""
+import json
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+KNOWLEDGE_BASE = [
+    {'item': name, 'type': kind, 'taste_profile': '', 'reason': f'{name} goes well here',
+     'pairs_well_with': []}
+    for name, kind in [('Tea', 'Beverage'), ('Samosa', 'Snack'), ('Coffee', 'Beverage'), ('Pasta', 'Main')]
+]
+MENU = [
+    {'id': 1, 'item_name': 'Coffee', 'price': 30, 'category': 'Beverages', 'availability': True},
+    {'id': 2, 'item_name': 'Tea', 'price': 25, 'category': 'Beverages', 'availability': True},
+    {'id': 3, 'item_name': 'Samosa', 'price': 20, 'category': 'Snacks', 'availability': True},
+    {'id': 4, 'item_name': 'Pasta', 'price': 150, 'category': 'Main Course', 'availability': False},
+]
+# Knowledge-base index -> position, close together for Tea/Samosa/Coffee
+VECTORS = [[1.0, 0.1], [0.9, 0.3], [0.8, 0.0], [0.0, 1.0]]
+
+
+def table(neighbors, key='kb-key', top_n=2):
+    from rag_engine.neighbors import NeighborTable
+
+    return NeighborTable(neighbors, key, top_n)
+
+
+def test_lookup_adds_up_shared_neighbours(app):
+    neighbors = table({'tea': [(1, 0.9), (2, 0.8)], 'samosa': [(0, 0.9), (2, 0.5)], 'coffee': [(0, 0.8)]})
+    assert neighbors.covers(('samosa', 'tea'))
+    # 2 is a neighbour of both cart items: 0.8 + 0.5 beats 0.9
+    assert neighbors.lookup(('samosa', 'tea'), 5) == (2, 0, 1)
+    assert neighbors.lookup(('samosa', 'tea'), 1) == (2,)
+    # Equal scores rank by knowledge-base index
+    assert table({'a': [(3, 0.5), (1, 0.5)]}).lookup(('a',), 2) == (1, 3)
+
+
+def test_lookup_of_an_unknown_item_is_none(app):
+    neighbors = table({'tea': [(1, 0.9)]})
+    assert not neighbors.covers(('pizza',))
+    assert not neighbors.covers(('pizza', 'tea'))
+    assert not neighbors.covers(())
+    assert neighbors.lookup(('pizza', 'tea'), 5) is None
+
+
+def test_save_and_load(app, tmp_path):
+    from rag_engine.neighbors import NeighborTable
+
+    path = tmp_path / 'cache' / 'neighbors.json'
+    table({'tea': [(1, 0.123456)], 'samosa': [(0, 0.9)]}).save(path)
+    loaded = NeighborTable.load(path, 'kb-key')
+    assert (loaded.neighbors, loaded.top_n, len(loaded)) == ({'tea': [(1, 0.1235)], 'samosa': [(0, 0.9)]}, 2, 2)
+    # Built for another knowledge base or model
+    assert NeighborTable.load(path, 'other-key') is None
+    assert NeighborTable.load(tmp_path / 'missing.json', 'kb-key') is None
+    path.write_text('{"key": ', encoding='utf-8')
+    assert NeighborTable.load(path, 'kb-key') is None
+
+
+def numpy_normalized(vectors):
+    vectors = np.array(vectors, dtype='float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class NumpyFlatIndex:
+    """Exact inner-product search, the part of faiss.IndexFlatIP build_table uses."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def search(self, queries, k):
+        scores = queries @ self.vectors.T
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), order
+
+
+class StubEngine:
+    """What build_table reads from a RAGRecommendationEngine, with fixed embeddings."""
+
+    def __init__(self):
+        from recommendation_engine import get_engine
+
+        self.rule_engine = get_engine()
+        self.knowledge_base = KNOWLEDGE_BASE
+        self.embeddings = np.array(VECTORS, dtype='float32')
+
+    def _initialize_embeddings(self):
+        pass
+
+    _entry_text = staticmethod(lambda item: item['item'])
+
+
+def test_build_table(app, monkeypatch):
+    from rag_engine import index_backends, neighbors, rag_engine
+
+    monkeypatch.setattr(rag_engine, '_load_dependencies', lambda: None)
+    monkeypatch.setattr(index_backends, 'normalized', numpy_normalized)
+    monkeypatch.setattr(index_backends, 'build_index', lambda vectors, backend: NumpyFlatIndex(vectors))
+    built = neighbors.build_table(StubEngine(), top_n=2)
+    # Best first, never the item itself
+    assert {name: [idx for idx, _ in row] for name, row in built.neighbors.items()} == {
+        'tea': [2, 1], 'samosa': [0, 2], 'coffee': [0, 1], 'pasta': [1, 0]}
+    assert built.key == neighbors.knowledge_base_key([item['item'] for item in KNOWLEDGE_BASE],
+                                                     rag_engine.MODEL_NAME)
+    assert built.lookup(('samosa', 'tea'), 1) == (2,)
+
+
+@pytest.fixture
+def without_faiss(app, monkeypatch):
+    """faiss and sentence-transformers are not installed (whether or not they are here)."""
+    from rag_engine import rag_engine
+
+    monkeypatch.setitem(sys.modules, 'faiss', None)
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', None)
+    monkeypatch.setattr(rag_engine, 'RAG_AVAILABLE', False)
+    return rag_engine
+
+
+def test_backend_choice_without_faiss(without_faiss):
+    from rag_engine import index_backends
+
+    choose = index_backends.choose_backend
+    assert [choose(n, 'auto') for n in (10, 10000, 10001, 1000000, 1000001)] == [
+        'flat', 'flat', 'hnsw', 'hnsw', 'ivf']
+    assert choose(10, 'ivf') == 'ivf'
+    with pytest.raises(ValueError):
+        choose(10, 'annoy')
+    assert index_backends.index_tag('hnsw', 'int8') == 'hnsw-int8'
+    # Building an index is what needs faiss
+    with pytest.raises(ImportError):
+        index_backends.build_index(np.array(VECTORS, dtype='float32'))
+
+
+def write_knowledge_base(data_dir, with_table):
+    from rag_engine import neighbors, rag_engine
+
+    data_dir.mkdir()
+    (data_dir / 'food_knowledge.json').write_text(json.dumps(KNOWLEDGE_BASE), encoding='utf-8')
+    if with_table:
+        texts = [rag_engine.RAGRecommendationEngine._entry_text(item) for item in KNOWLEDGE_BASE]
+        key = neighbors.knowledge_base_key(texts, rag_engine.MODEL_NAME)
+        table({'tea': [(1, 0.9), (2, 0.8)], 'samosa': [(0, 0.9)], 'coffee': [(0, 0.8), (3, 0.1)]},
+              key).save(data_dir / 'rag_cache' / 'neighbors.json')
+
+
+def test_table_serves_covered_carts_without_faiss(without_faiss, tmp_path):
+    write_knowledge_base(tmp_path / 'data', with_table=True)
+    engine = without_faiss.RAGRecommendationEngine(data_dir=tmp_path / 'data')
+    recommendations = engine.get_recommendations(['chai'], MENU, 5)
+    assert [r['item_name'] for r in recommendations] == ['Samosa', 'Coffee']
+    assert {r['source'] for r in recommendations} == {'RAG'}
+    # Pasta is a neighbour of Coffee but is not available
+    assert [r['item_name'] for r in engine.get_recommendations(['Coffee'], MENU, 5)] == ['Tea']
+    # Only free-text items need the model
+    assert not engine.covers(['Tea', 'Pizza'])
+    with pytest.raises(ImportError):
+        engine.get_recommendations(['Tea', 'Pizza'], MENU, 5)
+
+
+def test_no_table_and_no_faiss_falls_back_to_rules(without_faiss, tmp_path, monkeypatch):
+    write_knowledge_base(tmp_path / 'data', with_table=False)
+    with pytest.raises(ImportError):
+        without_faiss.RAGRecommendationEngine(data_dir=tmp_path / 'data')
+
+    monkeypatch.setenv('RAG_CACHE_DIR', str(tmp_path / 'empty'))
+    monkeypatch.delenv('RAG_NEIGHBORS_FILE', raising=False)
+    hybrid = without_faiss.HybridRecommendationEngine()
+    assert hybrid.rag_engine is None
+    recommendations = hybrid.get_recommendations(['Tea'], MENU, 3)
+    assert recommendations
+    assert {r['source'] for r in recommendations} == {'rule-based'}
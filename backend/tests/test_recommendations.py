@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+
+def test_hybrid_engine_shares_the_rule_engine(app):
+    from rag_engine import get_hybrid_engine
+    from recommendation_engine import get_engine
+
+    hybrid = get_hybrid_engine(warm_up=False)
+    assert hybrid.rule_engine is get_engine()
+    if hybrid.rag_engine is not None:
+        assert hybrid.rag_engine.rule_engine is hybrid.rule_engine
+
+
+def test_rag_cart_key_uses_its_rule_engine(app):
+    from rag_engine.rag_engine import RAGRecommendationEngine
+    from recommendation_engine import get_engine
+
+    # Skips loading the knowledge base and the model
+    engine = RAGRecommendationEngine.__new__(RAGRecommendationEngine)
+    engine.rule_engine = get_engine()
+    assert engine._cart_key(['Samosa', 'chai', 'samosa']) == ('samosa', 'tea')
+
+
+def test_failed_warm_up_raises_instead_of_blocking(app, tmp_path, monkeypatch):
+    from rag_engine import rag_engine
+
+    attempts = []
+
+    def broken_download():
+        attempts.append(threading.current_thread().name)
+        raise OSError('model download failed')
+
+    monkeypatch.setattr(rag_engine, 'RAG_AVAILABLE', True)
+    monkeypatch.setattr(rag_engine, '_load_dependencies', broken_download)
+    engine = rag_engine.RAGRecommendationEngine(data_dir=tmp_path)
+    with pytest.raises(OSError, match='model download failed'):
+        engine.ensure_ready(timeout=10)
+    assert not engine.ready
+
+    # Without a timeout, as get_recommendations() calls it; a later call retries
+    errors = []
+
+    def wait():
+        try:
+            engine.ensure_ready()
+        except OSError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait, daemon=True)
+    waiter.start()
+    waiter.join(10)
+    assert not waiter.is_alive()
+    assert [str(e) for e in errors] == ['model download failed']
+    assert len(attempts) == 2
+
+
+def test_menu_change_rebuilds_the_shared_index_once(app, monkeypatch):
+    from rag_engine import rag_engine
+    from recommendation_engine import RecommendationEngine
+
+    # Construct the RAG half without its dependencies; it never warms up here
+    monkeypatch.setattr(rag_engine, 'RAG_AVAILABLE', True)
+    rules = RecommendationEngine()
+    hybrid = rag_engine.HybridRecommendationEngine(warm_up=False, rule_engine=rules)
+    rag = hybrid.rag_engine
+    assert rag.rule_engine is rules
+
+    seen = []
+    rag._ready.set()
+    monkeypatch.setattr(rag, 'get_recommendations',
+                        lambda cart, menu, limit: seen.append((rag.rule_engine.index, menu)) or [])
+    rebuilds = []
+    rebuild = rules._rebuild
+    monkeypatch.setattr(rules, '_rebuild', lambda menu=None: rebuilds.append(menu) or rebuild(menu))
+
+    menu = [{'id': 1, 'item_name': 'Coffee', 'price': 30, 'category': 'Beverages', 'availability': True},
+            {'id': 2, 'item_name': 'Samosa', 'price': 20, 'category': 'Snacks', 'availability': True}]
+    for cart in (['Tea'], ['Coffee']):
+        # As the route does on every request
+        rules.set_menu(menu)
+        hybrid.get_recommendations(cart, menu, 3)
+    assert len(rebuilds) == 1
+    index = rules.index
+    assert all(used is index and menu_index is index.menu for used, menu_index in seen)
+
+    # menu_cache reloaded: a new list, one rebuild that both halves see
+    reloaded = [dict(item) for item in menu]
+    rules.set_menu(reloaded)
+    hybrid.get_recommendations(['Tea'], reloaded, 3)
+    assert len(rebuilds) == 2
+    assert rules.index is not index
+    assert seen[-1][0] is rules.index
+    assert seen[-1][1] is rules.index.menu
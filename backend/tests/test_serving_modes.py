@@ -0,0 +1,67 @@
+"""The same requests, sent to the Flask app and to the ASGI app, get the same responses."""
+import pytest
+
+from conftest import USER_ID, add_order, add_user, reset_caches
+
+REQUESTS = [
+    ('GET', '/api/menu', {}),
+    ('GET', '/api/menu?available=true', {}),
+    ('GET', '/api/menu/2', {}),
+    ('GET', '/api/stats', {}),
+    ('GET', '/api/orders?admin=true', {}),
+    ('GET', '/api/orders?admin=true&limit=2', {}),
+    ('GET', '/api/orders?admin=true&fields=order_id,username,total_amount&status=Ready,Completed', {}),
+    ('GET', f'/api/orders?user_id={USER_ID}&from=2026-01-02&to=2026-01-04', {}),
+    ('GET', '/api/orders?username=user&limit=1', {}),
+    ('GET', '/api/orders', {}),
+    ('GET', '/api/orders?admin=true&limit=0', {}),
+    ('GET', '/api/orders?admin=true&fields=password', {}),
+    ('GET', '/api/orders?admin=true&cursor=nonsense', {}),
+    ('GET', '/api/orders/stream', {}),
+    ('GET', '/api/recommendations?cart_items=Tea,Samosa&limit=3', {}),
+    ('POST', '/api/checkout', {'json': [1, 2]}),
+    ('POST', '/api/checkout', {'data': 'cart=1', 'content_type': 'text/plain'}),
+    ('POST', '/api/checkout', {'data': '{"cart": [', 'content_type': 'application/json'}),
+    ('POST', '/api/checkout', {'json': {'user_id': USER_ID, 'cart': [{'id': 5, 'quantity': 1}]}}),
+]
+COMPARED_HEADERS = ('Content-Type', 'ETag', 'Cache-Control', 'Content-Disposition')
+
+
+@pytest.fixture
+def orders():
+    other = add_user('guest', 'Guest')
+    rows = [
+        ('ORD-STU100001', USER_ID, 'Completed', '2026-01-02 12:00:00', [('Coffee', 30, 2)]),
+        ('ORD-STU100002', USER_ID, 'Ready', '2026-01-03 12:30:00', [('Tea', 25, 1), ('Samosa', 20, 3)]),
+        ('ORD-GUE100003', other, 'Pending', '2026-01-03 12:30:00', [('Café au lait', 45.5, 1)]),
+        ('ORD-STU100004', USER_ID, 'Uncompleted', '2026-01-05 09:15:00', [('Pasta', 150, 1)]),
+    ]
+    for row in rows:
+        add_order(*row)
+
+
+def respond(client, method, path, kwargs):
+    # Each mode fills the caches from the database itself
+    reset_caches()
+    response = client.open(path, method=method, **kwargs)
+    return response.status_code, response.get_data(), {h: response.headers.get(h) for h in COMPARED_HEADERS}
+
+
+@pytest.mark.parametrize('method, path, kwargs', REQUESTS, ids=[f'{m} {p}' for m, p, _ in REQUESTS])
+def test_same_response(app, asgi_client, orders, method, path, kwargs):
+    assert respond(asgi_client, method, path, kwargs) == respond(app.test_client(), method, path, kwargs)
+
+
+@pytest.mark.parametrize('path', ['/api/menu', '/api/stats', '/api/orders?admin=true&limit=2'])
+def test_same_not_modified(app, asgi_client, orders, path):
+    etag = app.test_client().get(path).headers['ETag']
+    for client in (app.test_client(), asgi_client):
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert (response.status_code, response.get_data()) == (304, b'')
+        assert response.headers['ETag'] == etag
+
+
+def test_next_page_cursor(app, asgi_client, orders):
+    first = app.test_client().get('/api/orders?admin=true&limit=2').get_json()
+    path = f"/api/orders?admin=true&limit=2&cursor={first['next_cursor']}"
+    assert respond(asgi_client, 'GET', path, {}) == respond(app.test_client(), 'GET', path, {})
@@ -0,0 +1,101 @@
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import db
+import stats
+from conftest import USER_ID, add_user, execute, reset_caches
+
+
+def figures(use_rollup):
+    conn = db.connect()
+    try:
+        return stats.load_stats(conn.cursor(cursor_factory=RealDictCursor), use_rollup)
+    finally:
+        conn.close()
+
+
+def assert_rollup_matches_orders():
+    assert figures(use_rollup=True) == figures(use_rollup=False)
+
+
+def place_order(client, cart, user_id=USER_ID):
+    response = client.post('/api/checkout', json={'user_id': user_id, 'cart': cart})
+    assert response.status_code == 200
+    return response.get_json()['orderId']
+
+
+def set_status(client, order_id, status):
+    assert client.patch(f'/api/orders/{order_id}/status', json={'status': status}).status_code == 200
+
+
+def test_rollup_follows_checkout_and_status_changes(client):
+    guest = add_user('visitor', 'Guest')
+    first = place_order(client, [{'id': 1, 'quantity': 2}])
+    second = place_order(client, [{'id': 2, 'quantity': 1}, {'id': 3, 'quantity': 4}], user_id=guest)
+    third = place_order(client, [{'id': 4, 'quantity': 1}])
+    set_status(client, first, 'Ready')
+    set_status(client, first, 'Completed')
+    set_status(client, second, 'Preparing')
+    set_status(client, second, 'Preparing')
+    set_status(client, third, 'Cancelled')
+    assert_rollup_matches_orders()
+
+    reset_caches()
+    body = client.get('/api/stats').get_json()
+    assert body['stats'] == figures(use_rollup=False)
+    assert body['stats']['totalOrders'] == 3
+    assert body['stats']['pendingOrders'] == 1
+    assert body['stats']['totalRevenue'] == 315.0
+
+
+def insert_legacy_orders():
+    """Orders written without the rollup, as before it existed."""
+    execute("""
+        INSERT INTO orders (order_id, user_id, items, total_amount, status, payment_status, created_at)
+        SELECT 'ORD-OLD' || n, %s, '[]', n * 10, CASE WHEN n %% 3 = 0 THEN 'Completed' ELSE 'Pending' END,
+               CASE WHEN n %% 4 = 0 THEN 'Pending' ELSE 'Paid' END, CURRENT_DATE - n
+        FROM generate_series(0, 39) AS n
+    """, (USER_ID,))
+
+
+def rebuild():
+    conn = db.connect()
+    try:
+        stats.rebuild_rollup(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_rebuild_fills_an_empty_rollup(app):
+    insert_legacy_orders()
+    assert figures(use_rollup=True)['totalOrders'] == 0
+    rebuild()
+    assert figures(use_rollup=True)['totalOrders'] == 40
+    assert_rollup_matches_orders()
+
+
+def test_status_changes_after_rebuild(client):
+    insert_legacy_orders()
+    rebuild()
+    set_status(client, 'ORD-OLD1', 'Completed')
+    set_status(client, 'ORD-OLD2', 'Completed')
+    assert_rollup_matches_orders()
+    assert figures(use_rollup=True)['pendingOrders'] >= 0
+
+
+def test_rebuild_repairs_drift(app):
+    insert_legacy_orders()
+    conn = db.connect()
+    try:
+        cur = conn.cursor()
+        stats.rebuild_rollup(cur)
+        cur.execute('UPDATE order_daily_stats SET orders = orders + 5, revenue = revenue - 1')
+        conn.commit()
+        with pytest.raises(AssertionError):
+            assert_rollup_matches_orders()
+        stats.rebuild_rollup(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    assert_rollup_matches_orders()
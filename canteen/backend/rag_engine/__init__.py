@@ -18,6 +18,9 @@ Usage:
         # Or use hybrid approach
         hybrid = get_hybrid_engine()
 
+Importing this package does not import torch, sentence-transformers or
+faiss; they are loaded when an engine warms up (see start_warmup).
+
 Prerequisites:
 --------------
     pip install sentence-transformers faiss-cpu
@@ -0,0 +1,102 @@
+"""
+Micro-batching queue for RAG recommendation requests.
+
+One model.encode call for 32 queries costs little more than a call for one
+on CPU, so concurrent requests are collected for up to ``max_wait_ms``
+(or until ``max_batch_size`` arrive), handled as one batch, and each caller
+gets its own result back.
+
+A single worker thread per process drains the queue. It is started on
+first use and restarted after a fork, as gunicorn workers inherit no
+threads from the master.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+RAG_BATCH_MAX_SIZE = int(os.environ.get('RAG_BATCH_MAX_SIZE', '32'))
+RAG_BATCH_MAX_WAIT_MS = float(os.environ.get('RAG_BATCH_MAX_WAIT_MS', '5'))
+
+
+class MicroBatcher:
+    """Collects concurrent ``submit`` calls into batches for ``handler``."""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = RAG_BATCH_MAX_SIZE,
+        max_wait_ms: float = RAG_BATCH_MAX_WAIT_MS,
+    ):
+        """
+        Args:
+            handler: Takes a list of requests, returns one result per request
+            max_batch_size: Largest batch passed to ``handler``
+            max_wait_ms: How long the first request of a batch waits for company
+        """
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.batches = 0
+        self.requests = 0
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name='rag-batcher', daemon=True).start()
+
+    def submit(self, request: Any, timeout: Optional[float] = None) -> Any:
+        """Queue one request and block until its batch has been handled."""
+        self._start()
+        future: Future = Future()
+        self._queue.put((request, future))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            requests = [request for request, _ in batch]
+            try:
+                results = self.handler(requests)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0,
+            'queued': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -0,0 +1,315 @@
+"""
+Micro-benchmarks for the recommendation engines.
+
+Run from canteen/backend:
+
+    python -m rag_engine.benchmark menu-match --sizes 50 500 5000
+    python -m rag_engine.benchmark batch --threads 32 --seconds 10
+    python -m rag_engine.benchmark ann --sizes 10000 100000
+    python -m rag_engine.benchmark storage --sizes 10000 100000
+
+``batch`` loads the real model, ``ann`` and ``storage`` need faiss and
+numpy only; all three
+exit with a message when their dependencies are missing.
+"""
+
+import argparse
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+from recommendation_engine import MenuIndex, get_engine
+
+from .batching import MicroBatcher
+from .index_backends import STORAGES, build_index, choose_backend, configure_search, normalized, rerank
+from .rag_engine import RAG_AVAILABLE, RAGRecommendationEngine
+
+
+def synthetic_menu(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Menu of ``size`` items; roughly one in ten is unavailable."""
+    rng = random.Random(seed)
+    return [
+        {'id': i, 'item_name': f'Menu Item {i}', 'price': rng.randint(10, 200),
+         'category': 'Test', 'description': 'Synthetic item', 'availability': rng.random() > 0.1}
+        for i in range(size)
+    ]
+
+
+def synthetic_knowledge_base(size: int) -> List[Dict[str, Any]]:
+    return [{'item': f'Menu Item {i}', 'reason': 'Synthetic pairing'} for i in range(size)]
+
+
+def _legacy_match(knowledge_base, hits, cart_items, available_items, max_recommendations):
+    """The pre-index matching loop: a menu scan per FAISS hit."""
+    recommendations = []
+    cart_items_lower = [item.lower() for item in cart_items]
+    for idx in hits:
+        kb_item = knowledge_base[idx]
+        item_name = kb_item['item']
+        if item_name.lower() in cart_items_lower:
+            continue
+        menu_item = None
+        for mi in available_items:
+            if mi.get('item_name', '').lower() == item_name.lower():
+                menu_item = mi
+                break
+        if menu_item and menu_item.get('availability', False):
+            recommendations.append(menu_item)
+        if len(recommendations) >= max_recommendations:
+            break
+    return recommendations
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def bench_menu_match(args):
+    """Matching k FAISS hits to the menu: linear scan vs a MenuIndex."""
+    print(f"{'menu size':>10} {'scan ms':>10} {'index ms':>10} {'build ms':>10} {'speed-up':>10}")
+    for size in args.sizes:
+        menu = synthetic_menu(size)
+        engine = RAGRecommendationEngine.__new__(RAGRecommendationEngine)
+        engine.knowledge_base = synthetic_knowledge_base(size)
+        engine.rule_engine = get_engine()
+        rng = random.Random(size)
+        queries = [rng.sample(range(size), min(args.k, size)) for _ in range(64)]
+        cart = engine._cart_key(['Menu Item 0'])
+
+        def scan(q=iter(queries * (args.iterations // 64 + 1))):
+            _legacy_match(engine.knowledge_base, next(q), cart, menu, args.k // 2)
+
+        # Built once per menu version in production; timed separately
+        build_ms = _time_per_call(lambda: MenuIndex(menu), 20)
+        index = MenuIndex(menu)
+
+        def indexed(q=iter(queries * (args.iterations // 64 + 1))):
+            engine._match_hits(next(q), cart, index, args.k // 2)
+
+        scan_ms = _time_per_call(scan, args.iterations)
+        index_ms = _time_per_call(indexed, args.iterations)
+        print(f"{size:>10} {scan_ms:>10.4f} {index_ms:>10.4f} {build_ms:>10.3f} {scan_ms / index_ms:>9.1f}x")
+
+
+def _require_rag():
+    if not RAG_AVAILABLE:
+        raise SystemExit("This benchmark needs: pip install sentence-transformers faiss-cpu")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def _run_clients(call, carts, threads: int, seconds: float) -> List[float]:
+    """Run ``call(cart)`` in a loop on N threads; return per-call latencies (ms)."""
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    deadline = time.monotonic() + seconds
+
+    def loop(slot):
+        rng = random.Random(slot)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            call(rng.choice(carts))
+            latencies[slot].append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return [ms for slot in latencies for ms in slot]
+
+
+def _knowledge_base_menu(engine: RAGRecommendationEngine):
+    """Every knowledge-base item as an available menu item, plus sample carts."""
+    names = [item['item'] for item in engine.knowledge_base]
+    menu = MenuIndex([{'id': i, 'item_name': name, 'price': 20, 'availability': True}
+                      for i, name in enumerate(names)])
+    rng = random.Random(0)
+    carts = [rng.sample(names, min(len(names), rng.randint(1, 3))) for _ in range(200)]
+    return menu, carts
+
+
+def bench_batch(args):
+    """One encode per request vs the micro-batching queue: throughput and p99."""
+    _require_rag()
+    engine = RAGRecommendationEngine()
+    menu, carts = _knowledge_base_menu(engine)
+    engine.batcher = MicroBatcher(engine._recommend_many, args.max_batch, args.max_wait_ms)
+    engine.get_recommendations(carts[0], menu)  # load the model before timing
+
+    print(f"Threads: {args.threads}, duration: {args.seconds}s, "
+          f"max batch: {args.max_batch}, max wait: {args.max_wait_ms}ms")
+    print(f"{'mode':<24} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, call in (('one query per request', engine.get_recommendations),
+                        ('micro-batched', engine.get_recommendations_queued)):
+        latencies = _run_clients(lambda cart: call(cart, menu, 5), carts, args.threads, args.seconds)
+        print(f"{label:<24} {len(latencies) / args.seconds:>9.1f} "
+              f"{_percentile(latencies, 50):>9.2f} {_percentile(latencies, 99):>9.2f}")
+    print('Batcher:', engine.batcher.stats())
+
+
+def _synthetic_vectors(n: int, dim: int, seed: int):
+    """Clustered vectors (like real menu embeddings), not uniform noise."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype('float32')
+    labels = rng.integers(0, len(centers), n)
+    return centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype('float32')
+
+
+def _search_each(index, queries, k: int):
+    """Search one query at a time, like requests do; returns (ids, ms/query)."""
+    import numpy as np
+
+    ids = np.empty((len(queries), k), dtype='int64')
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, ids[i:i + 1] = index.search(queries[i:i + 1], k)
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def _recall(found, truth) -> float:
+    k = truth.shape[1]
+    return sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist())) / (len(truth) * k)
+
+
+def bench_ann(args):
+    """Recall@k vs latency of HNSW and IVF against the exact flat index."""
+    try:
+        import faiss
+        import numpy as np
+    except ImportError:
+        raise SystemExit("This benchmark needs: pip install faiss-cpu numpy")
+    faiss.omp_set_num_threads(args.omp_threads)
+
+    print(f"dim {args.dim}, {args.queries} queries, recall@{args.k} vs flat, "
+          f"{args.omp_threads} search thread(s)")
+    print(f"{'items':>8} {'backend':<6} {'param':<12} {'build s':>8} {'ms/query':>9} {'recall':>7}")
+    for n in args.sizes:
+        corpus = _synthetic_vectors(n, args.dim, seed=n)
+        rng = np.random.default_rng(n + 1)
+        picks = rng.choice(n, args.queries, replace=False)
+        queries = normalized(corpus[picks] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype('float32'))
+        auto = choose_backend(n, 'auto')
+
+        rows = []
+        start = time.perf_counter()
+        flat = build_index(corpus, 'flat')
+        build_s = time.perf_counter() - start
+        truth, flat_ms = _search_each(flat, queries, args.k)
+        rows.append(('flat', '-', build_s, flat_ms, 1.0))
+
+        start = time.perf_counter()
+        hnsw = build_index(corpus, 'hnsw')
+        build_s = time.perf_counter() - start
+        for ef in args.ef_search:
+            found, ms = _search_each(configure_search(hnsw, ef_search=ef), queries, args.k)
+            rows.append(('hnsw', f'efSearch={ef}', build_s, ms, _recall(found, truth)))
+
+        start = time.perf_counter()
+        ivf = build_index(corpus, 'ivf')
+        build_s = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            found, ms = _search_each(configure_search(ivf, nprobe=nprobe), queries, args.k)
+            rows.append(('ivf', f'nprobe={nprobe}', build_s, ms, _recall(found, truth)))
+
+        for backend, param, build_s, ms, recall in rows:
+            mark = '  <- auto' if backend == auto else ''
+            print(f"{n:>8} {backend:<6} {param:<12} {build_s:>8.2f} {ms:>9.3f} {recall:>7.3f}{mark}")
+
+
+def _index_mb(index) -> float:
+    """Size of the index as a worker holds it (vectors, codes, graph/lists)."""
+    import faiss
+
+    return faiss.serialize_index(index).nbytes / 1e6
+
+
+def bench_storage(args):
+    """Index memory, latency and recall of float16/int8 storage vs float32."""
+    try:
+        import faiss
+        import numpy as np
+    except ImportError:
+        raise SystemExit("This benchmark needs: pip install faiss-cpu numpy")
+    faiss.omp_set_num_threads(args.omp_threads)
+
+    print(f"dim {args.dim}, {args.queries} queries, recall@{args.k} vs float32 flat, "
+          f"re-rank over {args.rerank_factor}x{args.k} candidates")
+    print(f"{'items':>8} {'backend':<6} {'storage':<8} {'index MB':>9} {'ms/query':>9} "
+          f"{'recall':>7} {'+rerank ms':>11} {'+rerank recall':>15}")
+    for n in args.sizes:
+        corpus = _synthetic_vectors(n, args.dim, seed=n)
+        rng = np.random.default_rng(n + 1)
+        picks = rng.choice(n, args.queries, replace=False)
+        queries = normalized(corpus[picks] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype('float32'))
+        truth, _ = _search_each(build_index(corpus, 'flat'), queries, args.k)
+        fetch = min(args.k * args.rerank_factor, n)
+
+        for backend in args.backends:
+            for storage in STORAGES:
+                index = configure_search(build_index(corpus, backend, storage))
+                found, ms = _search_each(index, queries, args.k)
+                line = (f"{n:>8} {backend:<6} {storage:<8} {_index_mb(index):>9.1f} {ms:>9.3f} "
+                        f"{_recall(found, truth):>7.3f}")
+                if storage != 'float32':
+                    start = time.perf_counter()
+                    candidates, _ = _search_each(index, queries, fetch)
+                    reranked = rerank(corpus, queries, candidates, args.k)
+                    rerank_ms = (time.perf_counter() - start) / len(queries) * 1000
+                    line += f" {rerank_ms:>11.3f} {_recall(reranked, truth):>15.3f}"
+                print(line)
+        print(f"{'':>8} float32 embeddings for the re-rank: {corpus.nbytes / 1e6:.1f} MB, "
+              f"memory-mapped and shared by all workers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('menu-match', help='menu matching per request')
+    p.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    p.add_argument('--k', type=int, default=10, help='FAISS hits per query')
+    p.add_argument('--iterations', type=int, default=2000)
+    p.set_defaults(func=bench_menu_match)
+
+    p = sub.add_parser('batch', help='micro-batched RAG queries under concurrency')
+    p.add_argument('--threads', type=int, default=32)
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--max-batch', type=int, default=32)
+    p.add_argument('--max-wait-ms', type=float, default=5)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser('ann', help='ANN backend recall vs latency on a synthetic corpus')
+    p.add_argument('--sizes', type=int, nargs='+', default=[10000, 30000, 100000])
+    p.add_argument('--dim', type=int, default=384, help='all-MiniLM-L6-v2 is 384-d')
+    p.add_argument('--queries', type=int, default=1000)
+    p.add_argument('--k', type=int, default=10)
+    p.add_argument('--ef-search', type=int, nargs='+', default=[16, 32, 64, 128])
+    p.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16, 64])
+    p.add_argument('--omp-threads', type=int, default=1)
+    p.set_defaults(func=bench_ann)
+
+    p = sub.add_parser('storage', help='float32 vs float16 vs int8 index storage')
+    p.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    p.add_argument('--backends', nargs='+', default=['flat', 'hnsw'], choices=['flat', 'hnsw', 'ivf'])
+    p.add_argument('--dim', type=int, default=384)
+    p.add_argument('--queries', type=int, default=1000)
+    p.add_argument('--k', type=int, default=10)
+    p.add_argument('--rerank-factor', type=int, default=4)
+    p.add_argument('--omp-threads', type=int, default=1)
+    p.set_defaults(func=bench_storage)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+On-disk cache of knowledge-base embeddings and the FAISS index.
+
+Encoding food_knowledge.json with SentenceTransformer takes seconds to
+minutes and used to happen in every worker on every start. The vectors and
+the index are now written once to ``cache_dir``. Files are named after a
+content hash of the knowledge-base texts plus the model name, so the
+cached vectors always match the current knowledge base and model.
+
+Loading:
+--------
+- embeddings: ``np.load(..., mmap_mode='r')``. Every worker maps the same
+  file, so the pages are shared through the OS page cache.
+- index: ``faiss.read_index`` with IO_FLAG_MMAP where the index type
+  supports it, falling back to a normal read.
+
+Incremental rebuild:
+--------------------
+A per-model manifest records the hash of every entry's text. When the
+knowledge base is edited, vectors for unchanged entries are copied from the
+previous file and only new or changed entries are sent to the model.
+
+Files are written under a temporary name and moved into place with
+os.replace, so concurrent workers never read a partial file.
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _atomic_write(path: Path, write: Callable[[str], None]):
+    """Write via ``write(tmp_path)`` and move the result into place."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _save_array(path: str, array: np.ndarray):
+    # Through a file object: np.save would append '.npy' to the temp name
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+class EmbeddingCache:
+    """Persisted embeddings + FAISS index for one model."""
+
+    def __init__(self, cache_dir: Path, model_name: str):
+        self.cache_dir = Path(cache_dir)
+        self.model_name = model_name
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.manifest_path = self.cache_dir / f"{slug}.manifest.json"
+        self.embeddings: Optional[np.ndarray] = None
+        self.index = None
+        self.key: Optional[str] = None
+        self.encoded = 0  # entries sent to the model by the last load()
+
+    def _embeddings_path(self, key: str) -> Path:
+        return self.cache_dir / f"kb-{key[:20]}.npy"
+
+    def _index_path(self, key: str, index_tag: str) -> Path:
+        return self.cache_dir / f"kb-{key[:20]}.{index_tag}.faiss"
+
+    def content_key(self, entry_hashes: Sequence[str]) -> str:
+        return _digest(self.model_name + '\0' + '\n'.join(entry_hashes))
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _read_index(path: Path):
+        try:
+            return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be mapped; read it into memory instead
+            return faiss.read_index(str(path))
+
+    def load(
+        self,
+        texts: List[str],
+        encode: Callable[[List[str]], np.ndarray],
+        build_index: Callable[[np.ndarray], object],
+        index_tag: str = 'flat',
+    ):
+        """
+        Return ``(embeddings, index)`` for ``texts``, encoding only what changed.
+
+        Args:
+            texts: One text per knowledge-base entry, in index order
+            encode: Encodes a list of texts to a float32 matrix (the model)
+            build_index: Builds a FAISS index from the full embedding matrix
+            index_tag: Names the index variant (backend and parameters); the
+                embeddings are shared by every variant
+        """
+        entry_hashes = [_digest(t) for t in texts]
+        key = self.content_key(entry_hashes)
+        emb_path, index_path = self._embeddings_path(key), self._index_path(key, index_tag)
+        self.encoded = 0
+
+        if not emb_path.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            embeddings = self._assemble(texts, entry_hashes, encode)
+            _atomic_write(emb_path, lambda tmp: _save_array(tmp, embeddings))
+            self._write_manifest(key, entry_hashes)
+        self.embeddings = np.load(emb_path, mmap_mode='r')
+
+        if not index_path.exists():
+            index = build_index(np.ascontiguousarray(self.embeddings))
+            _atomic_write(index_path, lambda tmp: faiss.write_index(index, tmp))
+
+        self.key = key
+        self.index = self._read_index(index_path)
+        return self.embeddings, self.index
+
+    def _assemble(self, texts, entry_hashes, encode) -> np.ndarray:
+        """Reuse vectors from the previous build; encode the rest."""
+        previous = {}
+        old = None
+        manifest = self._read_manifest()
+        if manifest.get('model') == self.model_name:
+            old_path = self._embeddings_path(manifest.get('key', ''))
+            if old_path.exists():
+                old = np.load(old_path, mmap_mode='r')
+                previous = {h: i for i, h in enumerate(manifest.get('entries', []))}
+
+        missing = [i for i, h in enumerate(entry_hashes) if h not in previous]
+        fresh = None
+        if missing:
+            fresh = np.asarray(encode([texts[i] for i in missing]), dtype='float32')
+            self.encoded = len(missing)
+        dim = fresh.shape[1] if fresh is not None else old.shape[1]
+
+        embeddings = np.empty((len(texts), dim), dtype='float32')
+        for i, h in enumerate(entry_hashes):
+            if h in previous:
+                embeddings[i] = old[previous[h]]
+        if missing:
+            embeddings[missing] = fresh
+        return embeddings
+
+    def _write_manifest(self, key: str, entry_hashes: List[str]):
+        old_key = self._read_manifest().get('key')
+        manifest = {'model': self.model_name, 'key': key, 'entries': entry_hashes}
+        _atomic_write(self.manifest_path,
+                      lambda tmp: Path(tmp).write_text(json.dumps(manifest), encoding='utf-8'))
+        if old_key and old_key != key:
+            # Workers that still map the old files keep their pages until they reload
+            for path in self.cache_dir.glob(f"kb-{old_key[:20]}.*"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
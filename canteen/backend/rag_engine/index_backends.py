@@ -0,0 +1,154 @@
+"""
+FAISS index backends for the RAG knowledge base.
+
+All backends score by cosine similarity: vectors are L2-normalized before
+they are added, queries before they are searched, and the index uses inner
+product.
+
+Backends:
+---------
+- ``flat``: exact IndexFlatIP; the recall baseline, fine up to ~10k items
+- ``hnsw``: IndexHNSWFlat graph; no training, ``RAG_HNSW_EF_SEARCH`` trades
+  recall for latency
+- ``ivf``: IndexIVFFlat with ~4*sqrt(n) lists; needs training,
+  ``RAG_IVF_NPROBE`` lists are scanned per query
+
+Storage:
+--------
+``RAG_VECTOR_STORAGE=float16`` or ``int8`` keeps the vectors inside the
+index scalar-quantized (2x / 4x smaller than float32). The search then
+returns ``RAG_RERANK_FACTOR`` x k candidates, and ``rerank`` re-scores them
+exactly against the memory-mapped float32 embeddings. Only the candidate
+rows are paged in.
+
+``auto`` (the default) picks by corpus size, see ``choose_backend``. Use
+``python -m rag_engine.benchmark ann`` to measure recall and latency
+before changing the defaults.
+
+faiss and numpy are imported inside the functions, so importing this
+module stays cheap (see rag_engine's lazy loading).
+"""
+
+import math
+import os
+from typing import Optional
+
+RAG_INDEX_BACKEND = os.environ.get('RAG_INDEX_BACKEND', 'auto')
+RAG_IVF_NPROBE = int(os.environ.get('RAG_IVF_NPROBE', '16'))
+RAG_HNSW_M = int(os.environ.get('RAG_HNSW_M', '32'))
+RAG_HNSW_EF_CONSTRUCTION = int(os.environ.get('RAG_HNSW_EF_CONSTRUCTION', '200'))
+RAG_HNSW_EF_SEARCH = int(os.environ.get('RAG_HNSW_EF_SEARCH', '64'))
+
+# Vector storage inside the index: float32, or scalar-quantized float16 / int8
+RAG_VECTOR_STORAGE = os.environ.get('RAG_VECTOR_STORAGE', 'float32')
+# Compressed indexes fetch this many times k candidates for the float32 re-rank
+RAG_RERANK_FACTOR = int(os.environ.get('RAG_RERANK_FACTOR', '4'))
+
+BACKENDS = ('flat', 'hnsw', 'ivf')
+STORAGES = ('float32', 'float16', 'int8')
+
+# Below this many vectors an exact scan is as fast as any approximation
+FLAT_MAX_ITEMS = 10000
+# HNSW keeps its graph in memory; past this IVF builds faster and is smaller
+HNSW_MAX_ITEMS = 1000000
+# faiss warns when training IVF with fewer points per list than this
+_IVF_MIN_POINTS_PER_LIST = 39
+
+
+def choose_backend(n_items: int, backend: str = RAG_INDEX_BACKEND) -> str:
+    """Resolve ``auto`` to a concrete backend for a corpus of ``n_items``."""
+    if backend != 'auto':
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown RAG_INDEX_BACKEND {backend!r}; expected auto or one of {BACKENDS}")
+        return backend
+    if n_items <= FLAT_MAX_ITEMS:
+        return 'flat'
+    if n_items <= HNSW_MAX_ITEMS:
+        return 'hnsw'
+    return 'ivf'
+
+
+def ivf_nlist(n_items: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n_items)), n_items // _IVF_MIN_POINTS_PER_LIST))
+
+
+def normalized(vectors):
+    """float32, C-contiguous, L2-normalized copy of ``vectors``."""
+    import faiss
+    import numpy as np
+
+    vectors = np.array(vectors, dtype='float32', order='C', copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def index_tag(backend: str, storage: str = 'float32') -> str:
+    """Cache file tag for one index variant."""
+    if storage not in STORAGES:
+        raise ValueError(f"Unknown RAG_VECTOR_STORAGE {storage!r}; expected one of {STORAGES}")
+    return backend if storage == 'float32' else f"{backend}-{storage}"
+
+
+def _quantizer_type(storage: str):
+    import faiss
+
+    return {'float16': faiss.ScalarQuantizer.QT_fp16, 'int8': faiss.ScalarQuantizer.QT_8bit}[storage]
+
+
+def build_index(embeddings, backend: str = 'flat', storage: str = 'float32', hnsw_m: int = RAG_HNSW_M,
+                ef_construction: int = RAG_HNSW_EF_CONSTRUCTION, nlist: Optional[int] = None):
+    """Build a cosine-similarity index of ``backend`` over ``embeddings``."""
+    import faiss
+
+    vectors = normalized(embeddings)
+    n, dim = vectors.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+    quantized = storage != 'float32'
+    if backend == 'flat':
+        index = (faiss.IndexScalarQuantizer(dim, _quantizer_type(storage), metric) if quantized
+                 else faiss.IndexFlatIP(dim))
+    elif backend == 'hnsw':
+        index = (faiss.IndexHNSWSQ(dim, _quantizer_type(storage), hnsw_m, metric) if quantized
+                 else faiss.IndexHNSWFlat(dim, hnsw_m, metric))
+        index.hnsw.efConstruction = ef_construction
+    elif backend == 'ivf':
+        quantizer = faiss.IndexFlatIP(dim)
+        nlist = nlist or ivf_nlist(n)
+        index = (faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _quantizer_type(storage), metric)
+                 if quantized else faiss.IndexIVFFlat(quantizer, dim, nlist, metric))
+    else:
+        raise ValueError(f"Unknown index backend {backend!r}")
+    if not index.is_trained:
+        # IVF learns its lists, int8 learns per-dimension ranges
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def rerank(embeddings, queries, candidates, k: int):
+    """
+    Re-score candidate ids exactly in float32 and keep the top ``k`` per query.
+
+    ``embeddings`` is the full (possibly memory-mapped, unnormalized) float32
+    matrix, ``queries`` are normalized, and -1 pads rows with fewer hits.
+    """
+    import numpy as np
+
+    top = np.full((len(queries), k), -1, dtype='int64')
+    for row, (query, ids) in enumerate(zip(queries, candidates)):
+        ids = ids[ids >= 0]
+        if not len(ids):
+            continue
+        scores = normalized(embeddings[ids]) @ query
+        best = ids[np.argsort(-scores, kind='stable')[:k]]
+        top[row, :len(best)] = best
+    return top
+
+
+def configure_search(index, nprobe: int = RAG_IVF_NPROBE, ef_search: int = RAG_HNSW_EF_SEARCH):
+    """Apply search-time parameters (not all are stored in the index file)."""
+    if hasattr(index, 'nprobe'):
+        index.nprobe = nprobe
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = ef_search
+    return index
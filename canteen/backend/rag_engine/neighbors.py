@@ -0,0 +1,158 @@
+"""
+Precomputed item-to-item neighbour table for the RAG engine.
+
+Knowledge-base embeddings only change when food_knowledge.json or the model
+changes, so the neighbours of every item can be computed once, offline:
+
+    python -m rag_engine.neighbors --top-n 20
+
+This writes ``neighbors.json`` to the RAG cache directory (override with
+``RAG_NEIGHBORS_FILE``). At request time, a cart whose items are all in the
+table is answered by merging their neighbour lists, summing scores per
+neighbour. That needs neither numpy, faiss nor the SentenceTransformer, so
+they are only loaded for carts the table does not cover (unknown or
+free-text items).
+
+The file records the knowledge-base content key (the one EmbeddingCache
+uses). A table built for another knowledge base or model is ignored, so
+rebuild it after editing food_knowledge.json.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+RAG_NEIGHBORS_TOP_N = int(os.environ.get('RAG_NEIGHBORS_TOP_N', '20'))
+NEIGHBORS_FILE = 'neighbors.json'
+
+
+def knowledge_base_key(texts: Sequence[str], model_name: str) -> str:
+    """Same value as EmbeddingCache.content_key, computed without numpy."""
+    entry_hashes = [hashlib.sha256(t.encode('utf-8')).hexdigest() for t in texts]
+    return hashlib.sha256((model_name + '\0' + '\n'.join(entry_hashes)).encode('utf-8')).hexdigest()
+
+
+class NeighborTable:
+    """Top-N knowledge-base neighbours per canonical item name."""
+
+    def __init__(self, neighbors: Dict[str, List[Tuple[int, float]]], key: str, top_n: int):
+        """
+        Args:
+            neighbors: canonical name -> [(knowledge-base index, cosine score)],
+                best first
+            key: Knowledge-base content key the table was built for
+            top_n: Neighbours kept per item
+        """
+        self.neighbors = neighbors
+        self.key = key
+        self.top_n = top_n
+
+    @classmethod
+    def load(cls, path: Path, key: str) -> Optional['NeighborTable']:
+        """Read the table at ``path``; None if it is missing or stale."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read neighbour table {path}: {e}")
+            return None
+        if data.get('key') != key:
+            print(f"Warning: neighbour table {path} was built for another knowledge base "
+                  f"or model; ignoring it (rebuild: python -m rag_engine.neighbors)")
+            return None
+        neighbors = {name: [(int(idx), float(score)) for idx, score in row]
+                     for name, row in data['neighbors'].items()}
+        return cls(neighbors, key, data.get('top_n', 0))
+
+    def save(self, path: Path):
+        data = {'key': self.key, 'top_n': self.top_n, 'built_at': int(time.time()),
+                'neighbors': {name: [[idx, round(score, 4)] for idx, score in row]
+                              for name, row in self.neighbors.items()}}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Moved into place so running workers never read a partial file
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, separators=(',', ':')), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def covers(self, cart_key: Iterable[str]) -> bool:
+        cart_key = tuple(cart_key)
+        return bool(cart_key) and all(name in self.neighbors for name in cart_key)
+
+    def lookup(self, cart_key: Tuple[str, ...], k: int) -> Optional[Tuple[int, ...]]:
+        """
+        Knowledge-base indices for a canonical cart, best first.
+
+        Scores of a neighbour shared by several cart items add up, so items
+        that go with the whole cart rank first. None if any item is unknown.
+        """
+        if not self.covers(cart_key):
+            return None
+        scores: Dict[int, float] = {}
+        for name in cart_key:
+            for idx, score in self.neighbors[name]:
+                scores[idx] = scores.get(idx, 0.0) + score
+        return tuple(sorted(scores, key=lambda idx: (-scores[idx], idx))[:k])
+
+    def __len__(self) -> int:
+        return len(self.neighbors)
+
+
+def build_table(engine, top_n: int = RAG_NEIGHBORS_TOP_N) -> NeighborTable:
+    """Exact top-N cosine neighbours of every knowledge-base item of ``engine``."""
+    from .index_backends import build_index, normalized
+    from .rag_engine import MODEL_NAME, _load_dependencies
+
+    _load_dependencies()
+    engine._initialize_embeddings()
+    canonical = engine.rule_engine.index.canonical
+    names = [canonical(item['item']) for item in engine.knowledge_base]
+
+    # Exact search: this runs offline, and the table is the recall baseline
+    vectors = normalized(engine.embeddings)
+    depth = min(len(names), top_n + 1)
+    scores, indices = build_index(vectors, 'flat').search(vectors, depth)
+
+    neighbors: Dict[str, List[Tuple[int, float]]] = {}
+    for i, name in enumerate(names):
+        if name in neighbors:
+            continue  # an alias of an earlier entry
+        row = [(int(j), float(s)) for j, s in zip(indices[i], scores[i])
+               if j >= 0 and names[j] != name]
+        neighbors[name] = row[:top_n]
+    key = knowledge_base_key([engine._entry_text(item) for item in engine.knowledge_base], MODEL_NAME)
+    return NeighborTable(neighbors, key, top_n)
+
+
+def default_path(cache_dir: Path) -> Path:
+    return Path(os.environ.get('RAG_NEIGHBORS_FILE') or Path(cache_dir) / NEIGHBORS_FILE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top-n', type=int, default=RAG_NEIGHBORS_TOP_N, help='neighbours kept per item')
+    parser.add_argument('--output', help='table path (default: RAG_NEIGHBORS_FILE or <cache>/neighbors.json)')
+    args = parser.parse_args()
+
+    from .rag_engine import RAG_AVAILABLE, RAGRecommendationEngine
+
+    if not RAG_AVAILABLE:
+        raise SystemExit("Building the table needs: pip install sentence-transformers faiss-cpu")
+    engine = RAGRecommendationEngine()
+    if not engine.knowledge_base:
+        raise SystemExit("Knowledge base is empty; nothing to build")
+    start = time.perf_counter()
+    table = build_table(engine, args.top_n)
+    path = Path(args.output) if args.output else default_path(engine.cache_dir)
+    table.save(path)
+    print(f"Wrote {len(table)} items x {args.top_n} neighbours to {path} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
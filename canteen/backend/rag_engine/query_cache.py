@@ -0,0 +1,69 @@
+"""
+Bounded LRU caches for RAG query embeddings and search results.
+
+Most carts are one of a handful of combinations, so the engine caches, per
+canonical cart (sorted, alias-normalized names):
+
+- the query embedding, which saves the model forward pass
+- the FAISS hit list, which also saves the search
+
+Menu matching still runs per request, so availability changes apply at once.
+The engine clears both caches whenever it rebuilds its index. The counters
+are there to size ``RAG_QUERY_CACHE_SIZE``.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+RAG_QUERY_CACHE_SIZE = int(os.environ.get('RAG_QUERY_CACHE_SIZE', '1024'))
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int = RAG_QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
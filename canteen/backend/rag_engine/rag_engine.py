@@ -43,21 +43,54 @@ Version: 0.1.0 (Experimental)
 Status: NOT PRODUCTION READY
 """
 
+import importlib.util
 import json
+import logging
+import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 
-# NOTE: These imports will fail if dependencies are not installed
-# This is intentional - we don't want to force users to install them
-try:
-    from sentence_transformers import SentenceTransformer
-    import faiss
-    import numpy as np
-    RAG_AVAILABLE = True
-except ImportError:
-    RAG_AVAILABLE = False
-    print("⚠️  RAG dependencies not installed. Using rule-based engine only.")
-    print("To enable RAG: pip install sentence-transformers faiss-cpu")
+# Rule-based engine and menu index live next to this package (canteen/backend)
+from recommendation_engine import MenuIndex, RecommendationEngine, get_engine
+
+from .batching import MicroBatcher
+from .index_backends import (
+    RAG_RERANK_FACTOR,
+    RAG_VECTOR_STORAGE,
+    build_index,
+    choose_backend,
+    configure_search,
+    index_tag,
+    normalized,
+    rerank,
+)
+from .neighbors import NeighborTable, default_path as neighbors_path, knowledge_base_key
+from .query_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Checked without importing: torch alone takes seconds and hundreds of MB.
+# The modules are imported by _load_dependencies() when an engine warms up.
+RAG_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None
+    for name in ('sentence_transformers', 'faiss', 'numpy')
+)
+SentenceTransformer = faiss = np = None
+
+
+def _load_dependencies():
+    """Import the RAG dependencies into this module (first warm-up only)."""
+    global SentenceTransformer, faiss, np
+    if SentenceTransformer is None:
+        import faiss as _faiss
+        import numpy as _np
+        from sentence_transformers import SentenceTransformer as _SentenceTransformer
+        faiss, np, SentenceTransformer = _faiss, _np, _SentenceTransformer
+
+# Lightweight model for speed; 'all-mpnet-base-v2' is more accurate.
+# Changing it invalidates the embedding cache (it is part of the cache key).
+MODEL_NAME = os.environ.get('RAG_MODEL_NAME', 'all-MiniLM-L6-v2')
 
 
 class RAGRecommendationEngine:
@@ -68,23 +101,104 @@ class RAGRecommendationEngine:
     It's more flexible than rule-based but requires more resources.
     """
     
-    def __init__(self, data_dir: Optional[str] = None):
-        """Initialize RAG engine."""
-        if not RAG_AVAILABLE:
-            raise ImportError(
-                "RAG dependencies not installed. "
-                "Run: pip install sentence-transformers faiss-cpu"
-            )
+    def __init__(self, data_dir: Optional[str] = None, cache_dir: Optional[str] = None,
+                 rule_engine: Optional[RecommendationEngine] = None):
+        """
+        Initialize RAG engine.
         
+        Without the RAG dependencies the engine still serves carts covered by
+        a prebuilt neighbour table (see neighbors.py). Cart names are
+        normalized with ``rule_engine``'s aliases (default: the shared
+        get_engine()), so they follow its rule-file reloads.
+        """
+        self.rule_engine = rule_engine or get_engine()
         if data_dir is None:
             current_dir = Path(__file__).parent
             data_dir = current_dir.parent / 'data'
         
         self.data_dir = Path(data_dir)
+        self.cache_dir = Path(cache_dir or os.environ.get('RAG_CACHE_DIR') or self.data_dir / 'rag_cache')
         self.knowledge_base = self._load_knowledge_base()
+        self.neighbors = self._load_neighbors()
+        if not RAG_AVAILABLE and self.neighbors is None:
+            raise ImportError(
+                "RAG dependencies not installed. "
+                "Run: pip install sentence-transformers faiss-cpu"
+            )
         self.model = None
-        self.index = None
-        self._initialize_embeddings()
+        self.cache = None
+        # (embeddings, index), replaced as one reference by _initialize_embeddings
+        self._vectors: Optional[Tuple[Any, Any]] = None
+        self.index_backend = None
+        self._model_lock = threading.Lock()
+        self.batcher = None
+        self.query_embeddings = LRUCache()
+        self.query_results = LRUCache()
+        self._generation = 0
+        # The model and index are built by warm-up, not here. _ready is set
+        # once they are loaded, _done when an attempt ends either way.
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._warmup_lock = threading.Lock()
+        self._warmup_pid = None
+        self.warmup_error: Optional[BaseException] = None
+    
+    @property
+    def embeddings(self):
+        return self._vectors[0] if self._vectors else None
+    
+    @property
+    def index(self):
+        return self._vectors[1] if self._vectors else None
+    
+    @property
+    def ready(self) -> bool:
+        """True once the index and model are loaded."""
+        return self._ready.is_set()
+    
+    def start_warmup(self):
+        """Build the index and load the model in a background thread (idempotent)."""
+        if not RAG_AVAILABLE or self._ready.is_set() or self._warmup_pid == os.getpid():
+            return
+        with self._warmup_lock:
+            # A warm-up begun before a fork has no thread in the child
+            if self._ready.is_set() or self._warmup_pid == os.getpid():
+                return
+            self._warmup_pid = os.getpid()
+            self.warmup_error = None
+            self._done.clear()
+            threading.Thread(target=self._warm_up, name='rag-warmup', daemon=True).start()
+    
+    def _warm_up(self):
+        try:
+            _load_dependencies()
+            self._initialize_embeddings()
+            self._get_model()
+            self._ready.set()
+            self._done.set()
+        except Exception as e:
+            logger.exception("RAG warm-up failed")
+            with self._warmup_lock:
+                self.warmup_error = e
+                # The next start_warmup() tries again
+                self._warmup_pid = None
+                self._done.set()
+    
+    def ensure_ready(self, timeout: Optional[float] = None):
+        """Start warm-up if needed and block until it finishes.
+        
+        Raises the warm-up's exception if it failed, TimeoutError if it is
+        still running after ``timeout`` seconds.
+        """
+        if not RAG_AVAILABLE:
+            raise ImportError("This cart is not in the neighbour table and needs the model: "
+                              "pip install sentence-transformers faiss-cpu")
+        self.start_warmup()
+        if not self._done.wait(timeout):
+            raise TimeoutError("RAG engine is still warming up")
+        error = self.warmup_error
+        if not self._ready.is_set():
+            raise error or TimeoutError("RAG engine is still warming up")
     
     def _load_knowledge_base(self) -> List[Dict[str, Any]]:
         """Load structured food knowledge."""
@@ -101,41 +215,79 @@ class RAGRecommendationEngine:
             print(f"Error loading knowledge base: {e}")
             return []
     
+    def _load_neighbors(self) -> Optional[NeighborTable]:
+        """The precomputed neighbour table, if one was built for this knowledge base."""
+        if not self.knowledge_base:
+            return None
+        key = knowledge_base_key([self._entry_text(item) for item in self.knowledge_base], MODEL_NAME)
+        return NeighborTable.load(neighbors_path(self.cache_dir), key)
+    
+    def covers(self, cart_items: List[str]) -> bool:
+        """True if the neighbour table answers this cart (no model needed)."""
+        return self.neighbors is not None and self.neighbors.covers(self._cart_key(cart_items))
+    
+    def _get_model(self):
+        """Load the SentenceTransformer on first use (queries or cache misses)."""
+        if self.model is None:
+            with self._model_lock:
+                if self.model is None:
+                    self.model = SentenceTransformer(MODEL_NAME)
+        return self.model
+    
+    def _encode(self, texts: List[str]):
+        print(f"Generating embeddings for {len(texts)} items...")
+        return self._get_model().encode(texts, show_progress_bar=len(texts) > 100)
+    
+    def _build_index(self, embeddings):
+        return build_index(embeddings, self.index_backend, RAG_VECTOR_STORAGE)
+    
+    @staticmethod
+    def _entry_text(item: Dict[str, Any]) -> str:
+        # Combine all fields into a rich text representation
+        return f"{item['item']} - {item['type']} - {item['taste_profile']} - " \
+               f"{item['reason']} - Pairs with: {', '.join(item['pairs_well_with'])}"
+    
     def _initialize_embeddings(self):
         """
-        Initialize the embedding model and vector index.
+        Load the embeddings and vector index from the on-disk cache.
         
-        This is expensive - only do it once at startup.
+        Only entries missing from the cache are encoded, so after the first
+        build a restart maps two files and never loads the model.
         """
-        print("Initializing RAG engine (this may take a minute)...")
-        
-        # Use a lightweight model for speed
-        # In production, consider: 'all-MiniLM-L6-v2' (fast) or 'all-mpnet-base-v2' (accurate)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        from .embedding_cache import EmbeddingCache
         
-        # Create text corpus from knowledge base
-        texts = []
-        for item in self.knowledge_base:
-            # Combine all fields into a rich text representation
-            text = f"{item['item']} - {item['type']} - {item['taste_profile']} - " \
-                   f"{item['reason']} - Pairs with: {', '.join(item['pairs_well_with'])}"
-            texts.append(text)
-        
-        # Generate embeddings
-        print(f"Generating embeddings for {len(texts)} items...")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)  # L2 distance
-        self.index.add(embeddings.astype('float32'))
-        
-        print("RAG engine initialized successfully!")
+        if not self.knowledge_base:
+            return
+        texts = [self._entry_text(item) for item in self.knowledge_base]
+        self.index_backend = choose_backend(len(texts))
+        self.cache = EmbeddingCache(self.cache_dir, MODEL_NAME)
+        embeddings, index = self.cache.load(texts, self._encode, self._build_index,
+                                            index_tag=index_tag(self.index_backend, RAG_VECTOR_STORAGE))
+        # One assignment: a concurrent query sees the old pair or the new one, never a mix
+        self._vectors = (embeddings, configure_search(index))
+        # Cached hits point into the old index
+        self._generation += 1
+        self.query_results.clear()
+        self.query_embeddings.clear()
+        print(f"RAG engine ready ({len(texts)} items, {self.index_backend}/{RAG_VECTOR_STORAGE} index, "
+              f"{self.cache.encoded} encoded)")
+    
+    def reload(self):
+        """Re-read food_knowledge.json and rebuild the index (clears the query caches)."""
+        self.knowledge_base = self._load_knowledge_base()
+        self.neighbors = self._load_neighbors()
+        if RAG_AVAILABLE:
+            self.ensure_ready()
+            self._initialize_embeddings()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for the query embedding and result caches."""
+        return {'embeddings': self.query_embeddings.stats(), 'results': self.query_results.stats()}
     
     def get_recommendations(
         self,
         cart_items: List[str],
-        available_items: List[Dict[str, Any]],
+        available_items: Union[List[Dict[str, Any]], MenuIndex],
         max_recommendations: int = 5
     ) -> List[Dict[str, Any]]:
         """
@@ -143,44 +295,141 @@ class RAGRecommendationEngine:
         
         Args:
             cart_items: List of item names in cart
-            available_items: List of available menu items
+            available_items: Menu items, or a MenuIndex built once per menu
+                version (preferred: a list is indexed on every call)
             max_recommendations: Max items to return
             
         Returns:
             List of recommended items
         """
-        if not cart_items or not self.model or not self.index:
+        if not cart_items:
             return []
+        if not self.covers(cart_items):
+            self.ensure_ready()
+        return self._recommend_many([(cart_items, available_items, max_recommendations)])[0]
+    
+    def get_recommendations_batch(
+        self,
+        carts: List[List[str]],
+        available_items: Union[List[Dict[str, Any]], MenuIndex],
+        max_recommendations: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Recommendations for many carts with one encode and one search call.
         
-        # Create query from cart items
-        query = f"Food items that pair well with {', '.join(cart_items)}"
-        query_embedding = self.model.encode([query])
+        Returns one list of recommendations per cart, in order.
+        """
+        if not all(self.covers(cart) for cart in carts if cart):
+            self.ensure_ready()
+        if not isinstance(available_items, MenuIndex):
+            available_items = MenuIndex(available_items)
+        return self._recommend_many([(cart, available_items, max_recommendations) for cart in carts])
+    
+    def get_recommendations_queued(
+        self,
+        cart_items: List[str],
+        available_items: Union[List[Dict[str, Any]], MenuIndex],
+        max_recommendations: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Like get_recommendations, but batched with concurrent callers."""
+        if not cart_items:
+            return []
+        if self.covers(cart_items):
+            # A table lookup; nothing to share with other callers
+            return self._recommend_many([(cart_items, available_items, max_recommendations)])[0]
+        self.ensure_ready()
+        if self.batcher is None:
+            with self._model_lock:
+                if self.batcher is None:
+                    self.batcher = MicroBatcher(self._recommend_many)
+        return self.batcher.submit((cart_items, available_items, max_recommendations))
+    
+    def _cart_key(self, cart_items: List[str]) -> Tuple[str, ...]:
+        """Sorted, alias-normalized cart: ['Samosa', 'chai'] -> ('samosa', 'tea')."""
+        canonical = self.rule_engine.index.canonical
+        return tuple(sorted({canonical(item) for item in cart_items}))
+    
+    @staticmethod
+    def _query_text(cart_key: Tuple[str, ...]) -> str:
+        return f"Food items that pair well with {', '.join(name.replace('_', ' ') for name in cart_key)}"
+    
+    def _recommend_many(self, requests) -> List[List[Dict[str, Any]]]:
+        """Handle ``(cart_items, menu, max_recommendations)`` requests as one batch."""
+        results: List[List[Dict[str, Any]]] = [[] for _ in requests]
+        live = [i for i, (cart, _, _) in enumerate(requests) if cart]
+        if not live:
+            return results
         
-        # Search vector database
-        k = min(max_recommendations * 2, len(self.knowledge_base))
-        distances, indices = self.index.search(query_embedding.astype('float32'), k)
+        generation = self._generation
+        k = min(max(requests[i][2] for i in live) * 2, len(self.knowledge_base))
+        keys = {i: self._cart_key(requests[i][0]) for i in live}
+        hits = {}
+        for i in live:
+            # Precomputed neighbours first, then the result cache
+            found = self.neighbors.lookup(keys[i], k + len(keys[i])) if self.neighbors else None
+            if found is None:
+                found = self.query_results.get((keys[i], k))
+            if found is not None:
+                hits[i] = found
         
-        # Build recommendations
+        # Distinct carts that still need a search, and which of them need encoding
+        pending = list(dict.fromkeys(keys[i] for i in live if i not in hits))
+        # Read once: reload() may swap in a new pair while this batch runs
+        snapshot = self._vectors
+        if pending and snapshot is not None:
+            embeddings, index = snapshot
+            vectors = {key: self.query_embeddings.get(key) for key in pending}
+            to_encode = [key for key in pending if vectors[key] is None]
+            if to_encode:
+                # One forward pass for every new query in the batch
+                encoded = self._get_model().encode([self._query_text(key) for key in to_encode])
+                for key, vector in zip(to_encode, np.asarray(encoded, dtype='float32')):
+                    vectors[key] = vector
+                    self.query_embeddings.put(key, vector)
+            
+            # One search, deep enough for the largest request (cosine: normalized queries)
+            queries = normalized(np.stack([vectors[key] for key in pending]))
+            if RAG_VECTOR_STORAGE == 'float32':
+                distances, indices = index.search(queries, k)
+            else:
+                # Quantized scores are approximate: over-fetch, then re-rank in float32
+                fetch = min(k * RAG_RERANK_FACTOR, len(self.knowledge_base))
+                distances, candidates = index.search(queries, fetch)
+                indices = rerank(embeddings, queries, candidates, k)
+            found = {key: tuple(int(x) for x in row) for key, row in zip(pending, indices)}
+            for key, row in found.items():
+                # Skip results computed against an index that was rebuilt meanwhile
+                if generation == self._generation:
+                    self.query_results.put((key, k), row)
+            for i in live:
+                if i not in hits:
+                    hits[i] = found[keys[i]]
+        
+        for i in live:
+            if i not in hits:
+                continue
+            _, menu, max_recommendations = requests[i]
+            results[i] = self._match_hits(hits[i], keys[i], menu, max_recommendations)
+        return results
+    
+    def _match_hits(self, hits, cart_key, available_items, max_recommendations):
+        """Turn FAISS hits into available menu items, one hash lookup per hit."""
+        menu = available_items if isinstance(available_items, MenuIndex) else MenuIndex(available_items)
+        canonical = self.rule_engine.index.canonical
+        cart_names = set(cart_key)
         recommendations = []
-        cart_items_lower = [item.lower() for item in cart_items]
         
-        for idx in indices[0]:
-            if idx < len(self.knowledge_base):
+        for idx in hits:
+            if 0 <= idx < len(self.knowledge_base):
                 kb_item = self.knowledge_base[idx]
                 item_name = kb_item['item']
                 
-                # Skip if already in cart
-                if item_name.lower() in cart_items_lower:
+                # Skip if already in cart (under any alias)
+                if canonical(item_name) in cart_names:
                     continue
                 
-                # Find matching menu item
-                menu_item = None
-                for mi in available_items:
-                    if mi.get('item_name', '').lower() == item_name.lower():
-                        menu_item = mi
-                        break
-                
-                if menu_item and menu_item.get('availability', False):
+                menu_item = menu.get(item_name)
+                if menu.is_available(menu_item):
                     recommendations.append({
                         'item_id': menu_item.get('id'),
                         'item_name': menu_item.get('item_name'),
@@ -209,40 +458,59 @@ class HybridRecommendationEngine:
     4. Score based on both methods
     """
     
-    def __init__(self):
-        """Initialize both engines."""
-        from .rule_engine import RecommendationEngine
+    def __init__(self, batching: bool = False, warm_up: bool = True,
+                 rule_engine: Optional[RecommendationEngine] = None):
+        """
+        Initialize both engines.
         
-        self.rule_engine = RecommendationEngine()
+        Both halves use one rule engine (default: the shared get_engine()),
+        so its rules are compiled once and a refresh() reaches both. With ``batching`` the RAG half of concurrent requests is queued and
+        encoded together (see batching.MicroBatcher). ``warm_up`` starts
+        loading the RAG model in the background right away; until it is
+        ready, requests get rule-based results only. With a neighbour table
+        (see neighbors.py) the model is not loaded until a cart needs it.
+        """
+        self.rule_engine = rule_engine or get_engine()
+        self.batching = batching
         
-        if RAG_AVAILABLE:
-            try:
-                self.rag_engine = RAGRecommendationEngine()
-            except Exception as e:
-                print(f"Failed to initialize RAG engine: {e}")
-                self.rag_engine = None
-        else:
+        try:
+            self.rag_engine = RAGRecommendationEngine(rule_engine=self.rule_engine)
+            # With a neighbour table the model is only a fallback: load it on demand
+            if warm_up and self.rag_engine.neighbors is None:
+                self.rag_engine.start_warmup()
+        except ImportError:
+            print("RAG dependencies not installed; using rule-based recommendations only. "
+                  "To enable RAG: pip install sentence-transformers faiss-cpu")
+            self.rag_engine = None
+        except Exception as e:
+            print(f"Failed to initialize RAG engine: {e}")
             self.rag_engine = None
     
     def get_recommendations(
         self,
         cart_items: List[str],
-        available_items: List[Dict[str, Any]],
+        available_items: Union[List[Dict[str, Any]], MenuIndex],
         max_recommendations: int = 5
     ) -> List[Dict[str, Any]]:
         """Get hybrid recommendations."""
+        # One MenuIndex for both engines; reused while the menu list is the same object
+        menu = self.rule_engine.menu_index(available_items)
+        
         # Always get rule-based recommendations
         rule_recs = self.rule_engine.get_recommendations(
-            cart_items, available_items, max_recommendations
+            cart_items, menu, max_recommendations
         )
         
         # Try to get RAG recommendations if available
         rag_recs = []
-        if self.rag_engine:
+        if self.rag_engine and not (self.rag_engine.ready or self.rag_engine.covers(cart_items)):
+            # Never block a request on warm-up
+            self.rag_engine.start_warmup()
+        elif self.rag_engine:
             try:
-                rag_recs = self.rag_engine.get_recommendations(
-                    cart_items, available_items, max_recommendations
-                )
+                recommend = (self.rag_engine.get_recommendations_queued if self.batching
+                             else self.rag_engine.get_recommendations)
+                rag_recs = recommend(cart_items, menu, max_recommendations)
             except Exception as e:
                 print(f"RAG recommendation failed: {e}")
         
@@ -275,6 +543,6 @@ def get_rag_engine():
     return RAGRecommendationEngine()
 
 
-def get_hybrid_engine():
+def get_hybrid_engine(batching: bool = False, warm_up: bool = True):
     """Get hybrid engine instance."""
-    return HybridRecommendationEngine()
+    return HybridRecommendationEngine(batching=batching, warm_up=warm_up)
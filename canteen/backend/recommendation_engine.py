@@ -0,0 +1,383 @@
+"""
+Rule-Based Recommendation Engine
+
+Suggests menu items that pair well with the items in a cart, using the
+hand-written rules in data/canteen_associations.json and the name/alias
+table in data/menu_items_mapping.json.
+
+Compiled Index:
+---------------
+The JSON files are compiled once into a ``RecommendationIndex``:
+
+1. Every item name, normalized name and alias resolves to a small integer
+   ID through one hash lookup (``name_to_id``).
+2. Each item's pairings are stored as an array of target IDs, already
+   sorted by priority.
+3. The current menu is held in a ``MenuIndex`` keyed by the same IDs (and
+   by normalized name), so a candidate's menu row and availability are
+   found without scanning the menu.
+
+Mined Rules:
+------------
+``backend/copurchase.py`` exports pairings mined from real orders to
+data/copurchase_associations.json in the same rule format.
+``RECOMMENDATIONS_RULES`` selects what is compiled: ``static`` (the
+hand-written file only), ``mined`` (only the exported file), or ``blend``
+(the default). Blending interleaves both lists by rank, and a static
+pairing wins a tie. Without an exported file, ``blend`` is the static rules.
+
+A recommendation therefore costs O(cart x pairs). The index is immutable;
+``RecommendationEngine`` builds a new one when the JSON files or the menu
+change and swaps it in with a single assignment, so readers never see a
+half-built index.
+
+Usage:
+------
+    from recommendation_engine import get_engine
+
+    engine = get_engine()
+    engine.get_recommendations(['Tea'], menu_items, max_recommendations=5)
+"""
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_DATA_DIR = Path(__file__).parent / 'data'
+ASSOCIATIONS_FILE = 'canteen_associations.json'
+MAPPING_FILE = 'menu_items_mapping.json'
+COPURCHASE_FILE = 'copurchase_associations.json'
+
+RULE_SOURCES = ('static', 'mined', 'blend')
+RECOMMENDATIONS_RULES = os.environ.get('RECOMMENDATIONS_RULES', 'blend')
+
+_SEPARATORS = re.compile(r'[\s\-]+')
+
+
+def normalize_name(name: Any) -> str:
+    """Normalize an item name or alias: 'French Fries' -> 'french_fries'."""
+    return _SEPARATORS.sub('_', str(name).strip().lower())
+
+
+class MenuIndex:
+    """
+    One menu snapshot, indexed for O(1) matching by name, alias or rule ID.
+
+    Built once per menu version and shared by the rule, RAG and hybrid
+    engines, so no request scans or re-lowercases the menu.
+    """
+
+    def __init__(self, menu_items: Iterable[Dict[str, Any]], name_to_id: Optional[Dict[str, int]] = None):
+        self.items = list(menu_items)
+        self.name_to_id = name_to_id or {}
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.available = set()
+        for item in self.items:
+            name = normalize_name(item.get('item_name', ''))
+            self.by_name.setdefault(name, item)
+            item_id = self.name_to_id.get(name)
+            if item_id is not None:
+                self.by_id.setdefault(item_id, item)
+            if item.get('availability', False):
+                self.available.add(item.get('id'))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, name: Any) -> Optional[Dict[str, Any]]:
+        """Menu item for a name or alias, or None."""
+        key = normalize_name(name)
+        item = self.by_name.get(key)
+        if item is None and key in self.name_to_id:
+            item = self.by_id.get(self.name_to_id[key])
+        return item
+
+    def is_available(self, item: Optional[Dict[str, Any]]) -> bool:
+        return item is not None and item.get('id') in self.available
+
+
+class RecommendationIndex:
+    """
+    Immutable, compiled form of the association rules plus one menu snapshot.
+
+    Item IDs are dense integers; ``keys[i]`` is the canonical key of ID ``i``.
+    """
+
+    def __init__(
+        self,
+        name_to_id: Dict[str, int],
+        keys: List[str],
+        pairings: List[Tuple[int, ...]],
+        rules: List[Optional[Dict[str, Any]]],
+        menu: Optional[Iterable[Dict[str, Any]]] = None,
+    ):
+        self.name_to_id = name_to_id
+        self.keys = keys
+        self.pairings = pairings
+        self.rules = rules
+        # Menu items no rule mentions can never be recommended
+        self.menu = menu if isinstance(menu, MenuIndex) else MenuIndex(menu or (), name_to_id)
+
+    def with_menu(self, menu) -> 'RecommendationIndex':
+        """Return a copy of this index bound to another menu (list or MenuIndex)."""
+        return RecommendationIndex(self.name_to_id, self.keys, self.pairings, self.rules, menu)
+
+    def resolve(self, name: Any) -> Optional[int]:
+        """Item ID for a name or alias, or None if no rule knows it."""
+        return self.name_to_id.get(normalize_name(name))
+
+    def canonical(self, name: Any) -> str:
+        """Canonical key for a name: 'Chai' -> 'tea', unknown names just normalized."""
+        key = normalize_name(name)
+        item_id = self.name_to_id.get(key)
+        return key if item_id is None else self.keys[item_id]
+
+    def recommend(self, cart_items: Iterable[Any], max_recommendations: int = 5) -> List[Dict[str, Any]]:
+        """Score the pairings of every cart item against the bound menu."""
+        cart_ids = {i for i in (self.resolve(name) for name in cart_items) if i is not None}
+        scores: Dict[int, float] = {}
+        reasons: Dict[int, Tuple[float, str]] = {}
+
+        for source in cart_ids:
+            rule = self.rules[source]
+            for rank, target in enumerate(self.pairings[source], 1):
+                if target in cart_ids:
+                    continue
+                menu_item = self.menu.by_id.get(target)
+                if not self.menu.is_available(menu_item):
+                    continue
+                # Higher-priority pairings and items paired by several cart items score highest
+                weight = 1.0 / rank
+                scores[target] = scores.get(target, 0.0) + weight
+                if target not in reasons or weight > reasons[target][0]:
+                    reasons[target] = (weight, rule['reason'])
+
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])[:max_recommendations]
+        recommendations = []
+        for target, score in ranked:
+            menu_item = self.menu.by_id[target]
+            recommendations.append({
+                'item_id': menu_item.get('id'),
+                'item_name': menu_item.get('item_name'),
+                'price': float(menu_item.get('price', 0)),
+                'category': menu_item.get('category', ''),
+                'description': menu_item.get('description', ''),
+                'recommendation_score': round(score, 3),
+                'reason': reasons[target][1],
+            })
+        return recommendations
+
+
+def blend_rules(
+    static: Dict[str, Dict[str, Any]],
+    mined: Dict[str, Dict[str, Any]],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Merge mined rules into the static ones, interleaving pairings by rank.
+
+    A mined pairing of rank r sorts just after the static pairing of rank r.
+    Static reasons and categories are kept where both files have a rule.
+    """
+    blended = {normalize_name(key): dict(rule) for key, rule in static.items()}
+    for key, rule in mined.items():
+        key = normalize_name(key)
+        pairs = rule.get('pairs_with', [])
+        priorities = [p + 0.5 for p in (rule.get('priority') or range(1, len(pairs) + 1))]
+        if key not in blended:
+            blended[key] = dict(rule, priority=priorities)
+            continue
+        base = blended[key]
+        base_pairs = base.get('pairs_with', [])
+        base_priorities = base.get('priority') or list(range(1, len(base_pairs) + 1))
+        # compile_index keeps each target's best priority, so duplicates are harmless
+        base['pairs_with'] = list(base_pairs) + list(pairs)
+        base['priority'] = list(base_priorities) + priorities
+    return blended
+
+
+def compile_index(
+    associations: Dict[str, Dict[str, Any]],
+    mapping: List[Dict[str, Any]],
+    menu: Optional[Iterable[Dict[str, Any]]] = None,
+) -> RecommendationIndex:
+    """Compile the association rules and alias table into a RecommendationIndex."""
+    name_to_id: Dict[str, int] = {}
+    keys: List[str] = []
+
+    def intern(key: str) -> int:
+        if key not in name_to_id:
+            name_to_id[key] = len(keys)
+            keys.append(key)
+        return name_to_id[key]
+
+    # Aliases first, so 'cookies' in a rule resolves to the Biscuits item
+    for entry in mapping:
+        item_id = intern(normalize_name(entry.get('normalized_name') or entry['item_id']))
+        for name in [entry.get('item_id'), entry.get('db_name')] + list(entry.get('aliases', [])):
+            if name:
+                name_to_id.setdefault(normalize_name(name), item_id)
+
+    for key, rule in associations.items():
+        intern(normalize_name(key))
+        for target in rule.get('pairs_with', []):
+            intern(normalize_name(target))
+
+    # Rules whose keys are aliases of one item (burger / chicken_burger) are
+    # merged, keeping each target's best priority
+    ranked: List[Dict[int, int]] = [{} for _ in keys]
+    rules: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+    for key, rule in associations.items():
+        source = name_to_id[normalize_name(key)]
+        priorities = rule.get('priority') or list(range(1, len(rule.get('pairs_with', [])) + 1))
+        for target, priority in zip(rule.get('pairs_with', []), priorities):
+            target_id = name_to_id[normalize_name(target)]
+            if target_id != source:
+                ranked[source][target_id] = min(priority, ranked[source].get(target_id, priority))
+        if rules[source] is None or normalize_name(key) == keys[source]:
+            rules[source] = rule
+
+    pairings = [tuple(sorted(targets, key=lambda t: (targets[t], t))) for targets in ranked]
+    return RecommendationIndex(name_to_id, keys, pairings, rules, menu)
+
+
+class RecommendationEngine:
+    """
+    Rule-based recommendation engine backed by a compiled index.
+
+    Call ``set_menu`` whenever the menu changes; the rule files are reloaded
+    automatically when their modification times change.
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, rules: str = RECOMMENDATIONS_RULES):
+        if rules not in RULE_SOURCES:
+            raise ValueError(f"Unknown RECOMMENDATIONS_RULES {rules!r}; expected one of {RULE_SOURCES}")
+        self.data_dir = Path(data_dir) if data_dir else DEFAULT_DATA_DIR
+        self.rules = rules
+        self._lock = threading.Lock()
+        self._base: Optional[RecommendationIndex] = None
+        self._signature = None
+        self._menu: Optional[List[Dict[str, Any]]] = None
+        self.index = self._rebuild()
+
+    def _file_signature(self):
+        signature = []
+        for name in (ASSOCIATIONS_FILE, MAPPING_FILE, COPURCHASE_FILE):
+            try:
+                stat = (self.data_dir / name).stat()
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load_json(self, name: str, default, required: bool = True):
+        path = self.data_dir / name
+        if not path.exists():
+            if required:
+                print(f"Warning: {name} not found at {path}")
+            return default
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading {name}: {e}")
+            return default
+
+    def _rebuild(self, menu=None) -> RecommendationIndex:
+        """Recompile the rules (if changed) and rebind the menu under the lock."""
+        with self._lock:
+            signature = self._file_signature()
+            if self._base is None or signature != self._signature:
+                self._base = compile_index(self._load_rules(), self._load_json(MAPPING_FILE, []))
+                self._signature = signature
+            if menu is not None:
+                self._menu = menu
+            # One reference swap: readers see either the old index or the new one
+            self.index = self._base.with_menu(self._menu)
+            return self.index
+
+    def _load_rules(self) -> Dict[str, Dict[str, Any]]:
+        """The association rules selected by ``self.rules``."""
+        static = self._load_json(ASSOCIATIONS_FILE, {}) if self.rules != 'mined' else {}
+        if self.rules == 'static':
+            return static
+        mined = self._load_json(COPURCHASE_FILE, {}, required=self.rules == 'mined').get('rules', {})
+        return mined if self.rules == 'mined' else blend_rules(static, mined)
+
+    def refresh(self) -> bool:
+        """Rebuild if the rule files changed on disk; returns True if rebuilt."""
+        if self._file_signature() == self._signature:
+            return False
+        self._rebuild()
+        return True
+
+    def set_menu(self, menu_items: List[Dict[str, Any]]):
+        """Bind a new menu snapshot (no-op if it is the same list object)."""
+        if menu_items is not self._menu:
+            self._rebuild(menu_items)
+
+    def menu_index(self, menu_items: Optional[List[Dict[str, Any]]] = None) -> MenuIndex:
+        """MenuIndex for ``menu_items``, reusing the bound one for the same list."""
+        index = self.index
+        if menu_items is None or menu_items is self._menu:
+            return index.menu
+        return MenuIndex(menu_items, index.name_to_id)
+
+    def get_recommendations(
+        self,
+        cart_items: List[str],
+        available_items: Optional[List[Dict[str, Any]]] = None,
+        max_recommendations: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Recommend items that pair with the cart.
+
+        Args:
+            cart_items: Item names (or aliases) in the cart
+            available_items: Menu to recommend from (list or MenuIndex);
+                defaults to the menu bound with ``set_menu``
+            max_recommendations: Max items to return
+
+        Returns:
+            Recommended menu items, best first, with a score and reason
+        """
+        if not cart_items:
+            return []
+        index = self.index
+        if isinstance(available_items, MenuIndex):
+            if available_items is not index.menu:
+                index = index.with_menu(available_items)
+        elif available_items is not None and available_items is not self._menu:
+            index = index.with_menu(available_items)
+        return index.recommend(cart_items, max_recommendations)
+
+    def get_association_info(self, item_name: str) -> Optional[Dict[str, Any]]:
+        """Return the rule for an item (resolving aliases), or None."""
+        index = self.index
+        item_id = index.resolve(item_name)
+        if item_id is None or index.rules[item_id] is None:
+            return None
+        rule = index.rules[item_id]
+        return {
+            'item': index.keys[item_id],
+            'category': rule.get('category'),
+            'pairs_with': [index.keys[t] for t in index.pairings[item_id]],
+            'reason': rule.get('reason'),
+        }
+
+
+_engine: Optional[RecommendationEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RecommendationEngine:
+    """Get the shared engine instance, compiling it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RecommendationEngine()
+    return _engine